@@ -6,13 +6,21 @@ Created on Aug 19, 2013
 #cython: embedsignature=True
 
 
+import collections
+import copy
+import itertools
+import json
 import os
 import time
 import datetime
+import multiprocessing
+import shutil
+import tempfile
 
 import numpy as np
 
 cimport numpy as np
+cimport cython
 
 import filetypes.event_database as ed
 import sys
@@ -20,502 +28,1739 @@ import sys
 from libc.math cimport sqrt
 from libc.math cimport fmax
 from libc.math cimport fabs
+from libc.float cimport DBL_MAX
+from libc.string cimport memmove
+from libc.limits cimport LONG_MAX
 
 from cpython cimport bool
 
 from pypore.i_o import get_reader_from_filename
 
 from pypore.i_o.abstract_reader cimport AbstractReader
-from pypore.strategies.baseline_strategy cimport BaselineStrategy
+from pypore.i_o.prefetch_reader cimport PrefetchReader
+from pypore.strategies.baseline_strategy cimport BaselineStrategy, BaselineKernel, baseline_kernel_update
 from pypore.strategies.adaptive_baseline_strategy import AdaptiveBaselineStrategy
 
-from pypore.strategies.threshold_strategy cimport ThresholdStrategy
+from pypore.strategies.threshold_strategy cimport ThresholdStrategy, ThresholdKernel, threshold_kernel_starting
 from pypore.strategies.noise_based_threshold_strategy import NoiseBasedThresholdStrategy
 
 DTYPE = np.float
 ctypedef np.float_t DTYPE_t
 
+# Single precision samples, for data read with dtype=numpy.float32.
+DTYPE_SINGLE = np.float32
+ctypedef np.float32_t DTYPE_SINGLE_t
+
+# The sample types the GIL-free kernels are compiled for.
+ctypedef fused sample_t:
+    np.float32_t
+    np.float64_t
+
 DTYPE_UINT32 = np.uint32
 ctypedef np.uint32_t DTYPE_UINT32_t
 
-cdef np.ndarray[DTYPE_t] _get_data_range(data_cache, long i, long n):
-    """
-    returns [i,n)
-    """
-    cdef np.ndarray[DTYPE_t,
-                    negative_indices = False,
-                    mode = 'c'] res = np.zeros(n - i, dtype=DTYPE)
-    cdef long res_spot = 0, l, nn
-    # do we need to include points from the old data
-    # (eg. for raw event points)
-    if i < 0:
-        l = data_cache[0].size
-        # Is the range totally within the old data
-        if n <= 0:
-            res = data_cache[0][l + i:l + n]
-            return res
-        res[0:-i] = data_cache[0][l + i:l]
-        res_spot -= i
-        i = 0
-    cdef long spot = 0
-    cdef np.ndarray[DTYPE_t] cache
-    cdef int q = 0
-    for q in xrange(len(data_cache) - 1):
-        cache = data_cache[q + 1]
-        nn = cache.size
-        # if all the rest of the data is in this cache
-        # add it to the end of the result and return
-        if i >= spot and n <= spot + nn:
-            res[res_spot:] = cache[i - spot:n - spot]
-            break
-        # else we must need to visit more caches
-        elif i < spot + nn:
-            res[res_spot:res_spot + nn - (i - spot)] = cache[i - spot:]
-            res_spot += nn - (i - spot)
-            i = spot + nn
-        spot += nn
-    return res
-
-cpdef np.ndarray[DTYPE_t] _get_data_range_test_wrapper(data_cache, long i, long n):
-    """
-    Just a wrapper so the python unittests can call :py:func:`_get_data_range`.
-    """
-    return _get_data_range(data_cache, i, n)
+# A row of the eventTable, laid out like pypore.filetypes.event_database.EVENT_DTYPE.
+ctypedef packed struct _EventRow:
+    np.uint32_t array_row
+    np.uint64_t event_start
+    np.uint32_t event_length
+    np.uint32_t n_levels
+    np.uint32_t raw_points_per_side
+    np.float64_t baseline
+    np.float64_t current_blockage
+    np.float64_t area
+    np.uint32_t channel
+    np.float64_t variance
+
+# Smallest number of points the vectorized scan looks at once.
+DEF MIN_SCAN_CHUNK = 64
+# Most points scanned one at a time, after the vectorized scan keeps finding events right away.
+DEF MAX_SCALAR_RUN = 65536
+
+# Default number of points each parallel segment is scanned before its own part of the data,
+# so the baseline has settled by the time events are saved.
+DEFAULT_WARM_UP_POINTS = 2 ** 17
+
+# Number of points of the debug traces written at a time.
+DEF DEBUG_CHUNK_POINTS = 65536
+
+# Default number of batches of blocks read ahead of the event finder on a background thread.
+DEFAULT_READ_AHEAD = 4
+
+# Default number of seconds between checkpoints saved to the EventDatabase during a resumed search.
+DEFAULT_CHECKPOINT_INTERVAL = 60.
+
+# Seconds between checks for data appended to a file that is being followed, and the default number of seconds
+# without any, after which the search ends.
+FOLLOW_POLL_INTERVAL = 0.2
+DEFAULT_IDLE_TIMEOUT = 30.
+
+# Events yielded by iter_events. levels, level_lengths and raw_data are numpy arrays.
+EventRecord = collections.namedtuple('EventRecord', ['channel', 'event_start', 'event_length', 'n_levels',
+                                                     'raw_points_per_side', 'baseline', 'current_blockage', 'area',
+                                                     'levels', 'level_lengths', 'raw_data', 'variance'])
+
+# Number of events copied at a time when merging segment EventDatabases.
+DEF MERGE_CHUNK_ROWS = 1000
+
+# Default number of events fit at a time, in each worker process, by refit_levels.
+DEFAULT_REFIT_CHUNK_EVENTS = 4096
+
+cdef class _SampleBuffer:
+    """
+    Fixed-capacity buffer of the latest points from one channel of the data, indexed by absolute sample number.
 
-cdef _lazy_load_find_events(AbstractReader reader, Parameters parameters, object pipe=None, h5file=None,
-                            save_file_name=None, debug=False):
-    cdef unsigned int event_count = 0
+    Blocks are copied onto the end of one preallocated array. When a block does not fit, the points still needed
+    are moved to the front instead of wrapping around, so any buffered range is a contiguous view that can be
+    copied straight into an event row.
 
-    cdef unsigned int get_blocks = 1
+    The points are kept in the dtype of the first block, float64 or float32. Only the pointer for that dtype is set.
+    """
+    cdef np.ndarray buf
+    cdef DTYPE_t *buf_data
+    cdef DTYPE_SINGLE_t *buf_single
+    cdef public bint single
+    # Absolute sample numbers of buf[0], and one past the last buffered point.
+    cdef public long start
+    cdef public long end
+
+    def __init__(self, long capacity, np.ndarray first_block, long first_sample, long n_padding):
+        """
+        :param capacity: Number of points to hold. Only grows if a block does not fit after dropping old points.
+        :param first_block: First block of data.
+        :param first_sample: Absolute sample number of first_block[0].
+        :param n_padding: Number of points before first_sample to hold, set to first_block[0].
+        """
+        cdef long n = first_block.shape[0]
+        self.single = first_block.dtype == DTYPE_SINGLE
+        self.buf = np.zeros(max(capacity, n_padding + n), dtype=DTYPE_SINGLE if self.single else DTYPE)
+        self._set_pointers()
+        self.buf[:n_padding] = first_block[0]
+        self.buf[n_padding:n_padding + n] = first_block
+        self.start = first_sample - n_padding
+        self.end = first_sample + n
+
+    cdef void _set_pointers(self):
+        if self.single:
+            self.buf_single = <DTYPE_SINGLE_t *> self.buf.data
+            self.buf_data = NULL
+        else:
+            self.buf_data = <DTYPE_t *> self.buf.data
+            self.buf_single = NULL
+
+    cpdef append(self, np.ndarray block, long keep_from):
+        """
+        Appends block to the end of the buffer, dropping points before keep_from if the block does not fit.
+        """
+        self.append_c(block, keep_from)
+
+    cdef void append_c(self, np.ndarray block, long keep_from):
+        cdef long n = block.shape[0]
+        cdef long size = self.end - self.start
+        cdef long drop
+        cdef long itemsize
+        cdef np.ndarray new_buf
+        if size + n > self.buf.shape[0]:
+            drop = min(max(keep_from - self.start, 0), size)
+            if size - drop + n > self.buf.shape[0]:
+                new_buf = np.zeros(size - drop + n, dtype=self.buf.dtype)
+                new_buf[:size - drop] = self.buf[drop:size]
+                self.buf = new_buf
+                self._set_pointers()
+            else:
+                itemsize = self.buf.itemsize
+                memmove(self.buf.data, self.buf.data + drop * itemsize, (size - drop) * itemsize)
+            self.start += drop
+            size -= drop
+        self.buf[size:size + n] = block
+        self.end += n
+
+    cpdef np.ndarray get_range(self, long i, long j):
+        """
+        :returns: A view of the buffered points [i, j), which must all be in the buffer.
+        """
+        return self.get_range_c(i, j)
 
-    cdef unsigned int raw_points_per_side = 50
+    cdef np.ndarray get_range_c(self, long i, long j):
+        return self.buf[i - self.start:j - self.start]
 
-    cdef double sample_rate = reader.get_sample_rate_c()
-    cdef double time_step = 1. / sample_rate
-    # Min and Max number of points in an event
-    cdef unsigned int min_event_steps = np.ceil(parameters.min_event_length * 1e-6 / time_step)
-    cdef unsigned int max_event_steps = np.ceil(parameters.max_event_length * 1e-6 / time_step)
-    cdef long points_per_channel_total = reader.get_points_per_channel_total_c()
+    cpdef copy_range(self, long i, long j, np.ndarray out):
+        """
+        Copies the points [i, j) to the start of out. Points that are not buffered are set to 0.
+        """
+        self.copy_range_c(i, j, out)
+
+    cdef void copy_range_c(self, long i, long j, np.ndarray out):
+        cdef long lo = max(i, self.start)
+        cdef long hi = min(j, self.end)
+        if hi <= lo:
+            out[:j - i] = 0
+            return
+        if lo > i:
+            out[:lo - i] = 0
+        out[lo - i:hi - i] = self.buf[lo - self.start:hi - self.start]
+        if j > hi:
+            out[hi - i:j - i] = 0
+
+cdef class _DebugTraces:
+    """
+    Chunk of the debug traces (data, baseline and thresholds at every point) of one channel, being filled in by
+    the event finder.
+
+    Chunks before the scan are handed to the EventDatabaseWriter, decimated to the min and max of every bin if
+    asked for, so the whole trace is never held in memory.
+    """
+    cdef public np.ndarray data
+    cdef public np.ndarray baseline
+    cdef public np.ndarray threshold_positive
+    cdef public np.ndarray threshold_negative
+    # Absolute index of the first point in the arrays.
+    cdef public long offset
+    cdef long chunk_size
+    cdef long n_points
+    cdef long decimation
+    cdef long channel
+    cdef object event_writer
+
+    def __init__(self, event_writer, long start, long n_points, long decimation, long max_ahead, long channel=0):
+        """
+        :param event_writer: :py:class:`pypore.filetypes.event_database.EventDatabaseWriter` to write chunks with.
+        :param start: Index of the first point to be scanned.
+        :param n_points: Number of points in the data.
+        :param decimation: Number of points in each bin. 1 to keep every point.
+        :param max_ahead: How far past the scan position points can be filled in.
+        :param channel: Channel of the debug group to write to.
+        """
+        if decimation < 1:
+            raise ValueError("debug_decimation must be at least 1, not {0}.".format(decimation))
+        self.event_writer = event_writer
+        self.n_points = n_points
+        self.decimation = decimation
+        self.channel = channel
+        # Keep chunks a whole number of bins, starting on a bin.
+        self.chunk_size = decimation * ((DEBUG_CHUNK_POINTS + decimation - 1) // decimation)
+        self.offset = start - start % decimation
+        self.data = np.zeros(self.chunk_size + max_ahead + start % decimation, dtype=DTYPE)
+        self.baseline = np.zeros_like(self.data)
+        self.threshold_positive = np.zeros_like(self.data)
+        self.threshold_negative = np.zeros_like(self.data)
+
+    cdef void flush_c(self, long i) except *:
+        """
+        Writes the chunks before point i, and moves what is left to the start of the arrays.
+        """
+        cdef long size = self.data.shape[0]
+        cdef long n = self.chunk_size
+        while i - self.offset >= n:
+            self.write_c(n)
+            for array in (self.data, self.baseline, self.threshold_positive, self.threshold_negative):
+                array[:size - n] = array[n:]
+                array[size - n:] = 0
+            self.offset += n
+
+    cdef void close_c(self) except *:
+        """
+        Writes the rest of the traces.
+        """
+        cdef long n = min(self.data.shape[0], self.n_points - self.offset)
+        if n > 0:
+            self.write_c(n)
 
-    cdef BaselineStrategy baseline_type = parameters.baseline_strategy
+    cdef void write_c(self, long n) except *:
+        """
+        Hands the first n points of the traces to the writer.
+        """
+        cdef long d = self.decimation
+        if d == 1:
+            self.event_writer.append_debug(self.offset, self.data[:n].copy(), self.baseline[:n].copy(),
+                                           self.threshold_positive[:n].copy(), self.threshold_negative[:n].copy(),
+                                           self.channel)
+            return
+        # The min and max of every bin, one after the other. The last bin can be partial.
+        cdef long n_bins = (n + d - 1) // d
+        cdef long n_full = (n // d) * d
+        traces = []
+        for array in (self.data, self.baseline, self.threshold_positive, self.threshold_negative):
+            decimated = np.empty(2 * n_bins, dtype=DTYPE)
+            if n_full > 0:
+                bins = array[:n_full].reshape(-1, d)
+                decimated[0:2 * (n_full // d):2] = bins.min(axis=1)
+                decimated[1:2 * (n_full // d):2] = bins.max(axis=1)
+            if n > n_full:
+                decimated[-2] = array[n_full:n].min()
+                decimated[-1] = array[n_full:n].max()
+            traces.append(decimated)
+        self.event_writer.append_debug(2 * (self.offset // d), *traces, channel=self.channel)
+
+cdef long _find_block_event_start(BaselineStrategy baseline_type, ThresholdStrategy threshold_type,
+                                  np.ndarray[DTYPE_t] data, np.ndarray[DTYPE_t] baselines,
+                                  np.ndarray[DTYPE_t] variances, np.ndarray[DTYPE_t] thresholds,
+                                  bint direction_positive, bint direction_negative) except -1:
+    """
+    Block version of the threshold scan in :py:func:`_lazy_load_find_events`.
 
-    # Threshold direction.  -1 for negative, 0 for both, +1 for positive
-    direction_positive = False
-    direction_negative = False
-    if parameters.detect_positive_events:
-        direction_positive = True
-    if parameters.detect_negative_events:
-        direction_negative = True
+    On entry, baselines[0], variances[0] and thresholds[0] must hold the baseline, variance and starting
+    threshold used to check data[0]. The baseline and threshold trajectories are computed for all of data
+    at once, and the first point crossing the threshold is found with array operations.
 
-    # allocate memory for data
-    data_x = reader.get_next_blocks_c(get_blocks)
-    cdef unsigned int n_channels = len(data_x)
-    cdef np.ndarray[DTYPE_t] data = data_x[0]  # only get channel 1
-    del data_x
+    :returns: The index k of the first point in data that starts an event, or data.size if there is none.\
+        On return, the baseline strategy has consumed data[:k], and baselines[k], variances[k] and\
+        thresholds[k] hold the values to check data[k] with.
+    """
+    cdef long n = data.shape[0]
+    cdef long k = n
+    cdef np.ndarray crossings
+
+    state = baseline_type.get_state()
+    baseline_type.compute_baseline_block_c(data, baselines[1:n + 1], variances[1:n + 1])
+    # The starting threshold lags the baseline by one point, like in the scalar loop.
+    threshold_type.compute_starting_threshold_block_c(baselines[:n], variances[:n], thresholds[1:n + 1])
+
+    if direction_negative and direction_positive:
+        crossings = (data < baselines[:n] - thresholds[:n]) | (data > baselines[:n] + thresholds[:n])
+    elif direction_negative:
+        crossings = data < baselines[:n] - thresholds[:n]
+    elif direction_positive:
+        crossings = data > baselines[:n] + thresholds[:n]
+    else:
+        return n
+
+    k = np.argmax(crossings)
+    if not crossings[k]:
+        return n
+
+    # Rewind the strategy and only feed it the points before the event.
+    baseline_type.set_state(state)
+    if k > 0:
+        baseline_type.compute_baseline_block_c(data[:k], baselines[1:k + 1], variances[1:k + 1])
+    return k
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef long _find_kernel_event_start(sample_t *data, long n, BaselineKernel *baseline_kernel,
+                                   ThresholdKernel *threshold_kernel, double *threshold_start,
+                                   bint direction_positive, bint direction_negative) nogil:
+    """
+    Kernel version of the threshold scan in :py:func:`_ChannelDetector.scan_c`, which runs without the GIL.
 
-    cdef unsigned long n = data.size
+    :param data: Pointer to the n points to scan.
+    :param threshold_start: On entry, the starting threshold to check data[0] with.
+    :returns: The index k of the first point in data that starts an event, or n if there is none.\
+        On return, baseline_kernel has consumed data[:k], and threshold_start holds the threshold to check\
+        data[k] with.
+    """
+    cdef long k
+    cdef double data_point
+    cdef double baseline
+    cdef double threshold = threshold_start[0]
+    for k in xrange(n):
+        data_point = data[k]
+        baseline = baseline_kernel.baseline
+        if (direction_negative and data_point < baseline - threshold) or (
+                direction_positive and data_point > baseline + threshold):
+            threshold_start[0] = threshold
+            return k
+        threshold = threshold_kernel_starting(threshold_kernel, baseline, baseline_kernel.variance)
+        baseline_kernel_update(baseline_kernel, data_point)
+    threshold_start[0] = threshold
+    return n
+
+cdef unsigned int _fit_levels(sample_t *data, long n, double baseline, double variance, double step_factor,
+                              double threshold_factor, DTYPE_t *levels, DTYPE_UINT32_t *level_lengths) nogil:
+    """
+    Fits the levels of an event with a CUSUM, see http://pubs.rsc.org/en/content/articlehtml/2012/nr/c2nr30951c.
+
+    The level change the CUSUM looks for is step_factor times the change from baseline to data[0], and a change\
+    is found when its statistic passes threshold_factor times that change over the standard deviation of the\
+    level.
+
+    :param data: Pointer to the n points of the event.
+    :param baseline: The baseline at the start of the event.
+    :param variance: The variance of the baseline at the start of the event.
+    :param levels: Filled in with the mean of each level. Must have room for n levels.
+    :param level_lengths: Filled in with the number of points in each level. Must have room for n levels.
+    :returns: The number of levels.
+    """
+    cdef:
+        unsigned int n_levels = 0
+        double float_inf = DBL_MAX
+        double data_point
+        double mean_estimate = data[0]
+        double var_estimate = variance
+        double delta = step_factor * fabs(mean_estimate - baseline)
+        double new_mean
+        double sn = 0, sp = 0, Sn = 0, Sp = 0, Gn = 0, Gp = 0
+        double min_Sp = float_inf
+        double min_Sn = float_inf
+        double h
+        long event_i = 0
+        long ko = 0
+        long min_index = 0
+        long min_index_p = 0
+        long min_index_n = 0
+        long prev_level_start = 0
+        double level_sum = data[0]
+        double level_sum_minp = data[0]
+        double level_sum_minn = data[0]
+
+    while event_i < n - 1:
+        event_i += 1
+        data_point = data[event_i]
+        # new mean = old_mean + (new_sample - old_mean)/(N)
+        new_mean = mean_estimate + (data_point - mean_estimate) / (1 + event_i - ko)
+        # New variance recursion relation
+        var_estimate = ((event_i - ko) * var_estimate + (data_point - mean_estimate) * (
+            data_point - new_mean)) / (1 + event_i - ko)
+        mean_estimate = new_mean
+        if var_estimate > 0:
+            sp = (delta / var_estimate) * (data_point - mean_estimate - delta / 2.)
+            sn = -(delta / var_estimate) * (data_point - mean_estimate + delta / 2.)
+        elif delta == 0:
+            sp = sn = 0
+        else:
+            sp = sn = float_inf
+        Sp = Sp + sp
+        Sn = Sn + sn
+        Gp = fmax(0.0, Gp + sp)
+        Gn = fmax(0.0, Gn + sn)
+        level_sum += data_point
+        if Sp <= 0:
+            Sp = 0
+            min_Sp = Sp
+            min_index_p = event_i
+            level_sum_minp = level_sum
+        if Sn <= 0:
+            Sn = 0
+            min_Sn = Sn
+            min_index_n = event_i
+            level_sum_minn = level_sum
+        if var_estimate > 0:
+            h = threshold_factor * delta / sqrt(var_estimate)
+        else:
+            # No noise to tell a level change from.
+            h = float_inf
+        # Did we detect a change?
+        if Gp > h or Gn > h:
+            if Gp > h:
+                min_index = min_index_p
+                level_sum = level_sum_minp
+            else:
+                min_index = min_index_n
+                level_sum = level_sum_minn
+            level_lengths[n_levels] = min_index + 1 - ko
+            levels[n_levels] = level_sum / level_lengths[n_levels]
+            n_levels += 1
+            # reset stuff
+            sn = sp = Sn = Sp = Gn = Gp = 0
+            min_Sp = min_Sn = float_inf
+            # Go back to 1 after the level change found
+            ko = event_i = min_index + 1
+            min_index_p = min_index_n = event_i
+            prev_level_start = event_i
+            mean_estimate = data[event_i]
+            level_sum = level_sum_minp = level_sum_minn = mean_estimate
 
-    if n < 100:
-        print 'Not enough data points in file.'
-        if pipe is not None:
-            pipe.close()
-        return 'Not enough data points in file.'
+    level_lengths[n_levels] = n - prev_level_start
+    levels[n_levels] = level_sum / (n - prev_level_start)
+    return n_levels + 1
 
-    if save_file_name is None:
-        # Get the name of the database file we want to save
-        # if we have input.hkd, then save database to
-        # input_Events_YYmmdd_HHMMSS.h5
-        save_file_name = list(reader.get_filename_c())
-        # Remove the .mat off the end
-        for _ in xrange(0, 4):
-            save_file_name.pop()
-        # Get a string with the current year/month/day/hour/minute to label the file
-        day_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        save_file_name.append('_Events_' + day_time + '.h5')
-        save_file_name = "".join(save_file_name)
+def _get_default_save_file_name(filename):
+    """
+    Get the name of the database file we want to save. If we have input.hkd, then the database\
+    is saved to input_Events_YYmmdd_HHMMSS.h5
+    """
+    # Get a string with the current year/month/day/hour/minute to label the file
+    day_time = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Remove the extension off the end
+    return filename[:-4] + '_Events_' + day_time + '.h5'
 
-    cdef unsigned long max_points = max_event_steps + 2 * raw_points_per_side
+# The most precise wall clock on the platform: time.clock on Windows, time.time elsewhere.
+_timer = time.clock if sys.platform == 'win32' else time.time
+
+cdef inline double _now():
+    """
+    :returns: Seconds on the platform's most precise wall clock, for timing the stages of a search.
+    """
+    return _timer()
+
+cdef class _Metrics:
+    """
+    Counters and timers for the stages of a search, shared by every detector in it. Times are seconds of wall time\
+    spent by the search's thread, except write_time. See :py:func:`to_dict`.
+    """
+    cdef public long blocks_read
+    cdef public long points_read
+    cdef public long bytes_read
+    cdef public long peak_buffer_points
+    # Bytes per buffered point, set from the dtype of the data.
+    cdef public long sample_itemsize
+    cdef public double read_time
+    cdef public double scan_time
+    cdef public double level_fit_time
+    cdef public double cache_copy_time
+    cdef public double write_wait_time
+    cdef public double start_time
+    # The writers to add the write times of.
+    cdef public list event_writers
+
+    def __init__(self):
+        self.blocks_read = self.points_read = self.bytes_read = self.peak_buffer_points = 0
+        self.sample_itemsize = np.dtype(DTYPE).itemsize
+        self.read_time = self.scan_time = self.level_fit_time = self.cache_copy_time = self.write_wait_time = 0
+        self.start_time = _now()
+        self.event_writers = []
+
+    cdef void add_blocks_c(self, list blocks, double read_time):
+        """
+        Counts blocks that took read_time seconds to get from the reader.
+        """
+        self.blocks_read += 1
+        self.read_time += read_time
+        if len(blocks) > 0:
+            self.sample_itemsize = blocks[0].itemsize
+        for block in blocks:
+            self.points_read += block.size
+            self.bytes_read += block.nbytes
+
+    cpdef dict to_dict(self, long n_events):
+        """
+        :param n_events: Number of events found so far.
+        :returns: Dict with
+
+            - blocks_read, points_read, bytes_read -- The blocks handed over by the reader, counting every\
+              channel. bytes_read is their size once scaled, not their size in the file.
+            - read_time -- Time waiting for the reader, which includes reading and decoding the data.
+            - scan_time -- Time scanning the data for events, including level_fit_time and cache_copy_time.
+            - level_fit_time -- Time fitting levels to events with CUSUM.
+            - cache_copy_time -- Time copying events into the caches.
+            - write_wait_time -- Time waiting to hand full caches to the writers.
+            - write_time -- Time the writers spent writing to HDF5, on their own threads.
+            - elapsed_time, events, events_per_second, points_per_second.
+            - peak_buffer_points, peak_buffer_bytes -- The most data buffered for the detectors at once.
+        """
+        cdef double elapsed_time = _now() - self.start_time
+        return {'blocks_read': self.blocks_read, 'points_read': self.points_read, 'bytes_read': self.bytes_read,
+                'read_time': self.read_time, 'scan_time': self.scan_time, 'level_fit_time': self.level_fit_time,
+                'cache_copy_time': self.cache_copy_time, 'write_wait_time': self.write_wait_time,
+                'write_time': sum([event_writer.write_time for event_writer in self.event_writers]),
+                'elapsed_time': elapsed_time, 'events': n_events,
+                'events_per_second': n_events / elapsed_time if elapsed_time > 0 else 0.,
+                'points_per_second': self.points_read / elapsed_time if elapsed_time > 0 else 0.,
+                'peak_buffer_points': self.peak_buffer_points,
+                'peak_buffer_bytes': self.peak_buffer_points * self.sample_itemsize}
+
+
+def _combine_metrics(reports, elapsed_time):
+    """
+    Combines the metrics of searches run side by side, such as the segments of a parallel search, which took\
+    elapsed_time seconds in all. Counters and times are added up, and peaks the largest.
+    """
+    combined = {}
+    for report in reports:
+        for key, value in report.items():
+            if key.startswith('peak_'):
+                combined[key] = max(combined.get(key, 0), value)
+            else:
+                combined[key] = combined.get(key, 0) + value
+    combined['elapsed_time'] = elapsed_time
+    combined['events_per_second'] = combined.get('events', 0) / elapsed_time if elapsed_time > 0 else 0.
+    combined['points_per_second'] = combined.get('points_read', 0) / elapsed_time if elapsed_time > 0 else 0.
+    return combined
+
+cdef class _EventOutput:
+    """
+    Hands the events found in every channel to one EventDatabaseWriter, numbering their array rows in the order
+    they are written.
+    """
+    cdef object event_writer
+    cdef public long n_events
+
+    def __init__(self, event_writer):
+        """
+        :param event_writer: :py:class:`pypore.filetypes.event_database.EventDatabaseWriter` to write events with.
+        """
+        self.event_writer = event_writer
+        self.n_events = 0
+
+    cdef void append_c(self, np.ndarray event_rows, np.ndarray raw_data, np.ndarray levels,
+                       np.ndarray level_lengths) except *:
+        """
+        Queues a batch of events. event_rows holds the eventTable rows, as an array of\
+        :py:data:`pypore.filetypes.event_database.EVENT_DTYPE`. Their array_row is filled in here.
+        """
+        cdef long n = self.n_events
+        event_rows['array_row'] = np.arange(n, n + event_rows.shape[0])
+        self.event_writer.append(event_rows, raw_data, levels, level_lengths)
+        self.n_events += event_rows.shape[0]
+
+cdef class _ChannelDetector:
+    """
+    The event search in one channel of the data.
+
+    :py:func:`_lazy_load_find_events` reads each block once, appends every channel of it to that channel's
+    detector and calls :py:func:`scan_c`. A point is only scanned once enough points after it are buffered for
+    any event starting there to end, so an event never needs data that has not been read yet.
+    """
+    cdef public long channel
+    cdef public _SampleBuffer sample_buffer
+    # Absolute index of the next point to scan.
+    cdef public long i
+    # Set if the data ended in the middle of an event, after which nothing more is scanned.
+    cdef public bint finished
+    cdef public long event_count
+
+    cdef BaselineStrategy baseline_type
+    cdef ThresholdStrategy threshold_type
+    cdef bint direction_positive
+    cdef bint direction_negative
+    cdef bint vectorized_scan
+    cdef long min_event_steps
+    cdef long max_event_steps
+    cdef long raw_points_per_side
+    cdef long max_points
+    cdef long max_points_buffered
+    cdef long stop
+    cdef long save_from
+
+    # The baseline, variance and starting threshold to check point i with.
+    cdef double baseline
+    cdef double variance
+    cdef double threshold_start
+
+    # State of the vectorized scan. See scan_c.
+    cdef long scan_chunk
+    cdef long scalar_until
+    cdef long scalar_run
+    cdef np.ndarray block_baselines
+    cdef np.ndarray block_variances
+    cdef np.ndarray block_thresholds
+
+    cdef np.ndarray m_levels
+    cdef np.ndarray m_levels_length
+    cdef double level_step_factor
+    cdef double level_threshold_factor
+
+    # Events found but not handed to the writer yet. The caches that are not stored are None.
+    cdef bint store_raw
+    cdef bint store_levels
+    cdef long num_rows_in_event_cache
+    cdef long event_cache_index
+    cdef np.ndarray event_rows
+    cdef np.ndarray event_cache
+    cdef np.ndarray levels_cache
+    cdef np.ndarray level_length_cache
+
+    cdef _EventOutput output
+    cdef _DebugTraces debug_traces
+    cdef _Metrics metrics
+
+    def __init__(self, long channel, Parameters parameters, BaselineStrategy baseline_type,
+                 ThresholdStrategy threshold_type, long min_event_steps, long max_event_steps,
+                 long raw_points_per_side, np.ndarray first_block, long start, long stop, long save_from,
+                 long num_rows_in_event_cache, _EventOutput output, _DebugTraces debug_traces=None, state=None,
+                 _Metrics metrics=None):
+        """
+        :param channel: Channel of the data searched, saved with each event.
+        :param parameters: :py:class:`Parameters` for event finding.
+        :param baseline_type: Baseline strategy for this channel, not shared with any other.
+        :param threshold_type: Threshold strategy for this channel, not shared with any other.
+        :param first_block: First block of this channel, starting at sample start. Its dtype, float64 or float32,\
+            is the one the points are scanned and the events saved in.
+        :param start: Absolute index of the first point to scan, unless resuming.
+        :param stop: Points from stop on are not scanned, though events starting before can end after it.
+        :param save_from: Events starting before save_from are found, but not saved.
+        :param num_rows_in_event_cache: Number of events to hold before handing them to output.
+        :param output: Where to write the events.
+        :param debug_traces: Debug traces for this channel, or None.
+        :param state: (Optional) State returned by :py:func:`get_state_c` to resume from, instead of starting\
+            at start. The strategies must be the ones saved with it. first_block must start at or before the\
+            raw points of the next point to scan.
+        :param metrics: (Optional) :py:class:`_Metrics` to count the search's stages in.
+        """
+        cdef long n = first_block.shape[0]
+        self.channel = channel
+        self.baseline_type = baseline_type
+        self.threshold_type = threshold_type
+        # Threshold direction.
+        self.direction_positive = parameters.detect_positive_events
+        self.direction_negative = parameters.detect_negative_events
+        self.vectorized_scan = parameters.vectorized_scan
+        self.level_step_factor = parameters.level_step_factor
+        self.level_threshold_factor = parameters.level_threshold_factor
+        self.store_raw = parameters.store_raw
+        self.store_levels = parameters.store_levels
+        self.min_event_steps = min_event_steps
+        self.max_event_steps = max_event_steps
+        self.raw_points_per_side = raw_points_per_side
+        self.max_points = max_event_steps + 2 * raw_points_per_side
+        self.max_points_buffered = self.max_points + n
+        self.stop = stop
+        self.save_from = save_from if save_from > 0 else 0
+        self.i = start
+        self.finished = False
+        self.event_count = 0
+        self.output = output
+        self.debug_traces = debug_traces
+        self.metrics = metrics if metrics is not None else _Metrics()
+
+        if state is None:
+            baseline_type.baseline = first_block[0]
+            baseline_type.initialize_c(first_block[0:100].astype(DTYPE))
+            self.baseline = baseline_type.get_baseline_c()
+            self.variance = baseline_type.get_variance_c()
+            self.threshold_start = threshold_type.compute_starting_threshold_c(self.baseline, self.variance)
+        else:
+            self.i = state['i']
+            self.event_count = state['event_count']
+            self.baseline = state['baseline']
+            self.variance = state['variance']
+            self.threshold_start = state['threshold_start']
+
+        # Holds the samples still needed: the points not scanned yet, plus the raw points before the next one.
+        # Points before the start of the data read as the first point.
+        self.sample_buffer = _SampleBuffer(self.max_points_buffered, first_block, start,
+                                           max(0, start - (self.i - raw_points_per_side)))
+
+        # Points to scan at once. Doubles while no events are found, and drops back to the minimum
+        # after one is, so a noisy stretch does not rescan the whole block after every crossing.
+        self.scan_chunk = MIN_SCAN_CHUNK
+        # Where events are too dense for the vectorized scan to pay off, scan up to scalar_until one point at a
+        # time. The run doubles each time the vectorized scan finds an event within its first few points.
+        self.scalar_until = 0
+        self.scalar_run = MIN_SCAN_CHUNK
+        # Work arrays for the vectorized scan, holding the trajectories of a whole block.
+        cdef long work_size = self.max_points_buffered + 1 if self.vectorized_scan else 0
+        self.block_baselines = np.zeros(work_size, dtype=DTYPE)
+        self.block_variances = np.zeros(work_size, dtype=DTYPE)
+        self.block_thresholds = np.zeros(work_size, dtype=DTYPE)
+
+        self.m_levels = np.zeros(self.max_points, dtype=DTYPE)
+        self.m_levels_length = np.zeros(self.max_points, dtype=DTYPE_UINT32)
+
+        self.num_rows_in_event_cache = num_rows_in_event_cache
+        self.event_cache_index = 0
+        self._new_caches()
+
+    cdef void _new_caches(self):
+        """
+        Makes empty caches, the old ones belonging to the writer now.
+        """
+        # Rows for the eventTable, for the events in the caches.
+        self.event_rows = np.zeros(self.num_rows_in_event_cache, dtype=ed.EVENT_DTYPE)
+        cdef object sample_dtype = self.sample_buffer.buf.dtype
+        self.event_cache = self.levels_cache = self.level_length_cache = None
+        if self.store_raw:
+            self.event_cache = np.zeros((self.num_rows_in_event_cache, self.max_points), dtype=sample_dtype)
+        if self.store_levels:
+            self.levels_cache = np.zeros((self.num_rows_in_event_cache, self.max_points), dtype=sample_dtype)
+            self.level_length_cache = np.zeros((self.num_rows_in_event_cache, self.max_points),
+                                               dtype=DTYPE_UINT32)
+        self.event_cache_index = 0
+
+    cdef void flush_events_c(self) except *:
+        """
+        Hands the events in the caches to the writer.
+        """
+        cdef long n = self.event_cache_index
+        if n == 0:
+            return
+        cdef double time_start = _now()
+        if n < self.num_rows_in_event_cache:
+            self.output.append_c(self.event_rows[:n], self.event_cache[:n] if self.store_raw else None,
+                                 self.levels_cache[:n] if self.store_levels else None,
+                                 self.level_length_cache[:n] if self.store_levels else None)
+        else:
+            # Hand the full caches to the writer, which blocks if it is too far behind,
+            # and keep going with new ones.
+            self.output.append_c(self.event_rows, self.event_cache, self.levels_cache, self.level_length_cache)
+        self._new_caches()
+        self.metrics.write_wait_time += _now() - time_start
+
+    cdef dict get_state_c(self):
+        """
+        :returns: What is needed to resume the search from the next point to scan, once the events found so\
+            far are written. Includes copies of the strategies.
+        """
+        return {'channel': self.channel, 'i': self.i, 'event_count': self.event_count, 'baseline': self.baseline,
+                'variance': self.variance, 'threshold_start': self.threshold_start,
+                'baseline_strategy': copy.deepcopy(self.baseline_type),
+                'threshold_strategy': copy.deepcopy(self.threshold_type)}
+
+    cdef bint is_done_c(self):
+        """
+        :returns: True once there is nothing left to scan in this channel.
+        """
+        return self.finished or self.i >= self.stop
 
-    # Open the event database
-    if h5file is None:
-        h5file = ed.open_file(save_file_name, maxEventLength=max_points, mode='w', debug=debug, n_points=points_per_channel_total,
-                              n_channels=n_channels, threshold_positive=parameters.detect_positive_events,
-                                threshold_negative=parameters.detect_negative_events)
-    raw_data = h5file.root.events.raw_data
-    levels_matrix = h5file.root.events.levels
-    lengths_matrix = h5file.root.events.level_lengths
+    cdef void append_c(self, np.ndarray block):
+        """
+        Appends the next block of this channel to the buffer, keeping the raw points before the next point to scan.
+        """
+        self.sample_buffer.append_c(block, self.i - self.raw_points_per_side)
+
+    cdef int scan_c(self, bint at_end) except -1:
+        """
+        Scans the buffered points, up to the last one an event can start at and still end, with its raw points,\
+        in the buffer.
 
-    cdef double data_point = data[0]
+        :param at_end: True if there is no more data. Then every buffered point is scanned, and the raw points\
+            after an event that are past the end of the data are saved as 0.
+        """
+        cdef:
+            _SampleBuffer sample_buffer = self.sample_buffer
+            BaselineStrategy baseline_type = self.baseline_type
+            ThresholdStrategy threshold_type = self.threshold_type
+            bint direction_positive = self.direction_positive
+            bint direction_negative = self.direction_negative
+            bint vectorized_scan = self.vectorized_scan
+            bint debug = self.debug_traces is not None
+            _DebugTraces debug_traces = self.debug_traces
+
+            unsigned int min_event_steps = self.min_event_steps
+            unsigned int max_event_steps = self.max_event_steps
+            unsigned int raw_points_per_side = self.raw_points_per_side
+            long max_points_buffered = self.max_points_buffered
+
+            # Absolute index of the point being scanned.
+            long i = self.i
+            long stop_index = self.stop
+            long save_from_index = self.save_from
+            # Points from scan_end on are left for the next call.
+            long scan_end = sample_buffer.end
+            long event_i = 0
+            long event_start = 0
+            long event_end = 0
+
+            double data_point = 0
+            unsigned int n_levels = 0
+            double event_area = 0  # integrate the area
+            double current_blockage = 0
+            int qq = 0
+            long temp_long = 0
+            double baseline = self.baseline
+            double variance = self.variance
+            double threshold_start = self.threshold_start
+            double threshold_end = 0.0
+            bint is_event = False
+            bint was_event_positive = False  # Was the event an up spike?
+            bint done = False
+            bint save_event = False
+            bint data_left = True
+            bint store_raw = self.store_raw
+            bint store_levels = self.store_levels
+            # Raw pointer into the sample buffer, and the absolute sample number it points to.
+            DTYPE_t *buffer_data = sample_buffer.buf_data
+            DTYPE_SINGLE_t *buffer_single = sample_buffer.buf_single
+            bint single = sample_buffer.single
+            long buffer_start = sample_buffer.start
+
+            np.ndarray[DTYPE_t] m_levels = self.m_levels
+            np.ndarray[DTYPE_UINT32_t] m_levels_length = self.m_levels_length
+            DTYPE_t *m_levels_data = <DTYPE_t *> m_levels.data
+            DTYPE_UINT32_t *m_levels_length_data = <DTYPE_UINT32_t *> m_levels_length.data
+            double level_step_factor = self.level_step_factor
+            double level_threshold_factor = self.level_threshold_factor
+
+            np.ndarray[_EventRow] event_rows = self.event_rows
+            _EventRow *event_row
+            np.ndarray event_cache = self.event_cache
+            np.ndarray levels_cache = self.levels_cache
+            np.ndarray[DTYPE_UINT32_t, ndim = 2] level_length_cache = self.level_length_cache
+
+            np.ndarray[DTYPE_t] debug_data_matrix = debug_traces.data if debug else None
+            np.ndarray[DTYPE_t] debug_baseline_matrix = debug_traces.baseline if debug else None
+            np.ndarray[DTYPE_t] debug_threshold_pos_matrix = debug_traces.threshold_positive if debug else None
+            np.ndarray[DTYPE_t] debug_threshold_neg_matrix = debug_traces.threshold_negative if debug else None
+            # Absolute index of the start of the debug arrays
+            long debug_offset = debug_traces.offset if debug else 0
+
+            long block_k = 0
+            long block_end = 0
+            long scan_chunk = self.scan_chunk
+            long scalar_until = self.scalar_until
+            long scalar_run = self.scalar_run
+            np.ndarray[DTYPE_t] block_baselines = self.block_baselines
+            np.ndarray[DTYPE_t] block_variances = self.block_variances
+            np.ndarray[DTYPE_t] block_thresholds = self.block_thresholds
+
+            # Built-in strategies without debug traces are scanned with their kernels, without the GIL.
+            BaselineKernel baseline_kernel
+            ThresholdKernel threshold_kernel
+            bint kernel_scan = False
+
+            _Metrics metrics = self.metrics
+            double scan_start_time = _now()
+            double time_start = 0
+
+        if self.finished:
+            return 0
+        if not debug and not vectorized_scan:
+            kernel_scan = baseline_type.get_kernel_c(&baseline_kernel) and \
+                          threshold_type.get_kernel_c(&threshold_kernel)
+        if not at_end:
+            scan_end -= max_event_steps + raw_points_per_side
+        if scan_end > stop_index:
+            scan_end = stop_index
+
+        # search for events.  Keep track of baseline_filter_parameter filtered local (adapting!) mean and variance,
+        # and use them to decide baseline_filter_parameter threshold_start for events.  See
+        # http://pubs.rsc.org/en/content/articlehtml/2012/nr/c2nr30951c for more details.
+        while i < scan_end:
+            if debug and i - debug_offset >= debug_traces.chunk_size:
+                debug_traces.flush_c(i)
+                debug_offset = debug_traces.offset
+            if kernel_scan:
+                # Scan up to the next event start without the GIL. That point goes through the scalar code below.
+                baseline_type.get_kernel_c(&baseline_kernel)
+                with nogil:
+                    if single:
+                        block_k = _find_kernel_event_start(buffer_single + (i - buffer_start), scan_end - i,
+                                                           &baseline_kernel, &threshold_kernel, &threshold_start,
+                                                           direction_positive, direction_negative)
+                    else:
+                        block_k = _find_kernel_event_start(buffer_data + (i - buffer_start), scan_end - i,
+                                                           &baseline_kernel, &threshold_kernel, &threshold_start,
+                                                           direction_positive, direction_negative)
+                baseline_type.set_kernel_c(&baseline_kernel)
+                baseline = baseline_kernel.baseline
+                variance = baseline_kernel.variance
+                i += block_k
+                if i >= scan_end:
+                    break
+            elif vectorized_scan and i >= scalar_until and i + 1 < scan_end:
+                # Scan a chunk of the data at once (never the last point to scan), stopping at the first point
+                # that starts an event. That point (or the one after the chunk) goes through the scalar code below.
+                # The strategies' block methods take float64, so float32 chunks are converted.
+                block_end = min(scan_end - 1, i + scan_chunk)
+                if block_baselines.size < block_end - i + 1:
+                    block_baselines = np.zeros(block_end - i + 1, dtype=DTYPE)
+                    block_variances = np.zeros(block_end - i + 1, dtype=DTYPE)
+                    block_thresholds = np.zeros(block_end - i + 1, dtype=DTYPE)
+                block_baselines[0] = baseline
+                block_variances[0] = variance
+                block_thresholds[0] = threshold_start
+                block_k = _find_block_event_start(baseline_type, threshold_type,
+                                                  sample_buffer.get_range_c(i, block_end).astype(DTYPE, copy=False),
+                                                  block_baselines, block_variances, block_thresholds,
+                                                  direction_positive, direction_negative)
+                if i + block_k < block_end:
+                    scan_chunk = MIN_SCAN_CHUNK
+                elif scan_chunk < max_points_buffered:
+                    scan_chunk *= 2
+                if block_k < MIN_SCAN_CHUNK and i + block_k < block_end:
+                    scalar_until = i + block_k + scalar_run
+                    if scalar_run < MAX_SCALAR_RUN:
+                        scalar_run *= 2
+                else:
+                    scalar_run = MIN_SCAN_CHUNK
+                if debug:
+                    temp_long = i - debug_offset
+                    debug_data_matrix[temp_long:temp_long + block_k] = sample_buffer.get_range_c(i, i + block_k)
+                    debug_baseline_matrix[temp_long:temp_long + block_k] = block_baselines[:block_k]
+                    if direction_positive:
+                        debug_threshold_pos_matrix[temp_long:temp_long + block_k] = \
+                            block_baselines[:block_k] + block_thresholds[:block_k]
+                    if direction_negative:
+                        debug_threshold_neg_matrix[temp_long:temp_long + block_k] = \
+                            block_baselines[:block_k] - block_thresholds[:block_k]
+                baseline = block_baselines[block_k]
+                variance = block_variances[block_k]
+                threshold_start = block_thresholds[block_k]
+                i += block_k
+
+            if single:
+                data_point = buffer_single[i - buffer_start]
+            else:
+                data_point = buffer_data[i - buffer_start]
+
+            # Detecting a negative event
+            if direction_negative and data_point < baseline - threshold_start:
+                is_event = True
+                was_event_positive = False
+            # Detecting a positive event
+            elif direction_positive and data_point > baseline + threshold_start:
+                is_event = True
+                was_event_positive = True
+            if debug:
+                debug_data_matrix[i - debug_offset] = data_point
+                debug_baseline_matrix[i - debug_offset] = baseline
+                if direction_positive:
+                    debug_threshold_pos_matrix[i - debug_offset] = baseline + threshold_start
+                if direction_negative:
+                    debug_threshold_neg_matrix[i - debug_offset] = baseline - threshold_start
+            threshold_start = threshold_type.compute_starting_threshold_c(baseline, variance)
+            if is_event:
+                is_event = False
+                time_start = _now()
+                # Set ending threshold_end
+                threshold_end = threshold_type.compute_ending_threshold_c(baseline, variance)
+                event_start = i
+                event_end = i + 1
+                done = False
+                event_i = i
+                event_area = data_point  # integrate the area
+
+                # loop until event ends
+                while event_i - event_start < max_event_steps:
+                    event_i += 1
+                    if event_i >= sample_buffer.end:
+                        # Only happens at the end of the data.
+                        data_left = False
+                        print "Done"
+                        break
+                    if single:
+                        data_point = buffer_single[event_i - buffer_start]
+                    else:
+                        data_point = buffer_data[event_i - buffer_start]
+                    if debug:
+                        debug_data_matrix[event_i - debug_offset] = data_point
+                        debug_baseline_matrix[event_i - debug_offset] = baseline
+                        if direction_positive:
+                            debug_threshold_pos_matrix[event_i - debug_offset] = baseline + threshold_end
+                        if direction_negative:
+                            debug_threshold_neg_matrix[event_i - debug_offset] = baseline - threshold_end
+                    if (not was_event_positive and data_point >= baseline - threshold_end) or (
+                                was_event_positive and data_point <= baseline + threshold_end):
+                        event_end = event_i
+                        done = True
+                        break
 
-    baseline_type.baseline = data_point
+                if not data_left:
+                    # The data ended in the middle of an event.
+                    self.finished = True
+                    break
 
-    cdef ThresholdStrategy threshold_type = parameters.threshold_strategy
+                i = event_end
+                # is the event long enough? (and not in the part of the data we skip saving)
+                save_event = done and event_end - event_start > min_event_steps and event_start >= save_from_index
+                if save_event:
+                    # CUSUM stuff
+                    # otherwise just say 1 level and use the maximum change as the value
+                    if event_end - event_start < 10:
+                        n_levels = 1
+                        if was_event_positive:
+                            current_blockage = np.max(sample_buffer.get_range_c(event_start, event_end))
+                            m_levels[0] = current_blockage
+                            current_blockage -= baseline
+                        else:
+                            current_blockage = np.min(sample_buffer.get_range_c(event_start, event_end))
+                            m_levels[0] = current_blockage
+                            current_blockage -= baseline
+                        m_levels_length[0] = event_end - event_start
+                    else:
+                        with nogil:
+                            if single:
+                                n_levels = _fit_levels(buffer_single + (event_start - buffer_start),
+                                                       event_end - event_start, baseline, variance,
+                                                       level_step_factor, level_threshold_factor, m_levels_data,
+                                                       m_levels_length_data)
+                            else:
+                                n_levels = _fit_levels(buffer_data + (event_start - buffer_start),
+                                                       event_end - event_start, baseline, variance,
+                                                       level_step_factor, level_threshold_factor, m_levels_data,
+                                                       m_levels_length_data)
+                        current_blockage = 0
+                        # calculate the weighted average of the levels
+                        for qq in xrange(n_levels):
+                            current_blockage += m_levels[qq] * m_levels_length[qq]
+                        current_blockage = current_blockage / (event_end - event_start) - baseline
+                metrics.level_fit_time += _now() - time_start
+
+                if save_event:
+                    # end CUSUM, save events to file/cache. The array_row is filled in by the output.
+                    time_start = _now()
+                    event_row = &event_rows[self.event_cache_index]
+                    event_row.event_start = event_start
+                    event_row.event_length = event_end - event_start
+                    event_row.n_levels = n_levels
+                    event_row.raw_points_per_side = raw_points_per_side
+                    event_row.baseline = baseline
+                    event_row.current_blockage = current_blockage
+                    event_row.area = event_area - baseline
+                    event_row.channel = self.channel
+                    event_row.variance = variance
+
+                    if store_raw:
+                        sample_buffer.copy_range_c(event_start - raw_points_per_side,
+                                                   event_end + raw_points_per_side,
+                                                   event_cache[self.event_cache_index])
+                    if store_levels:
+                        levels_cache[self.event_cache_index][:n_levels] = m_levels[:n_levels]
+                        level_length_cache[self.event_cache_index][:n_levels] = m_levels_length[:n_levels]
+                    metrics.cache_copy_time += _now() - time_start
+
+                    self.event_count += 1
+                    self.event_cache_index += 1
+
+                    if self.event_cache_index >= self.num_rows_in_event_cache:
+                        self.flush_events_c()
+                        event_rows = self.event_rows
+                        event_cache = self.event_cache
+                        levels_cache = self.levels_cache
+                        level_length_cache = self.level_length_cache
+
+            baseline = baseline_type.compute_baseline_c(data_point)
+            variance = baseline_type.compute_variance_c(data_point)
+            i += 1
+
+        self.i = i
+        self.baseline = baseline
+        self.variance = variance
+        self.threshold_start = threshold_start
+        self.scan_chunk = scan_chunk
+        self.scalar_until = scalar_until
+        self.scalar_run = scalar_run
+        self.block_baselines = block_baselines
+        self.block_variances = block_variances
+        self.block_thresholds = block_thresholds
+        metrics.scan_time += _now() - scan_start_time
+        return 0
+
+cdef long _get_event_bytes(Parameters parameters, long max_points, long itemsize):
+    """
+    :returns: The number of bytes of the caches taken by each event, for sizing them.
+    """
+    if parameters.store_raw or parameters.store_levels:
+        return max_points * itemsize
+    return ed.EVENT_DTYPE.itemsize
 
-    cdef double threshold_start = 0.0
-    cdef double threshold_end = 0.0
+cdef class _Search:
+    """
+    One search for events, with its own Parameters and EventDatabase, and a :py:class:`_ChannelDetector` for every
+    channel of the data. :py:func:`_lazy_load_sweep_events` feeds the blocks it reads to every search.
+    """
+    cdef public object h5file
+    cdef public object save_file_name
+    cdef public object event_writer
+    cdef public _EventOutput output
+    cdef public list detectors
+    cdef public bint debug
+
+    def __init__(self, Parameters parameters, h5file, save_file_name, checkpoint, list first_blocks, long read_from,
+                 long stop, long save_from, unsigned int raw_points_per_side, long points_per_channel_total,
+                 double sample_rate, bint debug, long debug_decimation, bint compact, long cache_bytes,
+                 _Metrics metrics):
+        """
+        Opens the EventDatabase, if h5file is None, and sets up a detector for every channel in first_blocks,\
+        which start at sample read_from. With a checkpoint, the detectors carry on from it. The detectors count\
+        their stages in metrics.
+        """
+        cdef double time_step = 1. / sample_rate
+        # Min and Max number of points in an event
+        cdef unsigned int min_event_steps = np.ceil(parameters.min_event_length * 1e-6 / time_step)
+        cdef unsigned int max_event_steps = np.ceil(parameters.max_event_length * 1e-6 / time_step)
+        cdef unsigned long max_points = max_event_steps + 2 * raw_points_per_side
+        cdef unsigned int n_channels = len(first_blocks)
+        cdef unsigned long n = first_blocks[0].size
+        # The events are saved in the dtype of the data.
+        sample_dtype = first_blocks[0].dtype
+
+        # Open the event database
+        if h5file is None:
+            h5file = ed.open_file(save_file_name, maxEventLength=max_points, mode='w', debug=debug,
+                                  n_points=points_per_channel_total, debug_decimation=debug_decimation,
+                                  compact=compact, n_channels=n_channels, dtype=sample_dtype,
+                                  store_raw=parameters.store_raw, store_levels=parameters.store_levels,
+                                  threshold_positive=parameters.detect_positive_events,
+                                  threshold_negative=parameters.detect_negative_events)
+        self.h5file = h5file
+        self.save_file_name = save_file_name
+        self.debug = debug
+
+        # Figure out how many rows fit in cache_bytes, shared between the channels.
+        cdef long num_rows_in_event_cache = max(1, int(cache_bytes / _get_event_bytes(parameters, max_points,
+                                                                                       sample_dtype.itemsize))
+                                                   // n_channels)
+        # Writes the caches on a background thread, once they are full.
+        self.event_writer = ed.EventDatabaseWriter(h5file)
+        metrics.event_writers.append(self.event_writer)
+        self.output = _EventOutput(self.event_writer)
+        if checkpoint is not None:
+            self.output.n_events = checkpoint['n_events']
+
+        # One detector per channel. The first uses the strategies in parameters, the others copies of them.
+        self.detectors = []
+        cdef _DebugTraces debug_traces = None
+        cdef unsigned int channel
+        for channel in xrange(n_channels):
+            state = None
+            if checkpoint is not None:
+                state = checkpoint['detectors'][channel]
+                baseline_type = state['baseline_strategy']
+                threshold_type = state['threshold_strategy']
+            elif channel == 0:
+                baseline_type = parameters.baseline_strategy
+                threshold_type = parameters.threshold_strategy
+            else:
+                baseline_type = copy.deepcopy(parameters.baseline_strategy)
+                threshold_type = copy.deepcopy(parameters.threshold_strategy)
+            if debug:
+                # The debug traces are filled in a chunk at a time, and handed to the writer as the scan moves
+                # past them. Within an event, points up to max_event_steps ahead of the scan are filled in.
+                debug_traces = _DebugTraces(self.event_writer, read_from, points_per_channel_total,
+                                            debug_decimation, max_points + n + max_event_steps + 2, channel)
+            self.detectors.append(_ChannelDetector(channel, parameters, baseline_type, threshold_type,
+                                                   min_event_steps, max_event_steps, raw_points_per_side,
+                                                   first_blocks[channel], read_from, stop, save_from,
+                                                   num_rows_in_event_cache, self.output, debug_traces, state,
+                                                   metrics))
+
+    cdef long get_event_count_c(self):
+        """
+        :returns: The number of events found so far, including those not handed to the writer yet.
+        """
+        cdef long event_count = 0
+        cdef _ChannelDetector detector
+        for detector in self.detectors:
+            event_count += detector.event_count
+        return event_count
 
-    initialization_index = 100
+    cdef void flush_c(self) except *:
+        """
+        Writes the events found so far, and waits for the writer to finish.
+        """
+        cdef _ChannelDetector detector
+        for detector in self.detectors:
+            detector.flush_events_c()
+        self.event_writer.flush()
 
-    baseline_type.initialize_c(data[0:initialization_index])
+    cdef void save_checkpoint_c(self) except *:
+        """
+        Saves a checkpoint to the EventDatabase with the state of every detector, so the search can be resumed\
+        from here. Only call this after :py:func:`flush_c`, while no writer is busy.
+        """
+        cdef _ChannelDetector detector
+        self.h5file.save_checkpoint({'n_events': self.output.n_events,
+                                     'detectors': [detector.get_state_c() for detector in self.detectors]})
 
-    data_cache = [np.zeros(n, dtype=DTYPE) + data_point, data]
+    cdef void close_c(self) except *:
+        """
+        Hands the last events and debug traces to the writer, and waits for it to write them.
+        """
+        cdef _ChannelDetector detector
+        for detector in self.detectors:
+            detector.flush_events_c()
+            if self.debug:
+                detector.debug_traces.close_c()
+        self.event_writer.close()
+
+    cdef void close_after_error_c(self) except *:
+        """
+        Stops the writer and closes the EventDatabase after the search failed, as of the last checkpoint, so the\
+        search can be resumed. Errors stopping the writer are dropped, in favor of the one that stopped the search.
+        """
+        try:
+            self.event_writer.close()
+        except Exception:
+            pass
+        self.h5file.close()
 
-    is_event = False
-    was_event_positive = False  # Was the event an up spike?
+    cdef object finish_c(self, double sample_rate, data_filename, dict metrics):
+        """
+        Removes the checkpoint, saves the search's attributes, with metrics as a JSON report, and closes the\
+        EventDatabase, after :py:func:`close_c`.
 
-    # Figure out how many rows will it take to have a cache of 10MB (1048576 bytes = 1MB)
-    cdef num_rows_in_event_cache = int(10 * 1048576 / (max_points * (np.dtype(DTYPE).itemsize)))
-    # Make an array to hold events in memory before writing to disk.
-    cdef np.ndarray[DTYPE_t, ndim = 2] event_cache = np.zeros((num_rows_in_event_cache, max_points), dtype=DTYPE)
-    cdef np.ndarray[DTYPE_t, ndim = 2] levels_cache = np.zeros((num_rows_in_event_cache, max_points), dtype=DTYPE)
-    cdef np.ndarray[DTYPE_UINT32_t, ndim = 2] level_length_cache = np.zeros((num_rows_in_event_cache, max_points),
-                                                                            dtype=DTYPE_UINT32)
+        :returns: The name of the EventDatabase, or None if no events were found. Then the EventDatabase is\
+            deleted, unless debugging.
+        """
+        h5file = self.h5file
+        cdef long event_count = self.output.n_events
+        h5file.remove_checkpoint()
+        if event_count > 0 or self.debug:
+            # Save the file
+            # add attributes
+            h5file.root.events.eventTable.flush()  # if you don't flush before adding attributes,
+            # PyTables might print a warning
+            h5file.root.events.eventTable.attrs.sample_rate = sample_rate
+            h5file.root.events.eventTable.attrs.eventCount = event_count
+            h5file.root.events.eventTable.attrs.dataFilename = data_filename
+            h5file.root.events.eventTable.attrs.metrics = json.dumps(metrics, sort_keys=True)
+
+            h5file.flush()
+            h5file.close()
+            return self.save_file_name
+        else:
+            # if no events, just delete the file, if we're not debugging.
+            h5file.flush()
+            h5file.close()
+            os.remove(self.save_file_name)
+        return None
+
+cdef object _wait_for_data(AbstractReader reader, long n_blocks, double idle_timeout):
+    """
+    Checks reader for data appended to its file every FOLLOW_POLL_INTERVAL seconds, until there is some, or none\
+    has come for idle_timeout seconds.
 
-    cdef event_cache_index = 0
+    :returns: The next n_blocks blocks, or empty blocks if there was no more data.
+    """
+    cdef double wait_start_time = time.time()
+    while True:
+        time.sleep(min(FOLLOW_POLL_INTERVAL, max(0., wait_start_time + idle_timeout - time.time())))
+        reader.refresh_c()
+        data_x = reader.get_next_blocks_c(n_blocks)
+        if data_x[0].size > 0 or time.time() - wait_start_time >= idle_timeout:
+            return data_x
 
-    cdef:
+cdef _lazy_load_find_events(AbstractReader reader, Parameters parameters, object pipe=None, h5file=None,
+                            save_file_name=None, debug=False, long start=0, long stop=-1, long save_from=0,
+                            long debug_decimation=1, bint compact=False, double checkpoint_interval=0,
+                            bint resume=False, metrics_callback=None, bint follow=False, double idle_timeout=0):
+    """
+    Finds the events in every channel of reader in one pass over the data, and saves them to an EventDatabase.
+    Each channel is searched with its own copy of the strategies, and its events saved with its channel number.
 
-        unsigned long i = 0
-        unsigned long event_i = 0
-        unsigned long min_index = 0
-        unsigned long prev_i = 0
+    Only [start, stop) of the data is scanned for events, though events starting before stop can end after it.
+    Events starting before save_from are found, but not saved.
+
+    With debug, the data, baseline and thresholds at every point are streamed to the debug group, as the min and\
+    max of every debug_decimation points if that is more than 1. With compact, a new EventDatabase is created\
+    with the compact layout.
+
+    Without debug, a checkpoint is saved to the EventDatabase every checkpoint_interval seconds, if that is more\
+    than 0. With resume, the search carries on from the checkpoint in the EventDatabase, if there is one, instead\
+    of starting over. The checkpoint is removed once the search is done.
+
+    With every status update, and once the search is done, metrics_callback is called, if given, with the dict of\
+    :py:func:`_Metrics.to_dict`. The final metrics are saved to the EventDatabase as a JSON report.
+
+    With follow, the search keeps going as data is appended to the file, until none comes for idle_timeout\
+    seconds. See :py:func:`_lazy_load_sweep_events`.
+    """
+    if save_file_name is None:
+        save_file_name = _get_default_save_file_name(reader.get_filename_c())
+    result = _lazy_load_sweep_events(reader, [parameters], pipe, [h5file], [save_file_name], debug, start, stop,
+                                     save_from, debug_decimation, compact, checkpoint_interval, resume,
+                                     metrics_callback, follow, idle_timeout)
+    if isinstance(result, basestring):
+        return result
+    return result[0]
+
+cdef _lazy_load_sweep_events(AbstractReader reader, list parameters_list, object pipe, list h5files,
+                             list save_file_names, debug=False, long start=0, long stop=-1, long save_from=0,
+                             long debug_decimation=1, bint compact=False, double checkpoint_interval=0,
+                             bint resume=False, metrics_callback=None, bint follow=False, double idle_timeout=0):
+    """
+    Does the search of :py:func:`_lazy_load_find_events` with every Parameters in parameters_list at once, saving\
+    the events of each to the matching EventDatabase in h5files, or save_file_names where that is None. Each\
+    block is read and scaled once, and handed to every search.
+
+    With follow, the data is searched as it is appended to the file. Whenever the data runs out, the events found\
+    so far are written, and the file is checked for more data until none has come for idle_timeout seconds.\
+    Without a stop, the search then goes to the end of the data, wherever that is.
+
+    :returns: A list with the name of each EventDatabase, or None for those without events.
+    """
+    cdef unsigned int get_blocks = 1
+
+    # Enough raw points before the next point to scan for every search.
+    cdef unsigned int raw_points_per_side = max([parameters.raw_points_per_side for parameters in parameters_list])
+
+    cdef double sample_rate = reader.get_sample_rate_c()
+    cdef long points_per_channel_total = reader.get_points_per_channel_total_c()
+    cdef unsigned int n_searches = len(parameters_list)
+
+    if follow:
+        # The data can grow past what is in the file now.
+        if stop < 0:
+            stop = LONG_MAX
+    elif stop < 0 or stop > points_per_channel_total:
+        stop = points_per_channel_total
+    # Number of points we will scan, as far as we know, used for status updates.
+    cdef long points_to_scan = min(stop, points_per_channel_total) - start
+
+    # Pick up where an earlier search left off, if it saved a checkpoint.
+    cdef list checkpoints = [None] * n_searches
+    cdef unsigned int k
+    if resume:
+        for k in xrange(n_searches):
+            if h5files[k] is None and os.path.isfile(save_file_names[k]):
+                h5files[k] = ed.open_file(save_file_names[k], mode='a')
+                if not h5files[k].has_checkpoint():
+                    h5files[k].close()
+                    h5files[k] = None
+            if h5files[k] is not None:
+                checkpoints[k] = h5files[k].load_checkpoint()
+
+    # Absolute index of the first point read. When resuming, the raw points before the next point to scan
+    # are read again.
+    cdef long read_from = stop
+    for checkpoint in checkpoints:
+        if checkpoint is None:
+            read_from = start
+        else:
+            read_from = min(read_from, min([state['i'] for state in checkpoint['detectors']]) - raw_points_per_side)
+    read_from = max(start, read_from)
+
+    cdef _Metrics metrics = _Metrics()
+    cdef double read_start_time = _now()
+    if read_from > 0:
+        reader.seek_c(read_from)
+
+    data_x = reader.get_next_blocks_c(get_blocks)
+    metrics.add_blocks_c(data_x, _now() - read_start_time)
+    cdef unsigned long n = data_x[0].size
+
+    if n < 100 and checkpoints.count(None) == n_searches:
+        print 'Not enough data points in file.'
+        if pipe is not None:
+            pipe.close()
+        return 'Not enough data points in file.'
+
+    # The event caches of all the searches share 10MB (1048576 bytes = 1MB).
+    cdef list searches = []
+    for k in xrange(n_searches):
+        searches.append(_Search(parameters_list[k], h5files[k], save_file_names[k], checkpoints[k], data_x,
+                                read_from, stop, save_from, parameters_list[k].raw_points_per_side,
+                                points_per_channel_total,
+                                sample_rate, debug, debug_decimation, compact, 10 * 1048576 // n_searches,
+                                metrics))
+    del data_x
+
+    cdef list detectors = []
+    cdef _Search search
+    for search in searches:
+        detectors.extend(search.detectors)
+
+    cdef:
+        _ChannelDetector detector
+        _ChannelDetector first_detector = detectors[0]
+        long prev_i = first_detector.i
+        long i = first_detector.i
         double time1 = time.time()
+        double last_checkpoint_time = time1
         double time2 = time1
         double time_temp = 0
-        unsigned long event_start = 0
-        unsigned long event_end = 0
-        unsigned long start_index = 0
-        unsigned long end_index = 0
-        unsigned long place_in_data = 0
-
-        double mean_estimate = 0.0
-        double sn = 0
-        double sp = 0
-        double Sn = 0
-        double Sp = 0
-        double Gn = 0
-        double Gp = 0
-        double new_mean = 0
-        double var_estimate = 0
-        unsigned int n_levels = 0
-        double delta = 0
-        unsigned long min_index_p = 0
-        unsigned long min_index_n = 0
-        double float_inf = np.finfo('d').max
-        double min_Sp = float_inf
-        double min_Sn = float_inf
-        long ko = i
-        double event_area = data_point - baseline_type.get_baseline_c()  # integrate the area
-        double current_blockage = 0
-        int cache_index = 0
-        unsigned int size = 0
-        double h = 0
         double percent_done = 0
         double rate = 0
         double total_rate = 0
         int time_left = 0
-        int qq = 0
-        int cache_size = 0
-        long cache_refreshes = 0  # number of times we get new data at the
-        # end of the loop
-        double temp = 0
-        long temp_long = 0
-        double baseline = baseline_type.get_baseline_c()
-        double variance = baseline_type.get_variance_c()
-
-        #         np.ndarray[DTYPE_t] level_values
-        np.ndarray[DTYPE_t] curr_data = data_cache[1]  # data in dataCache[1]
-
-        np.ndarray[DTYPE_t] m_levels = np.zeros(max_points, dtype=DTYPE)
-        np.ndarray[DTYPE_UINT32_t] m_levels_length = np.zeros(max_points, dtype=DTYPE_UINT32)
-
-        double level_sum = 0
-        long prev_level_start = 0
-
-        int last_event_sent = 0
-
-        np.ndarray[DTYPE_t] debug_data_matrix = np.zeros(points_per_channel_total if debug else 0, dtype=DTYPE)
-        np.ndarray[DTYPE_t] debug_baseline_matrix = np.zeros(points_per_channel_total if debug else 0, dtype=DTYPE)
-        np.ndarray[DTYPE_t] debug_threshold_pos_matrix = np.zeros(points_per_channel_total if debug else 0, dtype=DTYPE)
-        np.ndarray[DTYPE_t] debug_threshold_neg_matrix = np.zeros(points_per_channel_total if debug else 0, dtype=DTYPE)
-
-    threshold_start = threshold_type.compute_starting_threshold_c(baseline, variance)
-    # search for events.  Keep track of baseline_filter_parameter filtered local (adapting!) mean and variance,
-    # and use them to decide baseline_filter_parameter threshold_start for events.  See
-    # http://pubs.rsc.org/en/content/articlehtml/2012/nr/c2nr30951c for more details.
-    while i < n:
-        data_point = curr_data[i]
-
-        # Detecting a negative event
-        if direction_negative and data_point < baseline - threshold_start:
-            is_event = True
-            was_event_positive = False
-        # Detecting a positive event
-        elif direction_positive and data_point > baseline + threshold_start:
-            is_event = True
-            was_event_positive = True
-        if debug:
-            debug_data_matrix[place_in_data + i] = data_point
-            debug_baseline_matrix[i + place_in_data] = baseline
-            if direction_positive:
-                debug_threshold_pos_matrix[i + place_in_data] = baseline + threshold_start
-            if direction_negative:
-                debug_threshold_neg_matrix[i + place_in_data] = baseline - threshold_start
-        threshold_start = threshold_type.compute_starting_threshold_c(baseline, variance)
-        if is_event:
-            is_event = False
-            # Set ending threshold_end
-            threshold_end = threshold_type.compute_ending_threshold_c(baseline, variance)
-            event_start = i
-            event_end = i + 1
-            done = False
-            event_i = i
-            # CUSUM stuff
-            mean_estimate = data_point
-            n_levels = 0
-            sn = sp = Sn = Sp = Gn = Gp = 0
-            var_estimate = variance
-            #             n_levels = 1  # We're already starting with one level
-            delta = fabs(mean_estimate - baseline) / 2.
-            min_index_p = min_index_n = i
-            min_Sp = min_Sn = float_inf
-            ko = i
-            event_area = data_point  # integrate the area
-            cache_index = 1  # which index in the cache is event_i
-            # trying to grab data from?
-
-            level_sum = data_point
-            level_sum_minp = data_point
-            level_sum_minn = data_point
-            prev_level_start = event_i
-            cache_size = n
-
-            # loop until event ends
-            while not done and event_i - event_start < max_event_steps:
-                event_i += 1
-                if event_i >= cache_size:  # We may need new data
-                    # we need new data if we've run out
-                    cache_index += 1
-                    datas = reader.get_next_blocks_c(get_blocks)
-                    datas = datas[0]
-                    n = datas.size
-                    cache_size += n
-                    if n < 1:
-                        i = n
-                        print "Done"
-                        break
-                    data_cache.append(datas)
-                if cache_index == 1:
-                    data_point = curr_data[event_i]
-                else:
-                    data_point = data_cache[cache_index][event_i % n]
-                if debug:
-                    debug_data_matrix[event_i + place_in_data] = data_point
-                    debug_baseline_matrix[event_i + place_in_data] = baseline
-                    if direction_positive:
-                        debug_threshold_pos_matrix[event_i + place_in_data] = baseline + threshold_end
-                    if direction_negative:
-                        debug_threshold_neg_matrix[event_i + place_in_data] = baseline - threshold_end
-                if (not was_event_positive and data_point >= baseline - threshold_end) or (
-                            was_event_positive and data_point <= baseline + threshold_end):
-                    event_end = event_i
-                    done = True
-                    break
-                # new mean = old_mean + (new_sample - old_mean)/(N)
-                new_mean = mean_estimate + (data_point - mean_estimate) / (1 + event_i - ko)
-                # New variance recursion relation 
-                var_estimate = ((event_i - ko) * var_estimate + (data_point - mean_estimate) * (
-                    data_point - new_mean)) / (1 + event_i - ko)
-                mean_estimate = new_mean
-                if var_estimate > 0:
-                    sp = (delta / var_estimate) * (data_point - mean_estimate - delta / 2.)
-                    sn = -(delta / var_estimate) * (data_point - mean_estimate + delta / 2.)
-                elif delta == 0:
-                    sp = sn = 0
-                else:
-                    sp = sn = float_inf
-                Sp = Sp + sp
-                Sn = Sn + sn
-                Gp = fmax(0.0, Gp + sp)
-                Gn = fmax(0.0, Gn + sn)
-                level_sum += data_point
-                if Sp <= 0:
-                    Sp = 0
-                    min_Sp = Sp
-                    min_index_p = event_i
-                    level_sum_minp = level_sum
-                if Sn <= 0:
-                    Sn = 0
-                    min_Sn = Sn
-                    min_index_n = event_i
-                    level_sum_minn = level_sum
-                h = delta / sqrt(var_estimate)
-                # Did we detect a change?
-                if Gp > h or Gn > h:
-                    if Gp > h:
-                        min_index = min_index_p
-                        level_sum = level_sum_minp
-                    else:
-                        min_index = min_index_n
-                        level_sum = level_sum_minn
-                    m_levels_length[n_levels] = min_index + 1 - ko
-                    m_levels[n_levels] = level_sum / m_levels_length[n_levels]  ##
-                    n_levels += 1
-                    # reset stuff
-                    sn = sp = Sn = Sp = Gn = Gp = 0
-                    min_Sp = min_Sn = float_inf
-                    # Go back to 1 after the level change found
-                    ko = event_i = min_index + 1
-                    min_index_p = min_index_n = event_i
-                    prev_level_start = event_i
-                    if cache_index == 1:
-                        mean_estimate = curr_data[event_i]
-                    else:
-                        mean_estimate = data_cache[cache_index][event_i % n]
-                    level_sum = level_sum_minp = level_sum_minn = mean_estimate
-
-            i = event_end
-            if event_end > prev_level_start:
-                m_levels_length[n_levels] = event_end - prev_level_start
-                m_levels[n_levels] = level_sum / (event_end - prev_level_start)
-                n_levels += 1
-            # is the event long enough?
-            if done and event_end - event_start > min_event_steps:
-                # CUSUM stuff
-                # otherwise just say 1 level and use the maximum change as the value
-                if event_end - event_start < 10:
-                    n_levels = 1
-                    if was_event_positive:
-                        current_blockage = np.max(_get_data_range(data_cache, event_start, event_end))
-                        m_levels[0] = current_blockage
-                        current_blockage -= baseline
-                    else:
-                        current_blockage = np.min(_get_data_range(data_cache, event_start, event_end))
-                        m_levels[0] = current_blockage
-                        current_blockage -= baseline
-                    m_levels_length[0] = event_end - event_start
-                else:
-                    current_blockage = 0
-                    # calculate the weighted average of the levels
-                    for qq in xrange(n_levels):
-                        current_blockage += m_levels[qq] * m_levels_length[qq]
-                    current_blockage = current_blockage / (event_end - event_start) - baseline
-
-                # end CUSUM, save events to file/cache
-                h5file.append_event(event_count, event_start + place_in_data, event_end - event_start, \
-                                    n_levels, raw_points_per_side, baseline, current_blockage, \
-                                    event_area - baseline)
-
-                event_cache[event_cache_index][:event_end - event_start + 2 * raw_points_per_side] = _get_data_range(
-                    data_cache, event_start - raw_points_per_side, event_end + raw_points_per_side)
-                levels_cache[event_cache_index][:n_levels] = m_levels[:n_levels]
-                level_length_cache[event_cache_index][:n_levels] = m_levels_length[:n_levels]
-
-                event_count += 1
-                event_cache_index += 1
-
-                if event_cache_index >= num_rows_in_event_cache:
-                    raw_data.append(event_cache)
-                    lengths_matrix.append(level_length_cache)
-                    levels_matrix.append(levels_cache)
-                    h5file.root.events.eventTable.flush()
-                    event_cache_index = 0
-
-                if event_count % 1000 == 0:
-                    h5file.root.events.eventTable.flush()
-                    h5file.flush()
-
-        baseline = baseline_type.compute_baseline_c(data_point)
-        variance = baseline_type.compute_variance_c(data_point)
-        i += 1
-        # remove any arrays in the cache that we don't need anymore
-        while 0 < n <= i:
-            del data_cache[0]
-            i -= n
-            place_in_data += n
-            # If we're just left with dataCache[0], which is reserved
-            # for old data, then we need new data.
-            if len(data_cache) < 2:
-                cache_refreshes += 1
-                data_next = reader.get_next_blocks_c(get_blocks)
-                data_cache.append(data_next[0])
-            if len(data_cache) > 1:
-                curr_data = data_cache[1]
-                n = curr_data.size
-            if cache_refreshes % 100 == 0 and len(data_cache) == 2:
+        long cache_refreshes = 0  # number of times we get new data
+        long event_count = 0
+        bint at_end = False
+        bint all_done = False
+        long buffered_points = 0
+
+    try:
+        while not at_end:
+            all_done = True
+            for detector in detectors:
+                detector.scan_c(False)
+                all_done = all_done and detector.is_done_c()
+            if all_done:
+                break
+
+            if checkpoint_interval > 0 and not debug and time.time() - last_checkpoint_time >= checkpoint_interval:
+                # Flush every search before saving any checkpoint, so no writer thread uses HDF5 meanwhile.
+                for search in searches:
+                    search.flush_c()
+                for search in searches:
+                    search.save_checkpoint_c()
+                last_checkpoint_time = time.time()
+
+            # Get the next block of every channel.
+            read_start_time = _now()
+            data_x = reader.get_next_blocks_c(get_blocks)
+            if data_x[0].size == 0 and follow:
+                # Write what we have, then wait for more data.
+                for search in searches:
+                    search.flush_c()
+                data_x = _wait_for_data(reader, get_blocks, idle_timeout)
+                points_to_scan = max(1, min(stop, reader.get_points_per_channel_total_c()) - start)
+            metrics.add_blocks_c(data_x, _now() - read_start_time)
+            if data_x[0].size == 0:
+                at_end = True
+                for detector in detectors:
+                    detector.scan_c(True)
+                break
+            buffered_points = 0
+            for detector in detectors:
+                detector.append_c(data_x[detector.channel])
+                buffered_points += detector.sample_buffer.end - detector.sample_buffer.start
+            del data_x
+            if buffered_points > metrics.peak_buffer_points:
+                metrics.peak_buffer_points = buffered_points
+
+            cache_refreshes += 1
+            if cache_refreshes % 100 == 0:
+                i = first_detector.i
                 time_temp = time.time()
                 recent_time = time_temp - time2
                 if recent_time > 0:
                     total_time = time_temp - time1
-                    percent_done = 100. * (place_in_data + i) / points_per_channel_total
-                    rate = (place_in_data + i - prev_i) / recent_time
-                    total_rate = (place_in_data + i) / total_time
-                    time_left = int((points_per_channel_total - (place_in_data + i)) / rate)
+                    percent_done = 100. * (i - start) / points_to_scan
+                    rate = (i - prev_i) / recent_time
+                    total_rate = (i - start) / total_time
+                    time_left = int((points_to_scan + start - i) / rate) if rate > 0 else 0
+                    event_count = 0
+                    for search in searches:
+                        event_count += search.get_event_count_c()
                     status_text = "Event Count: %d Percent Done: %.2f Rate: %.2e pt/s Total Rate: %.2e pt/s Time Left: %s" % (
                         event_count, percent_done, rate, total_rate, datetime.timedelta(seconds=time_left))
                     if pipe is not None:
-                        #                     if event_count > last_event_sent:
-                        #                         pipe.send({'status_text': status_text, 'Events': save_file['Events'][last_event_sent:]})
                         pipe.send({'status_text': status_text})
-                        #                         last_event_sent = event_count
                     else:
                         sys.stdout.write("\r" + status_text)
                         sys.stdout.flush()
+                    if metrics_callback is not None:
+                        metrics_callback(metrics.to_dict(event_count))
                     time2 = time_temp
-                    prev_i = place_in_data + i
-
-    # clean up the caches, make sure everything is saved
-    if event_cache_index > 0:
-        h5file.root.events.eventTable.flush()
-        raw_data.append(event_cache[:event_cache_index])
-        lengths_matrix.append(level_length_cache[:event_cache_index])
-        levels_matrix.append(levels_cache[:event_cache_index])
-        event_cache_index = 0
+                    prev_i = i
+
+        # clean up the caches, make sure everything is saved
+        for search in searches:
+            search.close_c()
+    except:
+        # Leave the databases closed, as of the last checkpoint, so the search can be resumed.
+        for search in searches:
+            search.close_after_error_c()
+        raise
+    event_count = 0
+    for search in searches:
+        event_count += search.output.n_events
 
     # Update the status_text one last time
+    i = first_detector.i
     cdef double curr_time = time.time()
     recent_time = curr_time - time2
     total_time = curr_time - time1
-    percent_done = 100. * (place_in_data + i) / points_per_channel_total
-    rate = (place_in_data + i - prev_i + 1) / recent_time
-    total_rate = (place_in_data + i) / total_time
-    time_left = int((points_per_channel_total - (place_in_data + i)) / rate)
+    percent_done = 100. * (i - start) / points_to_scan
+    rate = (i - prev_i + 1) / recent_time
+    total_rate = (i - start) / total_time
+    time_left = int(max(0, points_to_scan + start - i) / rate)
     status_text = "Event Count: %d Percent Done: %.2f Rate: %.2e pt/s Total Rate: %.2e pt/s Time Left: %s" % (
         event_count, percent_done, rate, total_rate, datetime.timedelta(seconds=time_left))
     if pipe is not None:
-        #                     if event_count > last_event_sent:
-        #                         pipe.send({'status_text': status_text, 'Events': save_file['Events'][last_event_sent:]})
         pipe.send({'status_text': status_text})
-    #                         last_event_sent = event_count
     else:
         sys.stdout.write("\r" + status_text)
         sys.stdout.flush()
 
-    if event_count > 0 or debug:
-        # Save the file
-        # add attributes
-        h5file.root.events.eventTable.flush()  # if you don't flush before adding attributes,
-        # PyTables might print a warning
-        h5file.root.events.eventTable.attrs.sample_rate = sample_rate
-        h5file.root.events.eventTable.attrs.eventCount = event_count
-        h5file.root.events.eventTable.attrs.dataFilename = reader.get_filename_c()
-
-        if debug:
-            h5file.root.debug.data[0,:] = debug_data_matrix[:]
-            h5file.root.debug.baseline[0,:] = debug_baseline_matrix[:]
-            h5file.root.debug.threshold_positive[0,:] = debug_threshold_pos_matrix[:]
-            h5file.root.debug.threshold_negative[0,:] = debug_threshold_neg_matrix[:]
-
-        h5file.flush()
-        h5file.close()
-        return save_file_name
-    else:
-        # if no events, just delete the file, if we're not debugging.
-        h5file.flush()
-        h5file.close()
-        os.remove(save_file_name)
+    report = metrics.to_dict(event_count)
+    if metrics_callback is not None:
+        metrics_callback(report)
+
+    data_filename = reader.get_filename_c()
+    return [search.finish_c(sample_rate, data_filename, report) for search in searches]
+
+class _NullPipe(object):
+    """
+    Pipe that throws away status updates. Used by the parallel workers, whose progress is reported by the\
+    parent process instead.
+    """
+
+    def send(self, obj):
+        pass
+
+    def close(self):
+        pass
+
+
+def _find_events_in_segment(task):
+    """
+    Finds the events in one segment of a file. Run in a worker process by :py:func:`_parallel_find_events`.
+
+    :param tuple task: (filename, parameters, save_file_name, start, save_from, stop, read_ahead, read_batch_size,\
+        compact, dtype). The data is scanned from start to stop, but only events starting at or after save_from are\
+        saved.
+    :returns: The name of the EventDatabase written, or None if the segment had no events or was too short to\
+        search, the segment's metrics, and the message returned instead of a database name for a segment too short\
+        to search, or None.
+    """
+    filename, parameters, save_file_name, start, save_from, stop, read_ahead, read_batch_size, compact, dtype = task
+    reader = get_reader_from_filename(filename, dtype=dtype)
+    reports = []
+    try:
+        result = _find_events_in_reader(reader, parameters, _NullPipe(), None, save_file_name, False, read_ahead,
+                                        read_batch_size, start, stop, save_from, compact=compact,
+                                        metrics_callback=reports.append)
+    finally:
+        reader.close()
+    message = None
+    if result is not None and result != save_file_name:
+        message = result
+        result = None
+    return result, reports[-1] if len(reports) > 0 else None, message
+
+
+def _find_events_in_reader(AbstractReader reader, Parameters parameters, pipe, h5file, save_file_name, debug,
+                           long read_ahead, long read_batch_size, long start=0, long stop=-1, long save_from=0,
+                           long debug_decimation=1, bint compact=False, double checkpoint_interval=0,
+                           bint resume=False, metrics_callback=None, bint follow=False, double idle_timeout=0):
+    """
+    Calls :py:func:`_lazy_load_find_events`, reading ahead on a background thread with a\
+    :py:class:`pypore.i_o.prefetch_reader.PrefetchReader` if read_ahead > 0. The reader is not closed.
+    """
+    if read_ahead <= 0:
+        return _lazy_load_find_events(reader, parameters, pipe, h5file, save_file_name, debug, start, stop,
+                                      save_from, debug_decimation, compact, checkpoint_interval, resume,
+                                      metrics_callback, follow, idle_timeout)
+    cdef PrefetchReader prefetch_reader = PrefetchReader(reader, read_ahead, read_batch_size)
+    try:
+        return _lazy_load_find_events(prefetch_reader, parameters, pipe, h5file, save_file_name, debug, start,
+                                      stop, save_from, debug_decimation, compact, checkpoint_interval, resume,
+                                      metrics_callback, follow, idle_timeout)
+    finally:
+        prefetch_reader.stop_c()
+
+
+def _merge_event_databases(segment_file_names, h5file):
+    """
+    Appends the events of each segment EventDatabase, in order, to h5file, renumbering the array rows.
+    The segments must have the same layout as h5file.
 
-    return None
+    :param list segment_file_names: File names of the segment EventDatabases. None entries are skipped.
+    :param h5file: Open :py:class:`pypore.filetypes.event_database.EventDatabase` to append to.
+    :returns: The number of events in h5file.
+    """
+    event_table = h5file.root.events.eventTable
+
+    cdef long offset = event_table.nrows
+    cdef long n_rows, j
+    for segment_file_name in segment_file_names:
+        if segment_file_name is None:
+            continue
+        segment = ed.open_file(segment_file_name, mode='r')
+        try:
+            n_rows = segment.root.events.eventTable.nrows
+            for j in xrange(0, n_rows, MERGE_CHUNK_ROWS):
+                rows = segment.root.events.eventTable.read(j, j + MERGE_CHUNK_ROWS)
+                # event_start is already global, only the rows need renumbering
+                rows['array_row'] += offset
+                event_table.append(rows)
+                h5file.append_array_rows_from(segment, j, j + MERGE_CHUNK_ROWS)
+            offset += n_rows
+        finally:
+            segment.close()
+    event_table.flush()
+    return offset
+
+
+def _get_search_window(Parameters parameters, double sample_rate, long points_per_channel_total, start=None,
+                       stop=None, follow=False):
+    """
+    Works out the samples to search, [start, stop). start and stop are sample indices, and default to the\
+    start_time and stop_time in parameters. A negative stop, or one past the end of the data, is the end of\
+    the data. With follow, the data can still grow, so the stop is left as it is.
+
+    :raises ValueError: If start is negative, or not before stop.
+    """
+    if start is None:
+        start = int(round(parameters.start_time * sample_rate))
+    if stop is None:
+        stop = -1 if parameters.stop_time < 0 else int(round(parameters.stop_time * sample_rate))
+    if follow:
+        if start < 0 or 0 <= stop <= start:
+            raise ValueError("Cannot search samples [%d, %d) of a growing file." % (start, stop))
+        return start, stop
+    if stop < 0 or stop > points_per_channel_total:
+        stop = points_per_channel_total
+    if start < 0 or start >= stop:
+        raise ValueError("Cannot search samples [%d, %d) of data with %d samples." %
+                         (start, stop, points_per_channel_total))
+    return start, stop
+
+
+def _parallel_find_events(filename, parameters, n_processes, warm_up_points, pipe=None, h5file=None,
+                          save_file_name=None, read_ahead=DEFAULT_READ_AHEAD, read_batch_size=1, compact=False,
+                          start=None, stop=None, metrics_callback=None, dtype=np.float64):
+    """
+    Finds the events in a file by splitting it into segments searched in a pool of processes, then merging the\
+    results into one EventDatabase.
+
+    Each worker starts scanning warm_up_points before its segment (or twice the maximum event length, if larger),\
+    so the baseline has converged by the start of the segment. Events starting in the warm-up region belong to the\
+    previous segment, and are not saved twice. Only the window worked out by :py:func:`_get_search_window` is\
+    split up and scanned, warm-ups included.
+
+    :param string filename: Name of the data file. Each worker opens its own reader.
+    :param Parameters parameters: :py:class:`Parameters` for event finding.
+    :param int n_processes: Number of worker processes.
+    :param int warm_up_points: Number of points to scan before each segment.
+    :param int read_ahead: Number of batches of blocks each worker reads ahead. 0 to not read ahead.
+    :param int read_batch_size: Number of blocks each worker reads at a time.
+    :param bool compact: Whether to create the EventDatabases with the compact layout.
+    :param int start: Sample to start searching at, or None for the start_time in parameters.
+    :param int stop: Sample to stop searching at, or None for the stop_time in parameters.
+    :param metrics_callback: Called with the metrics of all the segments, combined by\
+        :py:func:`_combine_metrics`, once they are done.
+    :param dtype: Floating point type each worker reads the data as.
+    :returns: The file name of the created EventDatabase, or None if there were no events.
+    """
+    start_time = time.time()
+    reader = get_reader_from_filename(filename)
+    sample_rate = reader.get_sample_rate()
+    points_per_channel_total = reader.get_points_per_channel_total()
+    reader.close()
+    start, stop = _get_search_window(parameters, sample_rate, points_per_channel_total, start, stop)
+
+    max_event_steps = int(np.ceil(parameters.max_event_length * 1e-6 * sample_rate))
+    warm_up = max(warm_up_points, 2 * max_event_steps)
+
+    # A few segments per process evens out the load, but each segment needs to be long enough
+    # to be worth its warm-up.
+    n_segments = max(1, min(4 * n_processes, (stop - start) // (2 * warm_up)))
+    boundaries = [start + (stop - start) * k // n_segments for k in xrange(n_segments + 1)]
+
+    if save_file_name is None:
+        save_file_name = _get_default_save_file_name(filename)
+
+    temp_dir = tempfile.mkdtemp()
+    tasks = []
+    for k in xrange(n_segments):
+        segment_file_name = os.path.join(temp_dir, 'segment_%d.h5' % k)
+        tasks.append((filename, parameters, segment_file_name, max(start, boundaries[k] - warm_up), boundaries[k],
+                      boundaries[k + 1], read_ahead, read_batch_size, compact, dtype))
+
+    pool = multiprocessing.Pool(n_processes)
+    try:
+        segment_file_names = []
+        reports = []
+        messages = []
+        for segment_file_name, report, message in pool.imap(_find_events_in_segment, tasks):
+            segment_file_names.append(segment_file_name)
+            if report is not None:
+                reports.append(report)
+            if message is not None:
+                messages.append(message)
+            status_text = "Segments Done: %d/%d" % (len(segment_file_names), n_segments)
+            if pipe is not None:
+                pipe.send({'status_text': status_text})
+            else:
+                sys.stdout.write("\r" + status_text)
+                sys.stdout.flush()
+        pool.close()
+        pool.join()
+        report = _combine_metrics(reports, time.time() - start_time)
+        if metrics_callback is not None:
+            metrics_callback(report)
+
+        found = [name for name in segment_file_names if name is not None]
+        if len(found) == 0:
+            if h5file is not None:
+                h5file.close()
+            # Like the serial search, return the message if the data was too short to search.
+            return messages[0] if len(messages) > 0 else None
+        if h5file is None:
+            # Use the same row length as the segments. Rows are not padded in the compact layout.
+            max_points = ed.EventDatabase.DEFAULT_MAX_EVENT_LENGTH
+            if not compact and (parameters.store_raw or parameters.store_levels):
+                segment = ed.open_file(found[0], mode='r')
+                max_points = segment.root.events._f_get_child(segment._get_array_names()[0]).shape[1]
+                segment.close()
+            h5file = ed.open_file(save_file_name, maxEventLength=max_points, mode='w', compact=compact, dtype=dtype,
+                                  store_raw=parameters.store_raw, store_levels=parameters.store_levels)
+        event_count = _merge_event_databases(found, h5file)
+    finally:
+        pool.terminate()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    h5file.root.events.eventTable.attrs.sample_rate = sample_rate
+    h5file.root.events.eventTable.attrs.eventCount = event_count
+    h5file.root.events.eventTable.attrs.dataFilename = filename
+    h5file.root.events.eventTable.attrs.metrics = json.dumps(report, sort_keys=True)
+    h5file.flush()
+    h5file.close()
+    return save_file_name
 
 cdef class Parameters:
     """
@@ -531,6 +1776,17 @@ cdef class Parameters:
     * threshold_strategy -- Strategy for the thresholds deciding the start and end of \
       an event. See :py:class:`ThresholdStrategy` for a definition of the methods and \
       :py:class:`NoiseBasedThresholdStrategy` for an example implementation.
+    * vectorized_scan -- Whether to scan the baseline a whole block at a time with array operations, \
+      only dropping into the per-point code around events. Finds the same events, but faster.
+    * start_time -- Time in the data to start searching for events at [s].
+    * stop_time -- Time in the data to stop searching for events at [s], or negative for the end of the data.
+    * level_step_factor -- Size of the level changes the CUSUM level fit looks for, as a fraction of the \
+      change from the baseline to the start of the event.
+    * level_threshold_factor -- How sure the CUSUM level fit must be of a level change, relative to the \
+      level change over the noise of the level. Larger values find fewer levels.
+    * raw_points_per_side -- Number of points saved on either side of each event, with its raw data.
+    * store_raw -- Whether to save the raw data of the events.
+    * store_levels -- Whether to save the levels and level lengths of the events.
 
     Usage:
 
@@ -547,11 +1803,21 @@ cdef class Parameters:
     cdef public ThresholdStrategy threshold_strategy
     cdef public bool detect_positive_events
     cdef public bool detect_negative_events
+    cdef public bool vectorized_scan
+    cdef public double start_time
+    cdef public double stop_time
+    cdef public double level_step_factor
+    cdef public double level_threshold_factor
+    cdef public long raw_points_per_side
+    cdef public bool store_raw
+    cdef public bool store_levels
 
     def __init__(self, min_event_length=10., max_event_length=1.e4,
                  detect_positive_events=True, detect_negative_events=True,
                  baseline_strategy=AdaptiveBaselineStrategy(),
-                 threshold_strategy=NoiseBasedThresholdStrategy()):
+                 threshold_strategy=NoiseBasedThresholdStrategy(), vectorized_scan=False,
+                 start_time=0., stop_time=-1., level_step_factor=0.5, level_threshold_factor=1.,
+                 raw_points_per_side=50, store_raw=True, store_levels=True):
         """
         Initialize the Parameters object.
 
@@ -566,6 +1832,26 @@ cdef class Parameters:
         :param threshold_strategy: Type of the threshold for beginning and end to an event.\
             Default is :py:class:`NoiseBasedThresholdStrategy`.\
             Note that this must be a subclass of :py:class:`ThresholdStrategy`.
+        :param bool vectorized_scan: Compute the baseline and thresholds for a whole block of data at once\
+            and find event starts with array operations. Gives the same events as the per-point scan.\
+            Default is False. Custom baseline strategies with extra state must implement\
+            :py:func:`BaselineStrategy.get_state` and :py:func:`BaselineStrategy.set_state` to use this.
+        :param double start_time: Time in seconds from the start of the data to start searching at.\
+            Events are found in [start_time, stop_time), though they can end after stop_time. Default is 0.
+        :param double stop_time: Time in seconds from the start of the data to stop searching at. Negative\
+            values search to the end of the data. Default is -1.
+        :param double level_step_factor: The CUSUM level fit looks for level changes of this fraction of the\
+            change from the baseline to the first point of the event. Default is 0.5.
+        :param double level_threshold_factor: A level change is found when the CUSUM passes this times the\
+            level change over the standard deviation of the level. Default is 1. Events can be fit again with\
+            new values with :py:func:`refit_levels`.
+        :param int raw_points_per_side: Number of points before and after each event saved with its raw data.\
+            Default is 50.
+        :param bool store_raw: Whether to save the raw data of each event. Without it, the EventDatabase only\
+            has the eventTable and the levels, which is much faster for screening a lot of data.\
+            :py:func:`refit_levels` needs the raw data. Default is True.
+        :param bool store_levels: Whether to save the levels and level lengths of each event. The levels are\
+            still fit for n_levels and current_blockage in the eventTable. Default is True.
         """
         self.min_event_length = min_event_length
         self.max_event_length = max_event_length
@@ -573,8 +1859,22 @@ cdef class Parameters:
         self.detect_negative_events = detect_negative_events
         self.baseline_strategy = baseline_strategy
         self.threshold_strategy = threshold_strategy
-
-def find_events(data, parameters=Parameters(), h5file=None, save_file_names=None, pipe=None, debug=False):
+        self.vectorized_scan = vectorized_scan
+        self.start_time = start_time
+        self.stop_time = stop_time
+        self.level_step_factor = level_step_factor
+        self.level_threshold_factor = level_threshold_factor
+        if raw_points_per_side < 0:
+            raise ValueError("raw_points_per_side must not be negative, not {0}.".format(raw_points_per_side))
+        self.raw_points_per_side = raw_points_per_side
+        self.store_raw = store_raw
+        self.store_levels = store_levels
+
+def find_events(data, parameters=Parameters(), h5file=None, save_file_names=None, pipe=None, debug=False,
+                n_processes=1, warm_up_points=DEFAULT_WARM_UP_POINTS, read_ahead=DEFAULT_READ_AHEAD,
+                read_batch_size=1, debug_decimation=1, compact=False,
+                checkpoint_interval=None, resume=False, start=None, stop=None,
+                metrics_callback=None, follow=False, idle_timeout=DEFAULT_IDLE_TIMEOUT, dtype=np.float64):
     """
 
     :param data: List of data to search. Each item in the list can be one of the following:
@@ -595,6 +1895,52 @@ def find_events(data, parameters=Parameters(), h5file=None, save_file_names=None
         - The baseline used at every point.
         - The thresholds at every point (positive, negative, or both depending on the Parameters)
 
+        These are written to the EventDatabase a chunk at a time as the search goes.
+
+    :param int debug_decimation: (Optional) If more than 1, the debug traces hold the min and max of every\
+        debug_decimation points, instead of every point, to keep the EventDatabase small. Default is 1.
+    :param int n_processes: (Optional) Number of processes to search each file with. If more than 1, the file is\
+        split into segments that are searched in parallel and merged into one EventDatabase, with the same events\
+        as a serial search once the baseline has settled. Each process opens its own reader, so readers passed\
+        in must have a file name. Cannot be combined with debug. Default is 1.
+    :param int warm_up_points: (Optional) When searching in parallel, the number of points each segment is\
+        scanned before its start, so the baseline has settled by then. Default is 2**17.
+    :param int read_ahead: (Optional) Number of batches of blocks to read ahead on a background thread, so reading\
+        the data overlaps with searching it. See :py:class:`pypore.i_o.prefetch_reader.PrefetchReader`.\
+        0 reads in the same thread as the search. Default is 4.
+    :param int read_batch_size: (Optional) Number of blocks in each batch read ahead. Default is 1.
+    :param bool compact: (Optional) If True, new EventDatabases store each event's raw data and levels without\
+        padding them to the longest possible event, which makes them much smaller. Read them with\
+        :py:func:`pypore.filetypes.event_database.EventDatabase.get_raw_data_at` and the other get_*_at\
+        methods. Default is False.
+    :param float checkpoint_interval: (Optional) Number of seconds between checkpoints of the search, saved to\
+        the EventDatabase with the events found so far, so a search that is stopped can be resumed. None or 0\
+        turns checkpoints off. Not used with debug, or when searching in parallel. Default is None, which is\
+        60 when resuming, so the search can be resumed again, and off otherwise.
+    :param bool resume: (Optional) If True, a search that was stopped is carried on from the last checkpoint in\
+        its EventDatabase, instead of starting over. The stopped search must have had a checkpoint_interval. The\
+        EventDatabase is found from h5file or save_file_names; if there is none with a checkpoint, the search\
+        starts over. Cannot be combined with debug, or with n_processes more than 1. Default is False.
+    :param int start: (Optional) Sample to start searching for events at. Only the data from here on is read.\
+        Default is the start_time in parameters.
+    :param int stop: (Optional) Sample to stop searching for events at. Events starting before stop are\
+        found whole. Negative values search to the end of the data. Default is the stop_time in parameters.
+    :param metrics_callback: (Optional) Called with a dict of metrics for the search of each file, along with\
+        every status update and once the search is done. It counts the blocks, points and bytes read, the time\
+        spent reading, scanning, fitting levels, copying events and writing them, events and points per second,\
+        and the most data buffered at once. See :py:func:`_Metrics.to_dict`. The final metrics are saved as a\
+        JSON report in each EventDatabase, read with\
+        :py:func:`pypore.filetypes.event_database.EventDatabase.get_metrics`. When searching in parallel,\
+        the metrics of the segments are added up, and only reported once they are all done.
+    :param bool follow: (Optional) If True, files still being written are searched as data is appended to them,\
+        for example during an experiment. Whenever the search runs out of data, the events found so far are written\
+        to the EventDatabase, and the file is checked for more data. Only Chimera and CNP2 readers see the data\
+        appended. Cannot be combined with debug, or with n_processes more than 1. Default is False.
+    :param float idle_timeout: (Optional) With follow, the number of seconds without new data after which the\
+        search of a file ends. Default is 30.
+    :param dtype: (Optional) Floating point type to read the files named in data as, numpy.float64 or\
+        numpy.float32. With float32, the data is read, buffered, scanned and saved in single precision, which\
+        halves the memory and bandwidth used. Readers passed in keep their own dtype. Default is numpy.float64.
     :returns: List of String file names of the created EventDatabases.
 
     >>> file_names = ['testDataFiles/chimera_1event.log']
@@ -602,6 +1948,14 @@ def find_events(data, parameters=Parameters(), h5file=None, save_file_names=None
     >>> # .... ....
     >>> output_files2 = find_events(file_names, parameters=Parameters(min_event_length=15.))
     """
+    if n_processes > 1 and debug:
+        raise ValueError("Cannot use debug when finding events in parallel.")
+    if resume and (debug or n_processes > 1):
+        raise ValueError("Cannot resume a search with debug, or when finding events in parallel.")
+    if follow and (debug or n_processes > 1):
+        raise ValueError("Cannot follow a file with debug, or when finding events in parallel.")
+    if checkpoint_interval is None:
+        checkpoint_interval = DEFAULT_CHECKPOINT_INTERVAL if resume else 0
     event_databases = []
     save_file_name = None
     reader = None
@@ -609,11 +1963,27 @@ def find_events(data, parameters=Parameters(), h5file=None, save_file_names=None
         should_close = False
         if save_file_names is not None:
             save_file_name = save_file_names[i]
+        if n_processes > 1:
+            filename = reader.get_filename() if isinstance(reader, AbstractReader) else reader
+            database_filename = _parallel_find_events(filename, parameters, n_processes, warm_up_points, pipe,
+                                                      h5file, save_file_name, read_ahead, read_batch_size,
+                                                      compact, start, stop, metrics_callback, dtype)
+            print database_filename
+            if database_filename is not None:
+                event_databases.append(database_filename)
+            continue
         if not isinstance(reader, AbstractReader):
             # If not already a reader, assume it is a string filename and create a reader.
-            reader = get_reader_from_filename(reader)
+            reader = get_reader_from_filename(reader, dtype=dtype)
             should_close = True
-        database_filename = _lazy_load_find_events(reader, parameters, pipe, h5file, save_file_name, debug=debug)
+        window_start, window_stop = _get_search_window(parameters, reader.get_sample_rate(),
+                                                       reader.get_points_per_channel_total(), start, stop, follow)
+        database_filename = _find_events_in_reader(reader, parameters, pipe, h5file, save_file_name, debug,
+                                                   read_ahead, read_batch_size, window_start, window_stop,
+                                                   debug_decimation=debug_decimation, compact=compact,
+                                                   checkpoint_interval=checkpoint_interval, resume=resume,
+                                                   metrics_callback=metrics_callback, follow=follow,
+                                                   idle_timeout=idle_timeout)
         if should_close:
             # only close readers we opened here
             reader.close()
@@ -621,3 +1991,413 @@ def find_events(data, parameters=Parameters(), h5file=None, save_file_names=None
         if database_filename is not None:
             event_databases.append(database_filename)
     return event_databases
+
+
+def find_events_sweep(data, parameters_list, save_file_names=None, pipe=None, debug=False,
+                      read_ahead=DEFAULT_READ_AHEAD, read_batch_size=1, debug_decimation=1, compact=False,
+                      start=None, stop=None, metrics_callback=None, dtype=np.float64):
+    """
+    Searches one data file for events with every :py:class:`Parameters` in parameters_list, for example to tune\
+    the strategies. The data is read and scaled once, and each block handed to every search, so a sweep costs\
+    much less than calling :py:func:`find_events` with each Parameters in turn. The EventDatabases are the same\
+    as those :py:func:`find_events` would make.
+
+    :param data: An already opened reader, a subclass of :py:class:`pypore.i_o.abstract_reader.AbstractReader`,\
+        or a string filename to be opened.
+    :param [Parameters] parameters_list: :py:class:`Parameters` for each search. They must all search the same\
+        window of the data. Their strategies are copied, so they are not changed by the sweep.
+    :param [string] save_file_names: (Optional) Name of the EventDatabase for each Parameters. If omitted, \
+        appropriate save file names will be generated.
+    :param pipe: (Optional) :py:class:`multiprocessing.Pipe` for status updates during the run.\
+        If omitted, status updates will just be printed to standard output.
+    :param boolean debug: (Optional) Adds the debug traces to every EventDatabase. See :py:func:`find_events`.
+    :param int read_ahead: (Optional) Number of batches of blocks to read ahead on a background thread.\
+        Default is 4.
+    :param int read_batch_size: (Optional) Number of blocks in each batch read ahead. Default is 1.
+    :param int debug_decimation: (Optional) See :py:func:`find_events`. Default is 1.
+    :param bool compact: (Optional) See :py:func:`find_events`. Default is False.
+    :param int start: (Optional) Sample to start searching for events at. Default is the start_time in the\
+        Parameters.
+    :param int stop: (Optional) Sample to stop searching for events at. Default is the stop_time in the\
+        Parameters.
+    :param metrics_callback: (Optional) See :py:func:`find_events`. The metrics cover every search in the sweep.
+    :param dtype: (Optional) See :py:func:`find_events`. Default is numpy.float64.
+    :returns: List with the file name of the EventDatabase for each Parameters, or None for those without events.
+
+    >>> params = [Parameters(threshold_strategy=NoiseBasedThresholdStrategy(start_std_dev=x)) for x in (3., 4., 5.)]
+    >>> output_files = find_events_sweep('testDataFiles/chimera_1event.log', params)
+    """
+    cdef AbstractReader reader
+    should_close = False
+    if isinstance(data, AbstractReader):
+        reader = data
+    else:
+        # If not already a reader, assume it is a string filename and create a reader.
+        reader = get_reader_from_filename(data, dtype=dtype)
+        should_close = True
+    cdef PrefetchReader prefetch_reader = None
+    try:
+        windows = set(_get_search_window(parameters, reader.get_sample_rate(), reader.get_points_per_channel_total(),
+                                         start, stop) for parameters in parameters_list)
+        if len(windows) > 1:
+            raise ValueError("All the Parameters in a sweep must search the same window of the data.")
+        window_start, window_stop = windows.pop()
+
+        if save_file_names is None:
+            save_file_name = _get_default_save_file_name(reader.get_filename())
+            save_file_names = [save_file_name[:-3] + '_%d.h5' % k for k in xrange(len(parameters_list))]
+
+        if read_ahead > 0:
+            prefetch_reader = PrefetchReader(reader, read_ahead, read_batch_size)
+        database_filenames = _lazy_load_sweep_events(prefetch_reader if prefetch_reader is not None else reader,
+                                                     [copy.deepcopy(parameters) for parameters in parameters_list],
+                                                     pipe, [None] * len(parameters_list), list(save_file_names),
+                                                     debug, window_start, window_stop, 0, debug_decimation, compact,
+                                                     0, False, metrics_callback)
+    finally:
+        if prefetch_reader is not None:
+            prefetch_reader.stop_c()
+        if should_close:
+            # only close readers we opened here
+            reader.close()
+    if isinstance(database_filenames, basestring):
+        # Not enough data to search.
+        return [None] * len(parameters_list)
+    return database_filenames
+
+
+class _EventBatches(object):
+    """
+    Keeps the batches of events appended to it in memory, in place of an\
+    :py:class:`pypore.filetypes.event_database.EventDatabaseWriter`. Used by :py:func:`iter_events`.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def append(self, event_rows, raw_data=None, levels=None, level_lengths=None):
+        self.batches.append((event_rows, raw_data, levels, level_lengths))
+
+    def pop_records(self, bint keep_raw_data):
+        """
+        :returns: The events appended since the last call, as :py:class:`EventRecord`. The arrays in them are\
+            views of the batches.
+        """
+        records = []
+        for event_rows, raw_data, levels, level_lengths in self.batches:
+            for k, (_, event_start, event_length, n_levels, raw_points_per_side, baseline, current_blockage, area,
+                    channel, variance) in enumerate(event_rows.tolist()):
+                records.append(EventRecord(channel, event_start, event_length, n_levels, raw_points_per_side,
+                                           baseline, current_blockage, area,
+                                           levels[k, :n_levels] if levels is not None else None,
+                                           level_lengths[k, :n_levels] if level_lengths is not None else None,
+                                           raw_data[k, :event_length + 2 * raw_points_per_side]
+                                           if keep_raw_data and raw_data is not None else None, variance))
+        self.batches = []
+        return records
+
+
+def _iter_reader_events(AbstractReader reader, Parameters parameters, long start, long stop, bint keep_raw_data):
+    """
+    Generator doing the search of :py:func:`iter_events` on reader, from sample start to stop.
+    """
+    cdef unsigned int raw_points_per_side = parameters.raw_points_per_side
+    cdef double sample_rate = reader.get_sample_rate_c()
+    # Min and Max number of points in an event
+    cdef unsigned int min_event_steps = np.ceil(parameters.min_event_length * 1e-6 * sample_rate)
+    cdef unsigned int max_event_steps = np.ceil(parameters.max_event_length * 1e-6 * sample_rate)
+    cdef unsigned long max_points = max_event_steps + 2 * raw_points_per_side
+
+    if start > 0:
+        reader.seek_c(start)
+    data_x = reader.get_next_blocks_c(1)
+    if data_x[0].size < 100:
+        # Not enough data points to search.
+        return
+
+    # Events are handed over after every block, so the caches only need to hold a block's worth of them.
+    cdef long num_rows_in_event_cache = max(1, int(1048576 / _get_event_bytes(parameters, max_points,
+                                                                               data_x[0].itemsize)))
+    event_batches = _EventBatches()
+    cdef _EventOutput output = _EventOutput(event_batches)
+    cdef list detectors = []
+    cdef _ChannelDetector detector
+    cdef unsigned int channel
+    for channel in xrange(len(data_x)):
+        if channel == 0:
+            baseline_type = parameters.baseline_strategy
+            threshold_type = parameters.threshold_strategy
+        else:
+            baseline_type = copy.deepcopy(parameters.baseline_strategy)
+            threshold_type = copy.deepcopy(parameters.threshold_strategy)
+        detectors.append(_ChannelDetector(channel, parameters, baseline_type, threshold_type, min_event_steps,
+                                          max_event_steps, raw_points_per_side, data_x[channel], start, stop, 0,
+                                          num_rows_in_event_cache, output))
+    del data_x
+
+    cdef bint at_end = False
+    cdef bint all_done = False
+    while True:
+        all_done = True
+        for detector in detectors:
+            detector.scan_c(at_end)
+            detector.flush_events_c()
+            all_done = all_done and (at_end or detector.is_done_c())
+        for record in event_batches.pop_records(keep_raw_data):
+            yield record
+        if all_done:
+            return
+
+        # Get the next block of every channel.
+        data_x = reader.get_next_blocks_c(1)
+        if data_x[0].size == 0:
+            at_end = True
+        else:
+            for detector in detectors:
+                detector.append_c(data_x[detector.channel])
+        del data_x
+
+
+def iter_events(data, parameters=Parameters(), raw_data=True, start=None, stop=None, read_ahead=DEFAULT_READ_AHEAD,
+                read_batch_size=1, dtype=np.float64):
+    """
+    Finds the events in data like :py:func:`find_events`, but yields them as they are found, instead of saving\
+    them to an EventDatabase. Nothing is written to disk, and the events are not padded, so a pipeline can filter\
+    or aggregate them in memory as fast as they are found.
+
+    :param data: An already opened reader, a subclass of :py:class:`pypore.i_o.abstract_reader.AbstractReader`,\
+        or a string filename to be opened.
+    :param Parameters parameters: :py:class:`Parameters` for event finding.
+    :param bool raw_data: (Optional) If False, the events are yielded without their raw data. Default is True.\
+        The raw data and levels are also left out if parameters does not store them.
+    :param int start: (Optional) Sample to start searching for events at. Default is the start_time in\
+        parameters.
+    :param int stop: (Optional) Sample to stop searching for events at. Default is the stop_time in parameters.
+    :param int read_ahead: (Optional) Number of batches of blocks to read ahead on a background thread.\
+        Default is 4.
+    :param int read_batch_size: (Optional) Number of blocks in each batch read ahead. Default is 1.
+    :param dtype: (Optional) See :py:func:`find_events`. The arrays of the events have this dtype. Default is\
+        numpy.float64.
+    :returns: Generator of :py:class:`EventRecord`, in the order the events are found in each channel. raw_data\
+        holds the event with raw_points_per_side points on either side, as in\
+        :py:func:`pypore.filetypes.event_database.EventDatabase.get_raw_data_at`. The arrays are views of memory\
+        shared with other events, so copy them before changing them.
+
+    >>> for event in iter_events('testDataFiles/chimera_1event.log'):
+    ...     print event.event_start, event.current_blockage
+    """
+    cdef AbstractReader reader
+    should_close = False
+    if isinstance(data, AbstractReader):
+        reader = data
+    else:
+        # If not already a reader, assume it is a string filename and create a reader.
+        reader = get_reader_from_filename(data, dtype=dtype)
+        should_close = True
+    cdef PrefetchReader prefetch_reader = None
+    try:
+        start, stop = _get_search_window(parameters, reader.get_sample_rate(), reader.get_points_per_channel_total(),
+                                         start, stop)
+        if read_ahead > 0:
+            prefetch_reader = PrefetchReader(reader, read_ahead, read_batch_size)
+        for record in _iter_reader_events(prefetch_reader if prefetch_reader is not None else reader, parameters,
+                                          start, stop, raw_data):
+            yield record
+    finally:
+        if prefetch_reader is not None:
+            prefetch_reader.stop_c()
+        if should_close:
+            # only close readers we opened here
+            reader.close()
+
+
+def _refit_levels_chunk(task):
+    """
+    Fits the levels of a chunk of events again. Run in a worker process by :py:func:`refit_levels`.
+
+    :param tuple task: (data, offsets, baselines, variances, level_step_factor, level_threshold_factor). The points\
+        of event k are data[offsets[k]:offsets[k + 1]].
+    :returns: The number of levels and current blockage of each event, and their levels and level lengths, one\
+        event after the other.
+    """
+    cdef np.ndarray[DTYPE_t] data
+    cdef np.ndarray[np.int64_t] offsets
+    cdef np.ndarray[DTYPE_t] baselines
+    cdef np.ndarray[DTYPE_t] variances
+    cdef double level_step_factor
+    cdef double level_threshold_factor
+    data, offsets, baselines, variances, level_step_factor, level_threshold_factor = task
+    cdef long n_events = baselines.shape[0]
+    cdef np.ndarray[DTYPE_UINT32_t] n_levels = np.zeros(n_events, dtype=DTYPE_UINT32)
+    cdef np.ndarray[DTYPE_t] current_blockages = np.zeros(n_events, dtype=DTYPE)
+    # An event has at most as many levels as points.
+    cdef np.ndarray[DTYPE_t] levels = np.zeros(data.shape[0], dtype=DTYPE)
+    cdef np.ndarray[DTYPE_UINT32_t] level_lengths = np.zeros(data.shape[0], dtype=DTYPE_UINT32)
+    cdef long k, qq, n
+    cdef long level_offset = 0
+    cdef double current_blockage
+    for k in xrange(n_events):
+        n = offsets[k + 1] - offsets[k]
+        n_levels[k] = _fit_levels(<DTYPE_t *> data.data + offsets[k], n, baselines[k], variances[k],
+                                  level_step_factor, level_threshold_factor, <DTYPE_t *> levels.data + level_offset,
+                                  <DTYPE_UINT32_t *> level_lengths.data + level_offset)
+        # calculate the weighted average of the levels, as in the search
+        current_blockage = 0
+        for qq in xrange(n_levels[k]):
+            current_blockage += levels[level_offset + qq] * level_lengths[level_offset + qq]
+        current_blockages[k] = current_blockage / n - baselines[k]
+        level_offset += n_levels[k]
+    return n_levels, current_blockages, levels[:level_offset], level_lengths[:level_offset]
+
+
+def _get_refit_tasks(h5file, events, np.ndarray rows, parameters, long chunk_events):
+    """
+    Reads the raw data of the events in the given rows of the eventTable, chunk_events at a time.
+
+    :returns: Generator of the tasks for :py:func:`_refit_levels_chunk`.
+    """
+    group = h5file.root.events
+    compact = h5file.is_compact()
+    has_variance = 'variance' in events.dtype.names
+    for j in xrange(0, rows.size, chunk_events):
+        chunk = events[rows[j:j + chunk_events]]
+        array_rows = chunk['array_row'].astype(np.int64)
+        first_row = array_rows.min()
+        # Read every row from the first to the last at once, which are next to each other unless events were removed.
+        if compact:
+            raw_offsets = group.raw_data_offsets[first_row:array_rows.max() + 2]
+            raw_data = group.raw_data[raw_offsets[0]:raw_offsets[-1]]
+            raw_rows = [raw_data[raw_offsets[k] - raw_offsets[0]:raw_offsets[k + 1] - raw_offsets[0]]
+                        for k in array_rows - first_row]
+        else:
+            raw_data = group.raw_data.read(first_row, array_rows.max() + 1)
+            raw_rows = [raw_data[k] for k in array_rows - first_row]
+        event_data = []
+        variances = np.zeros(chunk.size, dtype=DTYPE)
+        for k, raw_row in enumerate(raw_rows):
+            raw_points_per_side = chunk['raw_points_per_side'][k]
+            event_data.append(raw_row[raw_points_per_side:raw_points_per_side + chunk['event_length'][k]])
+            if has_variance:
+                variances[k] = chunk['variance'][k]
+            elif raw_points_per_side > 1:
+                # Databases from before the variance was saved.
+                variances[k] = np.var(raw_row[:raw_points_per_side])
+        offsets = np.zeros(chunk.size + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(chunk['event_length'])
+        yield (np.concatenate(event_data).astype(DTYPE), offsets, chunk['baseline'].astype(DTYPE), variances,
+               parameters.level_step_factor, parameters.level_threshold_factor)
+
+
+def _rewrite_level_arrays(h5file, np.ndarray array_rows, list new_levels, list new_level_lengths,
+                          long chunk_events):
+    """
+    Rewrites /events/levels and /events/level_lengths, with new_levels[k] and new_level_lengths[k] in row\
+    array_rows[k]. The other rows are kept.
+    """
+    group = h5file.root.events
+    compact = h5file.is_compact()
+    n_array_rows = group.levels_offsets.nrows - 1 if compact else group.levels.nrows
+    # Index into new_levels of each array row, or -1 to keep it.
+    new_index = np.zeros(n_array_rows, dtype=np.int64) - 1
+    new_index[array_rows] = np.arange(array_rows.size)
+    for name, new_rows in (('levels', new_levels), ('level_lengths', new_level_lengths)):
+        old = group._f_get_child(name)
+        new = h5file.create_earray(group, name + '_refit', old.atom, shape=(0,) + old.shape[1:], title=old.title,
+                                   filters=old.filters)
+        if compact:
+            old_offsets = group._f_get_child(name + '_offsets')
+            new_offsets = h5file.create_earray(group, name + '_offsets_refit', old_offsets.atom, shape=(0,),
+                                               title=old_offsets.title, filters=old_offsets.filters)
+            new_offsets.append([0])
+        for a in xrange(0, n_array_rows, chunk_events):
+            b = min(a + chunk_events, n_array_rows)
+            if compact:
+                offsets = old_offsets[a:b + 1]
+                data = old[offsets[0]:offsets[-1]]
+                rows = [new_rows[new_index[k]] if new_index[k] >= 0 else
+                        data[offsets[k - a] - offsets[0]:offsets[k - a + 1] - offsets[0]] for k in xrange(a, b)]
+                new.append(np.concatenate(rows).astype(old.atom.dtype))
+                new_offsets.append(new_offsets[-1] + np.cumsum([row.size for row in rows]))
+            else:
+                block = old.read(a, b)
+                for k in xrange(a, b):
+                    if new_index[k] >= 0:
+                        block[k - a] = 0
+                        block[k - a, :new_rows[new_index[k]].size] = new_rows[new_index[k]]
+                new.append(block)
+        old._f_remove()
+        new._f_rename(name)
+        if compact:
+            old_offsets._f_remove()
+            new_offsets._f_rename(name + '_offsets')
+
+
+def refit_levels(filename, parameters=Parameters(), save_file_name=None, n_processes=1,
+                 chunk_events=DEFAULT_REFIT_CHUNK_EVENTS):
+    """
+    Fits the levels of the events in an EventDatabase again, with the level_step_factor and\
+    level_threshold_factor of parameters, from the raw data saved with them. The data the events were found in\
+    is not searched again, so trying new level fit parameters takes seconds, even for a long file.
+
+    The levels, level_lengths, n_levels and current_blockage of every event are rewritten, except for events\
+    shorter than 10 points, which have a single level at their largest change, as in the search. The fit starts\
+    from the baseline and variance saved with each event, which gives the same levels as the search for the same\
+    parameters. Databases from before the variance was saved use the variance of the raw points before each\
+    event instead.
+
+    :param filename: File name of the EventDatabase.
+    :param Parameters parameters: :py:class:`Parameters` with the level fit parameters.
+    :param save_file_name: (Optional) File name to save a copy of the EventDatabase with the new levels to.\
+        Default is None, which rewrites filename in place.
+    :param int n_processes: (Optional) Number of processes to fit the levels on. Default is 1.
+    :param int chunk_events: (Optional) Number of events read and fit at a time. Default is 4096.
+    :returns: The file name of the EventDatabase with the new levels.
+
+    >>> refit_levels('test_Events.h5', Parameters(level_threshold_factor=2.), save_file_name='test_refit.h5')
+    """
+    if save_file_name is not None and save_file_name != filename:
+        shutil.copyfile(filename, save_file_name)
+        filename = save_file_name
+    h5file = ed.open_file(filename, mode='a')
+    if not h5file.has_raw_data() or not h5file.has_levels():
+        h5file.close()
+        raise ValueError("Cannot fit the levels of {0} again, its raw data or levels were not stored.".format(
+            filename))
+    pool = multiprocessing.Pool(n_processes) if n_processes > 1 else None
+    try:
+        table = h5file.get_event_table()
+        table.flush()
+        events = table.read()
+        n_levels = events['n_levels'].copy()
+        current_blockages = events['current_blockage'].copy()
+        rows = np.flatnonzero(events['event_length'] >= 10)
+        new_levels = []
+        new_level_lengths = []
+        tasks = _get_refit_tasks(h5file, events, rows, parameters, chunk_events)
+        j = 0
+        for chunk_n_levels, chunk_current_blockages, levels, level_lengths in (
+                pool.imap(_refit_levels_chunk, tasks) if pool is not None else itertools.imap(_refit_levels_chunk,
+                                                                                             tasks)):
+            n_levels[rows[j:j + chunk_n_levels.size]] = chunk_n_levels
+            current_blockages[rows[j:j + chunk_n_levels.size]] = chunk_current_blockages
+            split = np.cumsum(chunk_n_levels)[:-1]
+            new_levels += np.split(levels, split)
+            new_level_lengths += np.split(level_lengths, split)
+            j += chunk_n_levels.size
+        if pool is not None:
+            pool.close()
+            pool.join()
+            pool = None
+
+        _rewrite_level_arrays(h5file, events['array_row'][rows].astype(np.int64), new_levels, new_level_lengths,
+                              chunk_events)
+        table.modify_column(column=n_levels, colname='n_levels')
+        table.modify_column(column=current_blockages, colname='current_blockage')
+        table.attrs.level_step_factor = parameters.level_step_factor
+        table.attrs.level_threshold_factor = parameters.level_threshold_factor
+        table.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+        h5file.close()
+    return filename
@@ -6,17 +6,21 @@ Created on Jan 28, 2014
 import os
 import datetime
 
+import numpy as np
+
 from filetypes import data_file
 from pypore.i_o import get_reader_from_filename
 import pypore.filetypes.data_file as df
 from pypore.i_o.abstract_reader import AbstractReader
 
 
-def convert_file(filename, output_filename=None):
+def convert_file(filename, output_filename=None, dtype=np.float64):
     """
     Convert a file to the pypore .h5 file format. Returns the new file's name.
+
+    :param dtype: Floating point type to read and store the data as, numpy.float64 (default) or numpy.float32.
     """
-    reader = get_reader_from_filename(filename)
+    reader = get_reader_from_filename(filename, dtype=dtype)
 
     sample_rate = reader.get_sample_rate()
     n_points = reader.get_points_per_channel_total()
@@ -24,7 +28,8 @@ def convert_file(filename, output_filename=None):
     if output_filename is None:
         output_filename = filename.split('.')[0] + '.h5'
 
-    save_file = data_file.open_file(output_filename, mode='w', sample_rate=sample_rate, n_points=n_points)
+    save_file = data_file.open_file(output_filename, mode='w', sample_rate=sample_rate, n_points=n_points,
+                                    dtype=reader.get_dtype())
     blocks_to_get = 1
     data = reader.get_next_blocks(blocks_to_get)[0]
 
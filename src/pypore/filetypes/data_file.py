@@ -4,6 +4,7 @@ Created on Jan 28, 2014
 @author: `@parkin`_
 """
 
+import numpy as np
 import tables as tb
 
 
@@ -74,12 +75,13 @@ class DataFile(tb.file.File):
         """
         Initializes the data_file.
 
-        :param kargs: Can pass in 'n_points': Maximum number of data points for an event to be added.
+        :param kargs: Can pass in 'n_points': Maximum number of data points for an event to be added, and\
+                'dtype': Floating point type of the data, numpy.float64 (default) or numpy.float32.
         """
 
         filters = tb.Filters(complib='zlib', complevel=3)
         shape = (kargs['n_points'],)
-        a = tb.FloatAtom()
+        a = tb.Atom.from_dtype(np.dtype(kargs.get('dtype', np.float64)))
         if not 'data' in self.root:
             self.create_carray(self.root, 'data', a, shape=shape, title='Data', filters=filters)
 
@@ -96,6 +98,7 @@ def open_file(*args, **kargs):
 
         - n_points: Number of points that should be in the array.
         - sample_rate: Sample rate of the data.
+        - dtype: Floating point type of the data. Default is numpy.float64.
 
     :returns: :py:class:`pypore.filetypes.data_file.DataFile` -- an already opened
         :py:class:`pypore.filetypes.data_file.DataFile`.
@@ -4,6 +4,13 @@ Created on Sep 13, 2013
 @author: `@parkin`_
 """
 
+import Queue
+import json
+import sys
+import threading
+import time
+
+import numpy as np
 import tables as tb
 import csv
 
@@ -22,6 +29,12 @@ class _Event(tb.IsDescription):
     baseline = tb.FloatCol(pos=5)
     current_blockage = tb.FloatCol(pos=6)
     area = tb.FloatCol(pos=7)
+    channel = tb.UIntCol(pos=8)  # channel of the data the event is in
+    variance = tb.FloatCol(pos=9)  # variance of the baseline at the start of the event
+
+
+# numpy dtype of the rows of /events/eventTable, for building them in arrays to pass to append_events.
+EVENT_DTYPE = tb.description.dtype_from_descr(_Event)
 
 
 class EventDatabase(tb.file.File):
@@ -41,6 +54,10 @@ class EventDatabase(tb.file.File):
     /events/eventTable
     and matrices
     /events/raw_data, /event/levels, and /event/levelLength
+
+    In the compact layout, opened with compact=True, raw_data, levels and level_lengths are instead 1-D arrays
+    holding the rows of every event one after the other, without padding. Row k of each starts at
+    <name>_offsets[k] and ends at <name>_offsets[k + 1]. The get_*_at methods read both layouts.
     
     Must be instantiated by calling eventDatabase's
     
@@ -55,7 +72,7 @@ class EventDatabase(tb.file.File):
     event_row = None
 
     def append_event(self, array_row, event_start, event_length, n_levels, raw_points_per_side, baseline, current_blockage, area,
-                    raw_data=None, levels=None, level_lengths=None):
+                    raw_data=None, levels=None, level_lengths=None, channel=0, variance=0.):
         """
         Appends an event with the specified values to the eventsTable.  If raw_data, levels, or level_lengths
         are included, they are added to the corresponding matrices.
@@ -72,6 +89,8 @@ class EventDatabase(tb.file.File):
         :param raw_data: Numpy array of the raw data.
         :param levels: Numpy array of the levels.
         :param level_lengths: Numpy array of the level lengths.
+        :param channel: Channel of the data the event was found in. Default is 0.
+        :param variance: Variance of the baseline at the start of the event. Default is 0.
         """
         row = self.get_event_table_row()
         row['array_row'] = array_row
@@ -82,35 +101,136 @@ class EventDatabase(tb.file.File):
         row['baseline'] = baseline
         row['current_blockage'] = current_blockage
         row['area'] = area
+        # Databases from before events had a channel and variance don't have their columns.
+        colnames = self.root.events.eventTable.colnames
+        if 'channel' in colnames:
+            row['channel'] = channel
+        if 'variance' in colnames:
+            row['variance'] = variance
         row.append()
 
         if raw_data is not None:
-            self.append_raw_data(raw_data)
+            self.append_raw_data(raw_data, [event_length + 2 * raw_points_per_side])
         if levels is not None:
-            self.append_levels(levels)
+            self.append_levels(levels, [n_levels])
         if level_lengths is not None:
-            self.append_level_lengths(level_lengths)
+            self.append_level_lengths(level_lengths, [n_levels])
+
+    def append_events(self, events, raw_data=None, levels=None, level_lengths=None):
+        """
+        Appends a batch of events to the eventsTable at once, which is much faster than calling\
+        :py:func:`append_event` for each. If raw_data, levels, or level_lengths are included, they are added to\
+        the corresponding matrices.
+
+        :param events: Rows for the eventTable, as a numpy structured array of :py:data:`EVENT_DTYPE`, or a list\
+            of tuples in the order of the columns. Columns the eventTable doesn't have are dropped.
+        :param raw_data: Numpy matrix of the raw data, one row per event.
+        :param levels: Numpy matrix of the levels, one row per event.
+        :param level_lengths: Numpy matrix of the level lengths, one row per event.
+        """
+        table = self.root.events.eventTable
+        raw_lengths = level_counts = None
+        if len(events) > 0:
+            if isinstance(events, np.ndarray) and events.dtype.names is not None and events.dtype != table.dtype:
+                # Copy the columns by name, dropping any that databases from before them don't have.
+                rows = np.empty(len(events), dtype=table.dtype)
+                for name in table.colnames:
+                    rows[name] = events[name]
+                events = rows
+            else:
+                events = np.asarray(events, dtype=table.dtype)
+            table.append(events)
+            raw_lengths = events['event_length'] + 2 * events['raw_points_per_side']
+            level_counts = events['n_levels']
+        self.append_raw_data(raw_data, raw_lengths)
+        self.append_levels(levels, level_counts)
+        self.append_level_lengths(level_lengths, level_counts)
 
-    def append_level_lengths(self, level_lengths):
+    def append_level_lengths(self, level_lengths, lengths=None):
         """
         Appends a numpy matrix level_lengths to root.events.level_lengths
+
+        :param lengths: (Optional) Number of points to keep from each row in the compact layout.\
+            Default is the whole row.
         """
         if level_lengths is not None:
-            self.root.events.level_lengths.append(level_lengths)
+            self._append_rows('level_lengths', level_lengths, lengths)
 
-    def append_levels(self, levels):
+    def append_levels(self, levels, lengths=None):
         """
         Appends a numpy matrix levels to root.events.levels
+
+        :param lengths: (Optional) Number of points to keep from each row in the compact layout.\
+            Default is the whole row.
         """
         if levels is not None:
-            self.root.events.levels.append(levels)
+            self._append_rows('levels', levels, lengths)
 
-    def append_raw_data(self, raw_data):
+    def append_raw_data(self, raw_data, lengths=None):
         """
         Appends a numpy matrix raw_data to root.events.raw_data
+
+        :param lengths: (Optional) Number of points to keep from each row in the compact layout.\
+            Default is the whole row.
         """
         if raw_data is not None:
-            self.root.events.raw_data.append(raw_data)
+            self._append_rows('raw_data', raw_data, lengths)
+
+    def append_array_rows_from(self, database, start, stop):
+        """
+        Appends rows [start, stop) of raw_data, levels and level_lengths of another EventDatabase with the\
+        same layout. Only the arrays this EventDatabase stores are appended.
+        """
+        for name in self._get_array_names():
+            source = database.root.events._f_get_child(name)
+            if self.is_compact():
+                offsets = database.root.events._f_get_child(name + '_offsets')[start:stop + 1]
+                if offsets.size > 1:
+                    self._append_concatenated(name, source[offsets[0]:offsets[-1]], np.diff(offsets))
+            else:
+                self.root.events._f_get_child(name).append(source.read(start, stop))
+
+    def _append_rows(self, name, rows, lengths):
+        """
+        Appends a matrix of rows to /events/name. In the compact layout, only the first lengths[k] points\
+        of row k are kept.
+        """
+        if not self.is_compact():
+            self.root.events._f_get_child(name).append(rows)
+            return
+        rows = np.asarray(rows)
+        if rows.ndim == 1:
+            rows = rows[np.newaxis]
+        if lengths is None:
+            lengths = np.zeros(rows.shape[0], dtype=np.int64) + rows.shape[1]
+        else:
+            lengths = np.minimum(np.asarray(lengths, dtype=np.int64), rows.shape[1])
+        keep = np.arange(rows.shape[1]) < lengths[:, np.newaxis]
+        self._append_concatenated(name, rows[keep], lengths)
+
+    def _append_concatenated(self, name, data, lengths):
+        """
+        Appends rows, already concatenated into data, to /events/name in the compact layout.
+        """
+        offsets = self.root.events._f_get_child(name + '_offsets')
+        self.root.events._f_get_child(name).append(data)
+        offsets.append(offsets[-1] + np.cumsum(lengths))
+
+    def _get_array_names(self):
+        """
+        :returns: The names of the per event arrays stored, out of raw_data, levels and level_lengths.
+        """
+        return [name for name in ('raw_data', 'levels', 'level_lengths') if name in self.root.events]
+
+    def _get_array_row(self, name, array_row):
+        """
+        Returns row array_row of /events/name, in either layout.
+        """
+        array = self.root.events._f_get_child(name)
+        if array.ndim > 1:
+            return array[array_row]
+        start, stop = self.root.events._f_get_child(name + '_offsets')[array_row:array_row + 2]
+        return array[start:stop]
 
     def clean_database(self):
         """
@@ -123,10 +243,13 @@ class EventDatabase(tb.file.File):
         >>> h5.clean_database() // table is now refers to deleted table
         >>> table = h5.get_event_table() // table now refers to live table
         """
+        compact = self.is_compact()
+        store_raw = self.has_raw_data()
+        store_levels = self.has_levels()
         # remove the events group
         self.root.events._f_remove(recursive=True)
 
-        self.initialize_database()
+        self.initialize_database(compact=compact, store_raw=store_raw, store_levels=store_levels)
 
     @classmethod
     def _convert_to_event_database(cls, tables_object):
@@ -136,6 +259,15 @@ class EventDatabase(tb.file.File):
         """
         tables_object.__class__ = EventDatabase
 
+    def get_channel_at(self, i):
+        """
+        Returns the channel of the data the event in row 'i' of eventTable was found in.
+        Databases from before events had a channel only have channel 0.
+        """
+        if 'channel' not in self.root.events.eventTable.colnames:
+            return 0
+        return self.get_event_row(i)['channel']
+
     def get_event_count(self):
         """
         Returns the number of rows in the /events/eventTable table.
@@ -153,7 +285,7 @@ class EventDatabase(tb.file.File):
         array_row = row['array_row']
         event_length = row['event_length']
         raw_points_per_side = row['raw_points_per_side']
-        return self.root.events.raw_data[array_row][raw_points_per_side:event_length + raw_points_per_side]
+        return self._get_array_row('raw_data', array_row)[raw_points_per_side:event_length + raw_points_per_side]
 
     def get_event_row(self, i):
         """
@@ -195,7 +327,7 @@ class EventDatabase(tb.file.File):
         row = self.get_event_row(i)
         array_row = row['array_row']
         n_levels = row['n_levels']
-        return self.root.events.level_lengths[array_row][:n_levels]
+        return self._get_array_row('level_lengths', array_row)[:n_levels]
 
     def get_levels_at(self, i):
         """
@@ -205,7 +337,7 @@ class EventDatabase(tb.file.File):
         row = self.get_event_row(i)
         array_row = row['array_row']
         n_levels = row['n_levels']
-        return self.root.events.levels[array_row][:n_levels]
+        return self._get_array_row('levels', array_row)[:n_levels]
 
     def get_raw_data_at(self, i):
         """
@@ -215,7 +347,19 @@ class EventDatabase(tb.file.File):
         array_row = row['array_row']
         event_length = row['event_length']
         raw_points_per_side = row['raw_points_per_side']
-        return self.root.events.raw_data[array_row][:event_length + 2 * raw_points_per_side]
+        return self._get_array_row('raw_data', array_row)[:event_length + 2 * raw_points_per_side]
+
+    def get_metrics(self):
+        """
+        Gets the metrics of the search that found the events, saved as a JSON report at\
+        root.events.eventTable.attrs.metrics. See :py:func:`pypore.event_finder.find_events`.
+
+        :returns: Dict of the metrics, or None if they were not saved.
+        """
+        attrs = self.root.events.eventTable.attrs
+        if 'metrics' not in attrs:
+            return None
+        return json.loads(attrs.metrics)
 
     def get_sample_rate(self):
         """
@@ -230,6 +374,11 @@ class EventDatabase(tb.file.File):
 
         :param kargs: Dictionary - includes:
                         -maxEventLength: Maximum number of datapoints for an event to be added.
+                        -compact: Store the rows of raw_data, levels and level_lengths without padding.
+                        -dtype: Floating point type of raw_data and levels, numpy.float64 (default) or\
+                            numpy.float32.
+                        -store_raw: If False, raw_data is not created. Default is True.
+                        -store_levels: If False, levels and level_lengths are not created. Default is True.
         """
         if 'maxEventLength' in kargs:
             if kargs['maxEventLength'] > self.max_event_length:
@@ -237,28 +386,43 @@ class EventDatabase(tb.file.File):
         if 'events' not in self.root:
             self.create_group(self.root, 'events', 'Events')
 
-        if not 'eventTable' in self.root.events:
+        new_database = not 'eventTable' in self.root.events
+        if new_database:
             self.create_table(self.root.events, 'eventTable', _Event, 'Event parameters')
             self.event_row = None
 
         filters = tb.Filters(complib='zlib', complevel=3)
         shape = (0, self.max_event_length)
-        a = tb.FloatAtom()
+        a = tb.Atom.from_dtype(np.dtype(kargs.get('dtype', np.float64)))
         b = tb.IntAtom()
 
-        if not 'raw_data' in self.root.events:
+        # The arrays of an existing database are left as they are.
+        names = []
+        if new_database and kargs.get('store_raw', True):
+            names.append('raw_data')
+        if new_database and kargs.get('store_levels', True):
+            names += ['levels', 'level_lengths']
+
+        if kargs.get('compact', False) and new_database:
+            shape = (0,)
+            for name in names:
+                offsets = self.create_earray(self.root.events, name + '_offsets', tb.Int64Atom(), shape=shape,
+                                             title="Start of each row of " + name, filters=filters)
+                offsets.append([0])
+
+        if 'raw_data' in names:
             self.create_earray(self.root.events, 'raw_data',
                               a, shape=shape,
                               title="Raw data points",
                               filters=filters)
 
-        if not 'levels' in self.root.events:
+        if 'levels' in names:
             self.create_earray(self.root.events, 'levels',
                               a, shape=shape,
                               title="Cusum levels",
                               filters=filters)
 
-        if not 'level_lengths' in self.root.events:
+        if 'level_lengths' in names:
             self.create_earray(self.root.events, 'level_lengths',
                               b, shape=shape,
                               title="Lengths of the cusum levels",
@@ -268,7 +432,13 @@ class EventDatabase(tb.file.File):
         if 'debug' in kargs and kargs['debug']:
             if not 'debug' in self.root:
                 self.create_group(self.root, 'debug', 'Debug')
-            debug_shape = (kargs['n_channels'], kargs['n_points'])
+            decimation = kargs.get('debug_decimation', 1)
+            n_points = kargs['n_points']
+            if decimation > 1:
+                # The min and max of every bin of decimation points.
+                n_points = 2 * ((n_points + decimation - 1) // decimation)
+            self.root.debug._v_attrs.decimation = decimation
+            debug_shape = (kargs['n_channels'], n_points)
             if not 'data' in self.root.debug:
                 self.create_carray(self.root.debug, 'data',
                                   a, shape=debug_shape,
@@ -293,6 +463,81 @@ class EventDatabase(tb.file.File):
                                   title="Raw data",
                                   filters=filters)
 
+    def get_debug_decimation(self):
+        """
+        :returns: The number of data points in each bin of the debug traces. For more than 1, the traces hold\
+            the min and max of each bin, one after the other. Databases without the attribute are not decimated.
+        """
+        if 'decimation' in self.root.debug._v_attrs:
+            return self.root.debug._v_attrs.decimation
+        return 1
+
+    def has_checkpoint(self):
+        """
+        :returns: True if a checkpoint was saved with :py:func:`save_checkpoint` and not removed.
+        """
+        return 'checkpoint' in self.root
+
+    def load_checkpoint(self):
+        """
+        Drops everything added to /events since the last checkpoint, so the database is as it was when\
+        the checkpoint was saved.
+
+        :returns: The state saved with the checkpoint, or None if there is no checkpoint.
+        """
+        if not self.has_checkpoint():
+            return None
+        self.root.events.eventTable.flush()
+        attrs = self.root.checkpoint._v_attrs
+        for name, n_rows in attrs.n_rows.items():
+            node = self.root.events._f_get_child(name)
+            if node.nrows > n_rows:
+                node.truncate(n_rows)
+        self.event_row = None
+        self.flush()
+        return attrs.state
+
+    def remove_checkpoint(self):
+        """
+        Removes the checkpoint, if there is one.
+        """
+        if self.has_checkpoint():
+            self.root.checkpoint._f_remove(recursive=True)
+
+    def save_checkpoint(self, state):
+        """
+        Saves state, which must be picklable, along with the number of rows in everything in /events, to\
+        /checkpoint, replacing any earlier checkpoint. The database is flushed, so the checkpoint survives the\
+        process being killed.
+        """
+        self.root.events.eventTable.flush()
+        if not self.has_checkpoint():
+            self.create_group(self.root, 'checkpoint', 'Checkpoint')
+        attrs = self.root.checkpoint._v_attrs
+        attrs.n_rows = dict((node._v_name, node.nrows) for node in self.root.events._f_iter_nodes())
+        attrs.state = state
+        self.flush()
+
+    def is_compact(self):
+        """
+        :returns: True if raw_data, levels and level_lengths are stored in the compact layout.
+        """
+        names = self._get_array_names()
+        return len(names) > 0 and self.root.events._f_get_child(names[0]).ndim == 1
+
+    def has_raw_data(self):
+        """
+        :returns: True if the raw data of the events is stored. Searches with store_raw=False leave it out.
+        """
+        return 'raw_data' in self.root.events
+
+    def has_levels(self):
+        """
+        :returns: True if the levels and level lengths of the events are stored. Searches with store_levels=False\
+            leave them out.
+        """
+        return 'levels' in self.root.events
+
     def is_debug(self):
         """
         :returns: True if the event was created with the debug keyword.
@@ -353,6 +598,119 @@ class EventDatabase(tb.file.File):
             prev_event_start = row['event_start']
 
 
+class EventDatabaseWriter(object):
+    """
+    Writes batches of events to an :py:class:`EventDatabase` on a background thread, so that compressing and
+    writing them overlaps with finding more events.
+
+    At most max_pending_batches batches wait to be written. After that, :py:func:`append` blocks until the
+    writer catches up. While the writer is open, nothing else should use the EventDatabase.
+
+    HDF5 can't be used from several threads at once, so the writers of different EventDatabases take turns.
+
+    >>> writer = EventDatabaseWriter(database)
+    >>> writer.append(event_rows, raw_data, levels, level_lengths)
+    >>> writer.close()  # waits for everything to be written
+    """
+
+    # Held while writing to any EventDatabase.
+    _hdf5_lock = threading.Lock()
+
+    def __init__(self, database, max_pending_batches=2):
+        """
+        :param EventDatabase database: Open EventDatabase to write to.
+        :param int max_pending_batches: Number of batches that can wait to be written before :py:func:`append`\
+            blocks. Default is 2.
+        """
+        self.database = database
+        # Seconds spent writing to the EventDatabase so far.
+        self.write_time = 0.
+        self._queue = Queue.Queue(maxsize=max_pending_batches)
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._write_batches)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def append(self, event_rows, raw_data=None, levels=None, level_lengths=None):
+        """
+        Queues a batch of events to be written. The arrays must not be changed after being passed in.
+
+        :param event_rows: Rows for the eventTable, either a list of tuples in the order of the columns or a\
+            numpy structured array of :py:data:`EVENT_DTYPE`.
+        :param raw_data: Numpy matrix of the raw data, one row per event.
+        :param levels: Numpy matrix of the levels, one row per event.
+        :param level_lengths: Numpy matrix of the level lengths, one row per event.
+        :raises: The exception raised by an earlier batch, if writing it failed.
+        """
+        self._raise_error()
+        self._queue.put((self._write_events, (event_rows, raw_data, levels, level_lengths)))
+
+    def append_debug(self, start, data, baseline, threshold_positive, threshold_negative, channel=0):
+        """
+        Queues a chunk of the debug traces to be written to a channel of the debug group, starting at\
+        index start. The arrays must not be changed after being passed in.
+        """
+        self._raise_error()
+        self._queue.put((self._write_debug, (start, data, baseline, threshold_positive, threshold_negative, channel)))
+
+    def flush(self):
+        """
+        Waits until every batch appended so far is written.
+
+        :raises: The exception raised while writing, if writing any batch failed.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """
+        Writes any batches still waiting and stops the background thread. Does not close the EventDatabase.
+
+        :raises: The exception raised while writing, if writing any batch failed.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._exc_info is not None:
+            exc_info = self._exc_info
+            self._exc_info = None
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _write_batches(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                self._queue.task_done()
+                return
+            # After an error, keep taking batches so append doesn't block forever, but don't write them.
+            if self._exc_info is None:
+                write, args = batch
+                try:
+                    with self._hdf5_lock:
+                        start_time = time.time()
+                        write(*args)
+                        self.write_time += time.time() - start_time
+                except Exception:
+                    self._exc_info = sys.exc_info()
+            self._queue.task_done()
+
+    def _write_events(self, event_rows, raw_data, levels, level_lengths):
+        self.database.append_events(event_rows, raw_data, levels, level_lengths)
+        self.database.root.events.eventTable.flush()
+
+    def _write_debug(self, start, data, baseline, threshold_positive, threshold_negative, channel):
+        debug = self.database.root.debug
+        stop = start + data.size
+        debug.data[channel, start:stop] = data
+        debug.baseline[channel, start:stop] = baseline
+        debug.threshold_positive[channel, start:stop] = threshold_positive
+        debug.threshold_negative[channel, start:stop] = threshold_negative
+
+
 def open_file(*args, **kargs):
     """
     Opens an EventDatabase by calling tables.open_file and then
@@ -361,12 +719,20 @@ def open_file(*args, **kargs):
     :param kargs: Pass in the following named parameters.
 
         - maxEventLength: Maximum length of an event for the table. Default is 100.
+        - compact: boolean -- If True, a new database stores the rows of raw_data, levels and level_lengths\
+            one after the other without padding, instead of as matrices maxEventLength wide. Default is False.
+        - dtype: Floating point type of raw_data and levels in a new database. Default is numpy.float64.
+        - store_raw: boolean -- If False, a new database does not store raw_data. Default is True.
+        - store_levels: boolean -- If False, a new database does not store levels and level_lengths.\
+            Default is True.
         - debug: boolean -- If debug, an extra root.debug group will be created. If passing debug=True, then\
             you need to also pass the following parameters. This mode is used by\
             :py:func:`pypore.event_finder.find_events`, and only does anything if you are opening a new databse.
 
             - n_points: number of points in the original data.
             - n_channels: number of channels in the original data.
+            - debug_decimation: (Optional) If more than 1, the debug arrays hold the min and max of each bin of\
+                debug_decimation points, instead of every point. Default is 1.
 
             And optional parameters
 
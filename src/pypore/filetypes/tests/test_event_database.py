@@ -60,7 +60,7 @@ class TestEventDatabase(unittest.TestCase):
 
         # Check the eventTable columns are correct and in correct order
         column_names = ['array_row', 'event_start', 'event_length', 'n_levels', 'raw_points_per_side', 'baseline',
-                        'current_blockage', 'area']
+                        'current_blockage', 'area', 'channel', 'variance']
         self.assertEqual(events_group.eventTable.colnames, column_names)
 
     def test_clean_database(self):
@@ -129,6 +129,34 @@ class TestEventDatabase(unittest.TestCase):
         self.assertEqual(self.database.root.events.level_lengths.nrows, 0)
         npt.assert_array_equal(self.database.root.events.raw_data[:], raw_data)
 
+    def test_append_events(self):
+        """
+        Tests that append_events appends a batch of events, as a structured array or as a list of tuples, the same\
+        as appending them one at a time.
+        """
+        width = self.database.max_event_length
+        events = np.zeros(3, dtype=eD.EVENT_DTYPE)
+        events['array_row'] = np.arange(3)
+        events['event_start'] = [10, 20, 30]
+        events['event_length'] = [3, 4, 5]
+        events['n_levels'] = [1, 2, 1]
+        events['baseline'] = 6.
+        events['variance'] = [0.1, 0.2, 0.3]
+        raw_data = np.random.random((3, width))
+        levels = np.random.random((3, width))
+        level_lengths = np.ones((3, width), dtype=np.int32)
+        self.database.append_events(events, raw_data, levels, level_lengths)
+        self.database.append_events(events[:1].tolist())
+        self.database.flush()
+
+        table = self.database.get_event_table()
+        self.assertEqual(table.nrows, 4)
+        npt.assert_array_equal(table[:3], events)
+        npt.assert_array_equal(table[3:], events[:1])
+        npt.assert_array_equal(self.database.root.events.raw_data[:], raw_data)
+        npt.assert_array_equal(self.database.root.events.levels[:], levels)
+        npt.assert_array_equal(self.database.root.events.level_lengths[:], level_lengths)
+
     def test_delete_event(self):
         """
         Tests deleting single events from eventTable.
@@ -365,6 +393,41 @@ class TestEventDatabase(unittest.TestCase):
         # check that raw_data is still the same
         npt.assert_array_equal(raw, self.database.root.events.raw_data[:])
 
+    def test_initialize_database_without_arrays(self):
+        """
+        Tests that store_raw=False and store_levels=False leave out the arrays, also when the database is opened\
+        again, and that events can still be appended.
+        """
+        filename = 'test_initialize_database_without_arrays.h5'
+        for compact in (False, True):
+            database = eD.open_file(filename, mode='w', compact=compact, store_raw=False, store_levels=False)
+            try:
+                self.assertEqual([node._v_name for node in database.walk_nodes(database.root.events)],
+                                 ['events', 'eventTable'])
+                self.assertFalse(database.has_raw_data())
+                self.assertFalse(database.has_levels())
+                self.assertFalse(database.is_compact())
+                database.append_events([(0, 2, 3, 1, 5, 6., 7., 8., 0, 0.)])
+                database.close()
+
+                database = eD.open_file(filename, mode='a')
+                self.assertFalse(database.has_raw_data())
+                self.assertEqual(database.get_event_count(), 1)
+                database.clean_database()
+                self.assertFalse(database.has_levels())
+            finally:
+                database.close()
+                os.remove(filename)
+
+        database = eD.open_file(filename, mode='w', compact=True, store_levels=False)
+        try:
+            self.assertTrue(database.has_raw_data())
+            self.assertFalse(database.has_levels())
+            self.assertTrue(database.is_compact())
+        finally:
+            database.close()
+            os.remove(filename)
+
     def test_get_events_group(self):
         """
         Test the getter for /events
@@ -376,6 +439,76 @@ class TestEventDatabase(unittest.TestCase):
         self.assertIn('levels', events_group)
         self.assertIn('level_lengths', events_group)
 
+    def test_checkpoint(self):
+        """
+        Tests that load_checkpoint drops the events appended after save_checkpoint, and returns the saved state.
+        """
+        raw_data = np.zeros((1, self.max_event_length))
+        levels = np.zeros((1, self.max_event_length))
+        self.assertFalse(self.database.has_checkpoint())
+        self.assertIsNone(self.database.load_checkpoint())
+        self.database.append_event(0, 2, 3, 4, 5, 6, 7, 8, raw_data, levels)
+        self.database.save_checkpoint({'n_events': 1})
+        self.assertTrue(self.database.has_checkpoint())
+        for i in xrange(1, 3):
+            self.database.append_event(i, 2, 3, 4, 5, 6, 7, 8, raw_data, levels)
+
+        self.assertEqual(self.database.load_checkpoint(), {'n_events': 1})
+        self.assertEqual(self.database.get_event_count(), 1)
+        self.assertEqual(self.database.root.events.raw_data.nrows, 1)
+        self.assertEqual(self.database.root.events.levels.nrows, 1)
+        self.database.append_event(1, 2, 3, 4, 5, 6, 7, 8, raw_data, levels)
+        self.assertEqual(self.database.get_event_count(), 2)
+        self.assertEqual(self.database.root.events.raw_data.nrows, 2)
+
+        self.database.remove_checkpoint()
+        self.assertFalse(self.database.has_checkpoint())
+
+    def test_get_metrics(self):
+        """
+        Tests that get_metrics reads the JSON report in the eventTable attributes.
+        """
+        self.assertIsNone(self.database.get_metrics())
+        self.database.root.events.eventTable.attrs.metrics = '{"events": 3, "read_time": 0.5}'
+        self.assertEqual(self.database.get_metrics(), {'events': 3, 'read_time': 0.5})
+
+    def test_get_channel_at(self):
+        """
+        Tests that get_channel_at returns the channel each event was appended with.
+        """
+        self.database.append_event(0, 2, 3, 4, 5, 6, 7, 8)
+        self.database.append_event(1, 2, 3, 4, 5, 6, 7, 8, channel=2)
+        self.assertEqual(self.database.get_channel_at(0), 0)
+        self.assertEqual(self.database.get_channel_at(1), 2)
+
+    def test_append_to_old_event_table(self):
+        """
+        Tests that events can be appended to a database from before events had a channel and variance, whose\
+        eventTable doesn't have their columns.
+        """
+        old_dtype = np.dtype([(name, eD.EVENT_DTYPE[name]) for name in eD.EVENT_DTYPE.names
+                              if name not in ('channel', 'variance')])
+        self.database.remove_node(self.database.root.events, 'eventTable')
+        self.database.create_table(self.database.root.events, 'eventTable', old_dtype)
+        self.database.close()
+        self.database = eD.open_file(self.filename, mode='a')
+
+        self.database.append_event(0, 2, 3, 4, 5, 6, 7, 8, channel=1, variance=9.)
+        self.database.flush()
+        events = np.zeros(2, dtype=eD.EVENT_DTYPE)
+        events['array_row'] = [1, 2]
+        events['event_start'] = [10, 20]
+        events['channel'] = 1
+        self.database.append_events(events)
+        self.database.flush()
+
+        table = self.database.get_event_table()
+        self.assertEqual(table.colnames, list(old_dtype.names))
+        self.assertEqual(table.nrows, 3)
+        npt.assert_array_equal(table.col('array_row'), [0, 1, 2])
+        npt.assert_array_equal(table.col('event_start'), [2, 10, 20])
+        self.assertEqual(self.database.get_channel_at(2), 0)
+
     def test_get_event_count(self):
         """
         Tests that getEventCount returns the correct value, even
@@ -554,6 +687,131 @@ class TestEventDatabase(unittest.TestCase):
         os.remove(output_filename)
 
 
+class TestCompactEventDatabase(unittest.TestCase):
+    def setUp(self):
+        self.filename = 'testCompactEventDatabase_2309487.h5'
+        self.max_event_length = 100
+        self.database = eD.open_file(self.filename, mode='w', maxEventLength=self.max_event_length, compact=True)
+
+    def tearDown(self):
+        self.database.close()
+        os.remove(self.filename)
+
+    def _append_events(self, database):
+        """
+        Appends two events, with raw_points_per_side=5. Returns their raw data, levels and level lengths.
+        """
+        raw = np.linspace(0.0, 100.0, 2 * self.max_event_length).reshape((2, self.max_event_length))
+        levels = raw + 1000.
+        lengths = np.arange(2 * self.max_event_length).reshape((2, self.max_event_length))
+        database.append_event(0, 2, 3, 4, 5, 6, 7, 8, raw[:1], levels[:1], lengths[:1])
+        database.append_event(1, 20, 30, 2, 5, 6, 7, 8, raw[1:], levels[1:], lengths[1:])
+        return raw, levels, lengths
+
+    def _check_events(self, database, raw, levels, lengths):
+        npt.assert_array_equal(database.get_raw_data_at(0), raw[0][:13])
+        npt.assert_array_equal(database.get_raw_data_at(1), raw[1][:40])
+        npt.assert_array_equal(database.get_event_data_at(1), raw[1][5:35])
+        npt.assert_array_equal(database.get_levels_at(0), levels[0][:4])
+        npt.assert_array_equal(database.get_levels_at(1), levels[1][:2])
+        npt.assert_array_equal(database.get_level_lengths_at(0), lengths[0][:4])
+        npt.assert_array_equal(database.get_level_lengths_at(1), lengths[1][:2])
+
+    def test_append_event(self):
+        """
+        Tests that only the used part of each row is stored, and read back by the get_*_at methods.
+        """
+        self.assertTrue(self.database.is_compact())
+        raw, levels, lengths = self._append_events(self.database)
+
+        self.assertEqual(self.database.root.events.raw_data.shape, (13 + 40,))
+        self.assertEqual(self.database.root.events.levels.shape, (4 + 2,))
+        npt.assert_array_equal(self.database.root.events.raw_data_offsets[:], [0, 13, 53])
+        self._check_events(self.database, raw, levels, lengths)
+
+    def test_clean_database(self):
+        """
+        Tests that clean_database keeps the compact layout.
+        """
+        self._append_events(self.database)
+        self.database.clean_database()
+        self.assertTrue(self.database.is_compact())
+        self.assertEqual(self.database.root.events.raw_data.nrows, 0)
+        npt.assert_array_equal(self.database.root.events.raw_data_offsets[:], [0])
+
+    def test_append_array_rows_from(self):
+        """
+        Tests copying the rows of events from one compact database to another.
+        """
+        raw, levels, lengths = self._append_events(self.database)
+        self.database.flush()
+        filename = 'testCompactEventDatabase_copy_2309487.h5'
+        database = eD.open_file(filename, mode='w', compact=True)
+        try:
+            database.get_event_table().append(self.database.get_event_table()[:])
+            database.append_array_rows_from(self.database, 0, 2)
+            self._check_events(database, raw, levels, lengths)
+        finally:
+            database.close()
+            os.remove(filename)
+
+    def test_writer(self):
+        """
+        Tests that the EventDatabaseWriter trims the rows of a batch to the events' lengths.
+        """
+        raw = np.linspace(0.0, 100.0, 2 * self.max_event_length).reshape((2, self.max_event_length))
+        levels = raw + 1000.
+        lengths = np.arange(2 * self.max_event_length).reshape((2, self.max_event_length))
+        writer = eD.EventDatabaseWriter(self.database)
+        writer.append([(0, 2, 3, 4, 5, 6., 7., 8., 0, 0.), (1, 20, 30, 2, 5, 6., 7., 8., 0, 0.)], raw, levels,
+                      lengths)
+        writer.close()
+        self._check_events(self.database, raw, levels, lengths)
+
+
+class TestEventDatabaseWriter(unittest.TestCase):
+    def setUp(self):
+        self.filename = 'testEventDatabaseWriter_2093845.h5'
+        self.max_event_length = 10
+        self.database = eD.open_file(self.filename, mode='w', maxEventLength=self.max_event_length)
+
+    def tearDown(self):
+        self.database.close()
+        os.remove(self.filename)
+
+    def test_append_batches(self):
+        """
+        Tests that batches appended to the writer are all written, in order, after closing it.
+        """
+        writer = eD.EventDatabaseWriter(self.database, max_pending_batches=1)
+        n_batches = 5
+        for batch in xrange(n_batches):
+            rows = [(2 * batch + i, 100 * batch + i, 3, 1, 2, 4., 5., 6., 0, 0.) for i in xrange(2)]
+            data = np.zeros((2, self.database.max_event_length)) + batch
+            writer.append(rows, data, data + 1, data.astype(np.int32) + 2)
+        writer.close()
+
+        table = self.database.get_event_table()
+        self.assertEqual(table.nrows, 2 * n_batches)
+        npt.assert_array_equal(table.col('array_row'), np.arange(2 * n_batches))
+        npt.assert_array_equal(table.col('event_start'), [100 * (i // 2) + i % 2 for i in xrange(2 * n_batches)])
+        for batch in xrange(n_batches):
+            for i in xrange(2):
+                npt.assert_array_equal(self.database.get_raw_data_at(2 * batch + i), batch)
+                npt.assert_array_equal(self.database.get_levels_at(2 * batch + i), batch + 1)
+                npt.assert_array_equal(self.database.get_level_lengths_at(2 * batch + i), batch + 2)
+
+    def test_error_raised_on_close(self):
+        """
+        Tests that an error writing a batch is raised in the thread using the writer.
+        """
+        writer = eD.EventDatabaseWriter(self.database)
+        # Wrong number of columns
+        width = self.database.max_event_length + 5
+        writer.append([(0, 0, 3, 1, 2, 4., 5., 6., 0, 0.)], np.zeros((1, width)))
+        self.assertRaises(Exception, writer.close)
+
+
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file
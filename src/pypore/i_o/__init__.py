@@ -1,10 +1,14 @@
 # TODO implement tests for this!
-def get_reader_from_filename(filename):
+import numpy as np
+
+
+def get_reader_from_filename(filename, dtype=np.float64):
     """
     Returns an instance of an implementation of :py:class:`pypore.i_o.abstract_reader.AbstractReader` based on the
     extension of filename.
 
     :param string filename: Filename to get the reader for.
+    :param dtype: Floating point type of the samples the reader returns, numpy.float64 (default) or numpy.float32.
     :returns: An open reader of an implementation of :py:class:`pypore.i_o.abstract_reader.AbstractReader` based on the\
              extension of filename, for the following extensions.
 
@@ -33,7 +37,7 @@ def get_reader_from_filename(filename):
         raise ValueError(
             "No default match for the extension of {0}. Default extensions include '.h5', '.log', '.hkd', '.hex'.".format(filename))
 
-    reader = ReaderClass(filename)
+    reader = ReaderClass(filename, dtype=dtype)
     return reader
 
     # elif '.hkd' in filename:
@@ -14,6 +14,9 @@ cdef class AbstractReader:
     cdef public double sample_rate
     cdef public long points_per_channel_total
     cdef object filename
+    cdef public object dtype
+    # Min/max pyramid of the data, opened by the first call to get_envelope.
+    cdef object envelope
 
     cpdef _prepare_file(self, filename)
 
@@ -26,6 +29,18 @@ cdef class AbstractReader:
     cpdef object get_next_blocks(self, long n_blocks=?)
     cdef object get_next_blocks_c(self, long n_blocks=?)
 
+    cpdef seek(self, long sample)
+    cdef void seek_c(self, long sample) except *
+
+    cpdef object read_range(self, long start, long n, object out=?)
+    cdef object read_range_c(self, long start, long n, object out)
+
+    cpdef object get_envelope(self, long start, long stop, long n_bins)
+    cdef object get_envelope_c(self, long start, long stop, long n_bins)
+
+    cpdef long refresh(self) except -1
+    cdef long refresh_c(self) except -1
+
     cpdef double get_sample_rate(self)
     cdef double get_sample_rate_c(self)
 
@@ -37,3 +52,6 @@ cdef class AbstractReader:
 
     cpdef long get_block_size(self)
     cdef long get_block_size_c(self)
+
+    cpdef object get_dtype(self)
+    cdef object get_dtype_c(self)
@@ -1,5 +1,12 @@
 from cpython cimport bool
 
+import numpy as np
+
+from pypore.i_o import envelope
+
+#: Sample dtypes the readers can return.
+SUPPORTED_DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+
 cdef class AbstractReader:
     """
     This is an abstract class showing the methods that subclasses must override.
@@ -10,16 +17,22 @@ cdef class AbstractReader:
 
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, dtype=np.float64):
         """
         Opens a data file, reads relevant parameters, and returns then open file and parameters.
 
         :param StringType filename: Filename to open and read parameters.
+        :param dtype: Floating point type of the returned samples, either numpy.float64 (default) or\
+                numpy.float32. Reading as float32 halves the memory and bandwidth of everything downstream.
 
         If there was an error opening the files, params will have 'error' key with string description.
         """
+        dtype = np.dtype(dtype)
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError("dtype must be numpy.float32 or numpy.float64, not {0}.".format(dtype))
         self.block_size = 5000
         self.filename = filename
+        self.dtype = dtype
         self._prepare_file(filename)
 
     cpdef _prepare_file(self, filename):
@@ -43,6 +56,9 @@ cdef class AbstractReader:
 
         Closes the file and the reader.
         """
+        if self.envelope is not None:
+            self.envelope.close()
+            self.envelope = None
         self.close_c()
 
     cdef void close_c(self):
@@ -60,7 +76,7 @@ cdef class AbstractReader:
         Reads and returns all of the data in the file.
 
         :param BooleanType decimate: Whether or not to decimate the data. Default is False.
-        :returns: List of numpy arrays, one for each channel of the data.
+        :returns: List of numpy arrays of :py:func:`get_dtype`, one for each channel of the data.
         """
         return self.get_all_data_c(decimate)
 
@@ -79,13 +95,120 @@ cdef class AbstractReader:
         Gets the next n_blocks (~5000 data points per block) of data from filename.
 
         :param IntType n_blocks: Number of blocks to read and return.
-        :returns: ListType<np.array> -- List of numpy arrays, one for each channel of the data.
+        :returns: ListType<np.array> -- List of numpy arrays of :py:func:`get_dtype`, one for each channel of the\
+                data.
         """
         return self.get_next_blocks_c(n_blocks)
 
     cdef object get_next_blocks_c(self, long n_blocks=1):
         raise NotImplementedError
 
+    cpdef seek(self, long sample):
+        """seek(long sample)
+
+        (Note this is a cpdef wrapper around the cdef method :py:func:`seek_c`.
+        If using Cython, you can call the cdef version directly.)
+
+        Moves the reader so that the next call to :py:func:`get_next_blocks` starts at the given sample.
+
+        :param IntType sample: Index of the sample (per channel) to move to.
+        """
+        self.seek_c(sample)
+
+    cdef void seek_c(self, long sample) except *:
+        """
+        See docs for :py:func:`seek`.
+        """
+        raise NotImplementedError
+
+    cpdef object read_range(self, long start, long n, object out=None):
+        """read_range(long start, long n, out=None)
+
+        (Note this is a cpdef wrapper around the cdef method :py:func:`read_range_c`.
+        If using Cython, you can call the cdef version directly.)
+
+        Reads n samples per channel starting at sample start, without moving the position used by\
+        :py:func:`get_next_blocks`. Reads don't share a file position, so several threads can read ranges from one\
+        open reader at the same time.
+
+        :param IntType start: Index of the first sample (per channel) to read.
+        :param IntType n: Number of samples per channel to read. Fewer are read if the file ends first.
+        :param out: Optional list of C contiguous arrays of :py:func:`get_dtype`, one for each channel, each with\
+                at least n elements, to read the samples into.
+        :returns: ListType<np.array> -- List of numpy arrays, one for each channel of the data. When out is given,\
+                these are views of the start of its arrays.
+        """
+        if start < 0 or n < 0:
+            raise ValueError("start and n must not be negative, got start={0}, n={1}.".format(start, n))
+        if out is not None:
+            for array in out:
+                if array.dtype != self.dtype or array.ndim != 1 or array.size < n or \
+                        not array.flags.c_contiguous:
+                    raise ValueError("out must be a list of C contiguous {0} arrays with at least {1} "
+                                     "elements.".format(self.dtype, n))
+        return self.read_range_c(start, max(min(n, self.points_per_channel_total - start), 0), out)
+
+    cdef object read_range_c(self, long start, long n, object out):
+        """
+        See docs for :py:func:`read_range`. start and n are already checked to be within the file, and out to have\
+        arrays that fit.
+        """
+        raise NotImplementedError
+
+    cpdef object get_envelope(self, long start, long stop, long n_bins):
+        """get_envelope(long start, long stop, long n_bins)
+
+        (Note this is a cpdef wrapper around the cdef method :py:func:`get_envelope_c`.
+        If using Cython, you can call the cdef version directly.)
+
+        Returns the max and min of the data in each of n_bins equal bins between samples start and stop, for\
+        plotting. The first call opens the min/max pyramid saved next to the file, or builds and saves it, see\
+        :py:mod:`pypore.i_o.envelope`. After that, each call only reads the bins it needs.
+
+        :param IntType start: First sample (per channel) of the range.
+        :param IntType stop: Sample (per channel) after the end of the range. Ranges past the end of the file are\
+                cut short.
+        :param IntType n_bins: Number of bins. Fewer are returned if there are fewer samples in the range.
+        :returns: ListType<np.array> -- List of numpy arrays of :py:func:`get_dtype`, one for each channel, with\
+                the max and min of each bin one after the other, like :py:func:`get_all_data` with decimate=True.
+        """
+        if start < 0 or stop < start or n_bins < 1:
+            raise ValueError("Need 0 <= start <= stop and n_bins >= 1, got start={0}, stop={1}, "
+                             "n_bins={2}.".format(start, stop, n_bins))
+        return self.get_envelope_c(start, min(stop, self.points_per_channel_total), n_bins)
+
+    cdef object get_envelope_c(self, long start, long stop, long n_bins):
+        """
+        See docs for :py:func:`get_envelope`. start and stop are already checked to be within the file.
+        """
+        if self.envelope is None:
+            self.envelope = envelope.open_envelope(self)
+        return self.envelope.get_envelope(self, start, stop, n_bins)
+
+    cpdef long refresh(self) except -1:
+        """refresh()
+
+        (Note this is a cpdef wrapper around the cdef method :py:func:`refresh_c`.
+        If using Cython, you can call the cdef version directly.)
+
+        Checks for data appended to the file since it was opened, for files still being written. Once it is\
+        found, :py:func:`get_next_blocks` carries on into the new data, even after it ran out of data before.\
+        Only complete samples are read. Readers of files that can't grow leave points_per_channel_total as it is.
+
+        :returns: The number of points per channel in the file now.
+        """
+        if self.envelope is not None:
+            # The pyramid is out of date once the file grows.
+            self.envelope.close()
+            self.envelope = None
+        return self.refresh_c()
+
+    cdef long refresh_c(self) except -1:
+        """
+        See docs for :py:func:`refresh`.
+        """
+        return self.points_per_channel_total
+
     cpdef double get_sample_rate(self):
         """get_sample_rate()
 
@@ -132,3 +255,16 @@ cdef class AbstractReader:
 
     cdef long get_block_size_c(self):
         return self.block_size
+
+    cpdef object get_dtype(self):
+        """get_dtype()
+
+        (Note this is a cpdef wrapper around the cdef method :py:func:`get_dtype_c`.
+        If using Cython, you can call the cdef version directly.)
+
+        :returns: the numpy dtype of the samples returned by the reader.
+        """
+        return self.get_dtype_c()
+
+    cdef object get_dtype_c(self):
+        return self.dtype
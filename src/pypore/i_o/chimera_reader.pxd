@@ -1,3 +1,4 @@
+cimport numpy as np
 from abstract_reader cimport AbstractReader
 
 cdef class ChimeraReader(AbstractReader):
@@ -5,7 +6,8 @@ cdef class ChimeraReader(AbstractReader):
     # Note that these need to be public in order for the calling of
     # _prepare_file from AbstractReader to work.
 
-    cdef public object datafile
+    cdef public object raw_data
+    cdef public long position
     cdef public object specs_file
 
     # parameters from the specsfile
@@ -16,3 +18,8 @@ cdef class ChimeraReader(AbstractReader):
     cdef public double pre_adc_gain
     cdef public long bit_mask
     cdef public double decimate_sample_rate
+
+    cpdef long read_into(self, long start, np.ndarray out) except -1
+    cdef long read_into_c(self, long start, np.ndarray out) except -1
+
+    cdef void _map_file(self) except *
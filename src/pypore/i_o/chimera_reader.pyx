@@ -2,6 +2,7 @@ import scipy.io as sio
 import numpy as np
 
 cimport numpy as np
+cimport cython
 import os
 
 from cpython cimport bool
@@ -9,12 +10,90 @@ from pypore.i_o.abstract_reader cimport AbstractReader
 
 ctypedef np.float_t DTYPE_t
 
+ctypedef fused sample_t:
+    np.float32_t
+    np.float64_t
+
 CHIMERA_DATA_TYPE = np.dtype('<u2')
 
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _scale_raw_c(np.uint16_t *raw, sample_t *out, long n, np.uint16_t bit_mask, sample_t adc_v_ref,
+                       sample_t gain, sample_t current_offset) nogil:
+    """
+    Scales n raw Chimera samples into out in one pass. The operations are done in the same order and precision as\
+    the numpy expression they replace, so the results are identical.
+    """
+    cdef sample_t two_v_ref = 2 * adc_v_ref
+    cdef sample_t full_scale = 2. ** 16
+    cdef sample_t nano = 1.e9
+    cdef sample_t value
+    cdef long i
+    for i in range(n):
+        value = -adc_v_ref + two_v_ref * <sample_t> (raw[i] & bit_mask) / full_scale
+        value /= gain
+        value += current_offset
+        value *= nano
+        out[i] = value
+
+
 cdef class ChimeraReader(AbstractReader):
+    """
+    Reader for Chimera ".log" files. The ".log" file is memory mapped, so reading is zero-copy: samples are scaled\
+    straight from the page cache into the returned arrays, and several readers or processes opening the same file\
+    share its pages.
+    """
     # Note that these need to be public in order for the calling of
     # _prepare_file from AbstractReader to work.
 
+    cpdef long read_into(self, long start, np.ndarray out) except -1:
+        """read_into(long start, np.ndarray out)
+
+        Scales the samples starting at sample start into out, without reading or allocating anything else.
+
+        :param long start: First sample to read.
+        :param np.ndarray out: C contiguous array of the reader's dtype to fill. Only the beginning is filled if\
+                fewer samples remain in the file.
+        :returns: Number of samples written to out.
+        """
+        if out.dtype != self.dtype or not out.flags.c_contiguous:
+            raise ValueError("out must be a C contiguous {0} array.".format(self.dtype))
+        return self.read_into_c(start, out)
+
+    cdef long read_into_c(self, long start, np.ndarray out) except -1:
+        """
+        See docs for :py:func:`read_into`. out is not checked.
+        """
+        if self.raw_data is None:
+            raise ValueError("I/O operation on closed file.")
+        cdef long n = min(out.size, self.points_per_channel_total - start)
+        if n <= 0 or start < 0:
+            return 0
+        cdef np.ndarray raw = self.raw_data
+        cdef np.uint16_t *raw_pointer = <np.uint16_t *> raw.data + start
+        cdef np.uint16_t bit_mask = self.bit_mask
+        cdef double gain = self.pre_adc_gain * self.tia_gain
+        if self.dtype == np.float32:
+            with nogil:
+                _scale_raw_c(raw_pointer, <np.float32_t *> out.data, n, bit_mask, <np.float32_t> self.adc_v_ref,
+                             <np.float32_t> gain, <np.float32_t> self.current_offset)
+        else:
+            with nogil:
+                _scale_raw_c(raw_pointer, <np.float64_t *> out.data, n, bit_mask, <np.float64_t> self.adc_v_ref,
+                             <np.float64_t> gain, <np.float64_t> self.current_offset)
+        return n
+
+    cdef object read_range_c(self, long start, long n, object out):
+        cdef np.ndarray log_data
+        if out is None:
+            log_data = np.empty(n, dtype=self.dtype)
+        else:
+            log_data = out[0][:n]
+        self.read_into_c(start, log_data)
+        return [log_data]
+
     cdef object get_next_blocks_c(self, long n_blocks=1):
         """
         Get the next n blocks of data.
@@ -23,16 +102,10 @@ cdef class ChimeraReader(AbstractReader):
         :returns: List of numpy arrays, one for each channel. Chimera data only has one channel,\
             so this returns [np array].
         """
-
-        cdef np.ndarray raw_values = np.fromfile(self.datafile, CHIMERA_DATA_TYPE, n_blocks * self.block_size)
-        raw_values &= self.bit_mask
-        cdef np.ndarray[DTYPE_t] log_data = -self.adc_v_ref + (2 * self.adc_v_ref) * raw_values / (2 ** 16)
-
-        # Extra scaling for the log data.
-        log_data /= (self.pre_adc_gain * self.tia_gain)
-        log_data += self.current_offset
-        log_data *= 1.e9
-
+        # Only read whole samples, in case the file is still being written.
+        cdef long n_points = max(min(n_blocks * self.block_size, self.points_per_channel_total - self.position), 0)
+        cdef np.ndarray log_data = np.empty(n_points, dtype=self.dtype)
+        self.position += self.read_into_c(self.position, log_data)
         return [log_data]
 
     cpdef _prepare_file(self, filename):
@@ -48,11 +121,8 @@ cdef class ChimeraReader(AbstractReader):
             raise IOError(
                 "Error opening " + filename + ", Chimera .mat specs file of same name must be located in same folder.")
 
-        self.datafile = open(filename, 'rb')
-
-        # Calculate number of points per channel
-        cdef int filesize = os.path.getsize(filename)
-        self.points_per_channel_total = filesize / CHIMERA_DATA_TYPE.itemsize
+        self.position = 0
+        self._map_file()
 
         self.adc_bits = self.specs_file['SETUP_ADCBITS'][0][0]
         self.adc_v_ref = self.specs_file['SETUP_ADCVREF'][0][0]
@@ -66,8 +136,29 @@ cdef class ChimeraReader(AbstractReader):
         # Change the decimate sample rate
         self.decimate_sample_rate = self.sample_rate * 2.0 / self.block_size
 
+    cdef void _map_file(self) except *:
+        """
+        Memory maps the whole samples currently in the ".log" file and sets points_per_channel_total.
+        """
+        # Only map whole samples, in case the file is still being written.
+        self.points_per_channel_total = os.path.getsize(self.filename) / CHIMERA_DATA_TYPE.itemsize
+        if self.points_per_channel_total > 0:
+            self.raw_data = np.memmap(self.filename, dtype=CHIMERA_DATA_TYPE, mode='r',
+                                      shape=(self.points_per_channel_total,))
+        else:
+            # Empty files cannot be mapped.
+            self.raw_data = np.empty(0, dtype=CHIMERA_DATA_TYPE)
+
     cdef void close_c(self):
-        self.datafile.close()
+        # The map is closed once the last array viewing it is gone.
+        self.raw_data = None
+
+    cdef void seek_c(self, long sample) except *:
+        self.position = sample
+
+    cdef long refresh_c(self) except -1:
+        self._map_file()
+        return self.points_per_channel_total
 
     cdef object get_all_data_c(self, bool decimate=False):
         """
@@ -77,32 +168,30 @@ cdef class ChimeraReader(AbstractReader):
 
         :returns: List of numpy arrays, one for each channel of data.
         """
-        self.datafile.seek(0)
         cdef long decimated_size = 0
         cdef long i = 0
-        cdef np.ndarray[DTYPE_t] log_data, read_values
+        cdef long start
+        cdef np.ndarray log_data, read_values
         cdef np.ndarray raw_values
-        if decimate:
-            # use 5000 for plot decimation
-            decimated_size = 2 * int(self.points_per_channel_total / self.block_size)
-            # will there be a block at the end with < block_size datapoints?
-            if self.points_per_channel_total % self.block_size > 0:
-                decimated_size += 2
-            log_data = np.empty(decimated_size)
-            i = 0
-            while True:
-                raw_values = np.fromfile(self.datafile, CHIMERA_DATA_TYPE, self.block_size)
-                if raw_values.size < 1:
-                    break
-                read_values = -self.adc_v_ref + (2 * self.adc_v_ref) * (raw_values & self.bit_mask) / (2 ** 16)
-                log_data[i] = np.max(read_values)
-                log_data[i + 1] = np.min(read_values)
-                i += 2
-
-        else:
-            raw_values = np.fromfile(self.datafile, CHIMERA_DATA_TYPE)
-            raw_values &= self.bit_mask
-            log_data = -self.adc_v_ref + (2 * self.adc_v_ref) * raw_values / (2 ** 16)
+        self.position = self.points_per_channel_total
+        if not decimate:
+            log_data = np.empty(self.points_per_channel_total, dtype=self.dtype)
+            self.read_into_c(0, log_data)
+            return [log_data]
+
+        # use 5000 for plot decimation
+        decimated_size = 2 * int(self.points_per_channel_total / self.block_size)
+        # will there be a block at the end with < block_size datapoints?
+        if self.points_per_channel_total % self.block_size > 0:
+            decimated_size += 2
+        log_data = np.empty(decimated_size, dtype=self.dtype)
+        for start in range(0, self.points_per_channel_total, self.block_size):
+            raw_values = self.raw_data[start:start + self.block_size]
+            read_values = -self.adc_v_ref + (2 * self.adc_v_ref) * (raw_values & self.bit_mask).astype(
+                self.dtype) / 2. ** 16
+            log_data[i] = np.max(read_values)
+            log_data[i + 1] = np.min(read_values)
+            i += 2
 
         # Extra scaling for the log data.
         log_data /= (self.pre_adc_gain * self.tia_gain)
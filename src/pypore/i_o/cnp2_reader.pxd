@@ -8,7 +8,8 @@ cdef class CNP2Reader(AbstractReader):
     # Note that these need to be public in order for the calling of
     # _prepare_file from AbstractReader to work.
 
-    cdef public object datafile
+    # Memory map of the whole chunks in the file.
+    cdef public object raw_data
     cdef public object config_file
 
     # parameters from the config file
@@ -27,7 +28,13 @@ cdef class CNP2Reader(AbstractReader):
     # Other
     cdef public object raw_dtype
     cdef public int points_per_chunk
+    cdef public int bytes_per_chunk
+    # Scaled value of each ADC code.
+    cdef public object lut
+    # Point the next read starts at.
+    cdef public long position
 
     # Helper functions
-    cdef np.ndarray _unpack_raw(self, np.ndarray raw)
-    cdef np.ndarray _get_next_n_values(self, long n)
+    cdef np.ndarray _scale_adc_data(self, np.ndarray adc_data)
+    cdef np.ndarray _decode(self, long start, long n, np.ndarray out)
+    cdef void _map_file(self) except *
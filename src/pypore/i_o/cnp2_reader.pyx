@@ -2,6 +2,7 @@ from pypore.i_o.abstract_reader cimport AbstractReader
 
 import numpy as np
 cimport numpy as np
+cimport cython
 
 import os
 
@@ -9,8 +10,65 @@ import json
 
 SAMPLE_RATE = 40.e6
 
+# Blocks to decode at a time when decimating, to bound the memory used.
+DEF BLOCKS_PER_DECODE = 1024
+
+ctypedef fused sample_t:
+    np.float32_t
+    np.float64_t
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _decode_c(void *raw, int column_select, long start, long n, sample_t *lut, sample_t *out) nogil:
+    """
+    Decodes n points of the selected column, starting at point start, from the packed words in raw. Each 12 bit
+    ADC code is scaled by looking it up in lut.
+
+    Columns 0 and 1 (Master FPGA) have one point in each 32 bit word. Columns 2, 3 and 4 (Slave FPGA) have three
+    points in each pair of 64 bit words.
+    """
+    cdef np.uint32_t *words = <np.uint32_t *> raw
+    cdef np.uint64_t *words64 = <np.uint64_t *> raw
+    cdef int shift = 12 if column_select == 1 else 0
+    cdef long chunk = start / 3
+    cdef long point = start - chunk * 3
+    cdef np.uint64_t compressed
+    cdef np.uint64_t msb = 0
+    cdef long i = 0
+    if column_select in (0, 1):
+        for i in range(n):
+            out[i] = lut[(words[start + i] >> shift) & 0xfff]
+        return
+    while i < n:
+        if column_select == 2:
+            compressed = words64[2 * chunk] & 0xfffffffffULL
+        elif column_select == 3:
+            compressed = words64[2 * chunk] >> 36
+            msb = words64[2 * chunk + 1] & 0xff
+        else:
+            compressed = (words64[2 * chunk + 1] >> 8) & 0xfffffffffULL
+        while point < 3 and i < n:
+            if column_select == 3 and point == 2:
+                # The top 8 bits of the last point are in the second word.
+                out[i] = lut[((compressed >> 24) & 0xf) + msb * 16]
+            else:
+                out[i] = lut[(compressed >> (12 * point)) & 0xfff]
+            i += 1
+            point += 1
+        chunk += 1
+        point = 0
+
 
 cdef class CNP2Reader(AbstractReader):
+    """
+    Reader for CNP2 ".hex" files with the associated ".cfg" file. All of the Master (columnSelect 0 and 1) and\
+    Slave (columnSelect 2, 3 and 4) FPGA layouts are supported.
+
+    The ".hex" file is memory mapped, and the points are decoded in one pass from the packed words through a lookup\
+    table of the scaled value of each of the 4096 ADC codes.
+    """
 
     cpdef _prepare_file(self, filename):
         self.block_size = 6000
@@ -35,53 +93,53 @@ cdef class CNP2Reader(AbstractReader):
 
         self.AAFILTERGAIN = (51+620)/620.0*1.8*.51
 
-        self.datafile = open(filename, 'rb')
-
         self.sample_rate = SAMPLE_RATE
 
-        cdef int filesize = os.path.getsize(filename)
-
         if self.column_select in [0, 1]:
             self.raw_dtype = np.dtype('uint32')
             self.points_per_chunk = 1
-            self.points_per_channel_total = filesize / 4 # 4 byte chunks
+            self.bytes_per_chunk = 4
         elif self.column_select in [2, 3, 4]:
             self.raw_dtype = np.dtype('uint64')
             self.points_per_chunk = 3
-            self.points_per_channel_total = filesize / 16 # 16 byte chunks
-
+            self.bytes_per_chunk = 16
+        else:
+            raise ValueError("columnSelect must be 0, 1, 2, 3 or 4, not {0}.".format(self.column_select))
 
-    cdef void close_c(self):
-        self.datafile.close()
+        self.lut = self._scale_adc_data(np.arange(2 ** self.ADCBITS))
+        self.position = 0
+        self._map_file()
 
-    cdef np.ndarray _unpack_raw(self, np.ndarray raw):
-        cdef np.ndarray ADCData
-        cdef np.ndarray ADCDataCompressed
-        # Implement the Master FPGAType
-        if self.column_select == 0:
-            ADCData = np.bitwise_and(raw, 0xfff)
-        elif self.column_select == 1:
-            ADCData = np.bitwise_and(raw, 0xfff000) >> 12
-        elif self.column_select == 2: # TODO implement Slave FPGAType
-            ADCDataCompressed = np.bitwise_and(raw[0::2], 0xfffffffff)
-            ADCData = np.zeros((3*np.size(ADCDataCompressed),))
-            ADCData[0::3] = np.bitwise_and(ADCDataCompressed, 0xfff)
-            ADCData[1::3] = np.bitwise_and(ADCDataCompressed, 0xfff000) >> 12
-            ADCData[2::3] = np.bitwise_and(ADCDataCompressed, 0xfff000000) >> 24
+    cdef void _map_file(self) except *:
+        """
+        Memory maps the whole chunks in the file and sets points_per_channel_total.
+        """
+        # Only map whole chunks, in case the file is still being written.
+        cdef long n_chunks = os.path.getsize(self.filename) / self.bytes_per_chunk
+        self.points_per_channel_total = n_chunks * self.points_per_chunk
+        if n_chunks > 0:
+            self.raw_data = np.memmap(self.filename, dtype=self.raw_dtype, mode='r',
+                                      shape=(n_chunks * self.bytes_per_chunk / self.raw_dtype.itemsize,))
+        else:
+            # Empty files cannot be mapped.
+            self.raw_data = np.empty(0, dtype=self.raw_dtype)
 
+    cdef void close_c(self):
+        # The map is closed once the last array viewing it is gone.
+        self.raw_data = None
 
-        return ADCData
+    cdef void seek_c(self, long sample) except *:
+        self.position = sample
 
+    cdef long refresh_c(self) except -1:
+        self._map_file()
+        return self.points_per_channel_total
 
-    cdef np.ndarray _get_next_n_values(self, long n):
+    cdef np.ndarray _scale_adc_data(self, np.ndarray adc_data):
         """
-        Returns the next n values in the file.
+        Returns the ADC codes scaled to nA.
         """
-        cdef np.ndarray raw_values = np.fromfile(self.datafile, self.raw_dtype, n)
-
-        cdef np.ndarray adc_data = self._unpack_raw(raw_values)
-
-        cdef np.ndarray fnal = 1.0*adc_data
+        cdef np.ndarray fnal = adc_data.astype(self.dtype)
 
         # Scale the data correctly
         fnal[fnal >= 2**(self.ADCBITS-1)] -= 2**(self.ADCBITS)
@@ -93,46 +151,71 @@ cdef class CNP2Reader(AbstractReader):
 
         return fnal
 
+    cdef np.ndarray _decode(self, long start, long n, np.ndarray out):
+        """
+        Decodes n points starting at point start into out, or into a new array if out is None.
+        """
+        if self.raw_data is None:
+            raise ValueError("I/O operation on closed file.")
+        if out is None:
+            out = np.empty(n, dtype=self.dtype)
+        cdef np.ndarray raw = self.raw_data
+        cdef np.ndarray lut = self.lut
+        cdef int column_select = self.column_select
+        if n > 0:
+            if self.dtype == np.float32:
+                with nogil:
+                    _decode_c(raw.data, column_select, start, n, <np.float32_t *> lut.data, <np.float32_t *> out.data)
+            else:
+                with nogil:
+                    _decode_c(raw.data, column_select, start, n, <np.float64_t *> lut.data, <np.float64_t *> out.data)
+        return out
+
+    cdef object read_range_c(self, long start, long n, object out):
+        return [self._decode(start, n, None if out is None else out[0][:n])]
+
     cdef object get_next_blocks_c(self, long n_blocks=1):
         """
         Get the next n blocks of data.
 
         :param int n_blocks: Number of blocks to grab.
-        :returns: List of numpy arrays, one for each channel. Chimera data only has one channel,\
+        :returns: List of numpy arrays, one for each channel. CNP2 data only has one channel,\
             so this returns [np array].
         """
-        cdef np.ndarray adc_data = self._get_next_n_values(n_blocks * self.block_size)
-
+        cdef long n = max(min(n_blocks * self.block_size, self.points_per_channel_total - self.position), 0)
+        cdef np.ndarray adc_data = self._decode(self.position, n, None)
+        self.position += n
         return [adc_data]
 
     cdef object get_all_data_c(self, bool decimate=False):
-
-        # Go to the beginning of the file
-        self.datafile.seek(0)
-
-        cdef np.ndarray adc_data
+        self.position = self.points_per_channel_total
+        if not decimate:
+            return [self._decode(0, self.points_per_channel_total, None)]
+
+        # use 5000 for plot decimation
+        cdef long decimated_size = 2 * int(self.points_per_channel_total / self.block_size)
+        # will there be a block at the end with < block_size datapoints?
+        if self.points_per_channel_total % self.block_size > 0:
+            decimated_size += 2
+        cdef np.ndarray adc_data = np.zeros(decimated_size, dtype=self.dtype)
+        cdef np.ndarray buf = np.empty(BLOCKS_PER_DECODE * self.block_size, dtype=self.dtype)
         cdef np.ndarray values
-
-        cdef long decimated_size
-
-        cdef i
-
-        if decimate:
-            # use 5000 for plot decimation
-            decimated_size = 2 * int(self.points_per_channel_total / self.block_size)
-            # will there be a block at the end with < block_size datapoints?
-            if self.points_per_channel_total % self.block_size > 0:
-                decimated_size += 2
-            adc_data = np.zeros(decimated_size)
-            i = 0
-            while True:
-                values = self._get_next_n_values(self.block_size)
-                if values.size < 1:
-                    break
-                adc_data[i] = np.max(values)
-                adc_data[i + 1] = np.min(values)
-                i += 2
-        else:
-            adc_data = self._get_next_n_values(self.points_per_channel_total)
+        cdef long start
+        cdef long n
+        cdef long first_block
+        cdef long n_full
+        for start in range(0, self.points_per_channel_total, BLOCKS_PER_DECODE * self.block_size):
+            n = min(BLOCKS_PER_DECODE * self.block_size, self.points_per_channel_total - start)
+            values = self._decode(start, n, buf[:n])
+            first_block = start / self.block_size
+            n_full = n / self.block_size
+            if n_full > 0:
+                values = values[:n_full * self.block_size].reshape(n_full, self.block_size)
+                adc_data[2 * first_block:2 * (first_block + n_full):2] = values.max(axis=1)
+                adc_data[2 * first_block + 1:2 * (first_block + n_full):2] = values.min(axis=1)
+            if n > n_full * self.block_size:
+                values = buf[n_full * self.block_size:n]
+                adc_data[2 * (first_block + n_full)] = values.max()
+                adc_data[2 * (first_block + n_full) + 1] = values.min()
 
         return [adc_data]
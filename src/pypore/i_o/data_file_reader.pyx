@@ -1,6 +1,8 @@
 # TODO finish implementing this file
 from cpython cimport bool
 
+import threading
+
 import numpy as np
 cimport numpy as np
 
@@ -8,12 +10,13 @@ import pypore.filetypes.data_file as df
 
 from pypore.i_o.abstract_reader cimport AbstractReader
 
-DTYPE = np.float
 ctypedef np.float_t DTYPE_t
 
 cdef class DataFileReader(AbstractReader):
     cdef long next_to_send
     cdef object datafile
+    # HDF5 reads are not thread-safe, so reads from different threads take turns.
+    cdef object read_lock
 
     cpdef _prepare_file(self, filename):
         """
@@ -27,14 +30,28 @@ cdef class DataFileReader(AbstractReader):
         self.points_per_channel_total = self.datafile.get_data_length()
 
         self.next_to_send = 0
+        self.read_lock = threading.Lock()
 
     cdef object get_next_blocks_c(self, long n_blocks=1):
 
         self.next_to_send += self.block_size
-        if self.next_to_send > self.points_per_channel_total:
-            return [self.datafile.root.data[self.next_to_send - self.block_size:].astype(DTYPE)]
-        else:
-            return [self.datafile.root.data[self.next_to_send - self.block_size : self.next_to_send].astype(DTYPE)]
+        with self.read_lock:
+            if self.next_to_send > self.points_per_channel_total:
+                return [self.datafile.root.data[self.next_to_send - self.block_size:].astype(self.dtype)]
+            else:
+                return [self.datafile.root.data[self.next_to_send - self.block_size : self.next_to_send].astype(
+                    self.dtype)]
+
+    cdef object read_range_c(self, long start, long n, object out):
+        with self.read_lock:
+            data = self.datafile.root.data[start:start + n]
+        if out is None:
+            return [data.astype(self.dtype)]
+        out[0][:n] = data
+        return [out[0][:n]]
+
+    cdef void seek_c(self, long sample) except *:
+        self.next_to_send = sample
 
     cdef object get_all_data_c(self, bool decimate=False):
 
@@ -45,7 +62,7 @@ cdef class DataFileReader(AbstractReader):
             decimated_size = 2 * int(self.points_per_channel_total / self.block_size)
             if self.points_per_channel_total % self.block_size > 0:
                 decimated_size += 2
-            log_data = np.empty(decimated_size)
+            log_data = np.empty(decimated_size, dtype=self.dtype)
             # loop through each block and get its max an min value
             i = 0
             while True:
@@ -61,7 +78,7 @@ cdef class DataFileReader(AbstractReader):
                 self.next_to_send += self.block_size
 
             return [log_data]
-        return [self.datafile.root.data[:].astype(DTYPE)]
+        return [self.datafile.root.data[:].astype(self.dtype)]
 
     cdef void close_c(self):
         self.datafile.close()
@@ -0,0 +1,221 @@
+"""
+Multi-resolution min/max envelope of the data in a file, for displaying long traces at any zoom without reading
+all of the data again.
+
+Level 0 of the pyramid has the min and max of every :py:data:`BASE_BIN_SIZE` samples, and each level above it
+combines :py:data:`LEVEL_FACTOR` bins of the level below. The pyramid is saved next to the data file, in
+filename + :py:data:`ENVELOPE_EXTENSION`, and is built again when the size or modification time of the data file
+no longer match it.
+
+Usually used through :py:func:`get_envelope <pypore.i_o.abstract_reader.AbstractReader.get_envelope>`.
+"""
+import os
+
+import numpy as np
+import tables as tb
+
+#: Samples in each bin of the finest level of the pyramid.
+BASE_BIN_SIZE = 4096
+#: Bins of a level combined into each bin of the next level.
+LEVEL_FACTOR = 4
+#: Samples per channel read at a time while building the pyramid.
+BUILD_CHUNK_SIZE = BASE_BIN_SIZE * 1024
+#: Appended to the data file's name to get the name of the file the pyramid is saved in.
+ENVELOPE_EXTENSION = '.envelope.h5'
+
+
+def _reduce_bins(values, bin_size, ufunc):
+    """
+    Reduces every bin_size values with ufunc, along the last axis. A last, partial bin is reduced too.
+    """
+    n_full = values.shape[-1] // bin_size
+    reduced = ufunc.reduce(values[..., :n_full * bin_size].reshape(values.shape[:-1] + (n_full, bin_size)), axis=-1)
+    if n_full * bin_size < values.shape[-1]:
+        reduced = np.concatenate((reduced, ufunc.reduce(values[..., n_full * bin_size:], axis=-1)[..., np.newaxis]),
+                                 axis=-1)
+    return reduced
+
+
+def _get_source_signature(filename):
+    """
+    :returns: The size and modification time of filename, which a saved pyramid must match.
+    """
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime
+
+
+class Envelope(object):
+    """
+    Min/max pyramid of the data of a reader. Open one with :py:func:`open_envelope`.
+    """
+
+    def __init__(self, mins, maxs, n_points, envelope_file=None):
+        """
+        :param mins: List of the levels' minima, finest first, each indexable as [channel, bin]. There is always\
+                at least one level.
+        :param maxs: List of the levels' maxima, like mins.
+        :param IntType n_points: Number of points per channel in the data.
+        :param envelope_file: Open PyTables file the levels are read from, if any, closed by :py:func:`close`.
+        """
+        self.mins = mins
+        self.maxs = maxs
+        self.n_points = n_points
+        self.envelope_file = envelope_file
+
+    def close(self):
+        """
+        Closes the file the pyramid is read from, if any.
+        """
+        if self.envelope_file is not None:
+            self.envelope_file.close()
+            self.envelope_file = None
+
+    def get_envelope(self, reader, start, stop, n_bins):
+        """
+        Returns the max and min of each of n_bins equal bins between start and stop. Each bin is widened out to the
+        bins of the coarsest level that has at least one bin per output bin, so it covers all of its samples and
+        perhaps a few more. Output bins smaller than :py:data:`BASE_BIN_SIZE` are computed exactly from the data,
+        read with reader.
+
+        :param reader: :py:class:`AbstractReader <pypore.i_o.abstract_reader.AbstractReader>` of the data.
+        :returns: List of numpy arrays, one for each channel, with the max and min of each bin one after the other,\
+                like :py:func:`get_all_data <pypore.i_o.abstract_reader.AbstractReader.get_all_data>` with\
+                decimate=True.
+        """
+        n_bins = min(n_bins, stop - start)
+        if n_bins < 1:
+            return [np.empty(0, dtype=reader.get_dtype()) for _ in xrange(len(self.mins[0]))]
+        # First sample of each output bin.
+        edges = start + (stop - start) * np.arange(n_bins, dtype=np.int64) // n_bins
+
+        level = -1
+        level_bin_size = BASE_BIN_SIZE
+        while level + 1 < len(self.mins) and level_bin_size <= (stop - start) // n_bins:
+            level += 1
+            level_bin_size *= LEVEL_FACTOR
+        level_bin_size //= LEVEL_FACTOR
+
+        if level < 0:
+            channels = reader.read_range(start, stop - start)
+            indices = edges - start
+            mins = [np.minimum.reduceat(channel, indices) for channel in channels]
+            maxs = [np.maximum.reduceat(channel, indices) for channel in channels]
+        else:
+            first_bin = edges[0] // level_bin_size
+            end_bin = -(-stop // level_bin_size)
+            indices = edges // level_bin_size - first_bin
+            # Output bins ending partway through a level bin also take that level bin, so they cover all of their
+            # samples.
+            straddled = indices[1:][edges[1:] % level_bin_size != 0]
+            partial = np.nonzero(edges[1:] % level_bin_size != 0)[0]
+            mins = []
+            maxs = []
+            for i in xrange(len(self.mins[level])):
+                level_mins = self.mins[level][i, first_bin:end_bin]
+                level_maxs = self.maxs[level][i, first_bin:end_bin]
+                channel_mins = np.minimum.reduceat(level_mins, indices)
+                channel_maxs = np.maximum.reduceat(level_maxs, indices)
+                channel_mins[partial] = np.minimum(channel_mins[partial], level_mins[straddled])
+                channel_maxs[partial] = np.maximum(channel_maxs[partial], level_maxs[straddled])
+                mins.append(channel_mins)
+                maxs.append(channel_maxs)
+
+        envelopes = []
+        for channel_mins, channel_maxs in zip(mins, maxs):
+            envelope = np.empty(2 * n_bins, dtype=channel_mins.dtype)
+            envelope[0::2] = channel_maxs
+            envelope[1::2] = channel_mins
+            envelopes.append(envelope)
+        return envelopes
+
+
+def build_envelope(reader):
+    """
+    Builds the pyramid of all of the data of reader in memory, reading it in chunks with
+    :py:func:`read_range <pypore.i_o.abstract_reader.AbstractReader.read_range>`.
+
+    :returns: :py:class:`Envelope` of the data.
+    """
+    n_points = reader.get_points_per_channel_total()
+    n_base_bins = -(-n_points // BASE_BIN_SIZE)
+    n_channels = len(reader.read_range(0, 0))
+    mins = np.empty((n_channels, n_base_bins), dtype=reader.get_dtype())
+    maxs = np.empty((n_channels, n_base_bins), dtype=reader.get_dtype())
+    for start in xrange(0, n_points, BUILD_CHUNK_SIZE):
+        first_bin = start // BASE_BIN_SIZE
+        for i, channel in enumerate(reader.read_range(start, BUILD_CHUNK_SIZE)):
+            channel_mins = _reduce_bins(channel, BASE_BIN_SIZE, np.minimum)
+            mins[i, first_bin:first_bin + channel_mins.size] = channel_mins
+            maxs[i, first_bin:first_bin + channel_mins.size] = _reduce_bins(channel, BASE_BIN_SIZE, np.maximum)
+
+    level_mins = [mins]
+    level_maxs = [maxs]
+    while level_mins[-1].shape[1] > 1:
+        level_mins.append(_reduce_bins(level_mins[-1], LEVEL_FACTOR, np.minimum))
+        level_maxs.append(_reduce_bins(level_maxs[-1], LEVEL_FACTOR, np.maximum))
+    return Envelope(level_mins, level_maxs, n_points)
+
+
+def save_envelope(envelope, envelope_filename, source_filename):
+    """
+    Saves the pyramid to envelope_filename, recording the size and modification time of source_filename.
+    """
+    size, mtime = _get_source_signature(source_filename)
+    with tb.open_file(envelope_filename, mode='w') as envelope_file:
+        attrs = envelope_file.root._v_attrs
+        attrs.source_size = size
+        attrs.source_mtime = mtime
+        attrs.n_points = envelope.n_points
+        attrs.base_bin_size = BASE_BIN_SIZE
+        attrs.level_factor = LEVEL_FACTOR
+        attrs.n_levels = len(envelope.mins)
+        for level, (level_mins, level_maxs) in enumerate(zip(envelope.mins, envelope.maxs)):
+            envelope_file.create_array(envelope_file.root, 'min{0}'.format(level), level_mins)
+            envelope_file.create_array(envelope_file.root, 'max{0}'.format(level), level_maxs)
+
+
+def load_envelope(envelope_filename, source_filename, dtype):
+    """
+    Opens a saved pyramid. Its levels are read lazily from the file, as they are needed.
+
+    :returns: :py:class:`Envelope` of the data, or None if there is no saved pyramid for source_filename as it is\
+            now.
+    """
+    if not os.path.exists(envelope_filename):
+        return None
+    size, mtime = _get_source_signature(source_filename)
+    envelope_file = tb.open_file(envelope_filename, mode='r')
+    attrs = envelope_file.root._v_attrs
+    if attrs.source_size != size or attrs.source_mtime != mtime or attrs.base_bin_size != BASE_BIN_SIZE or \
+            attrs.level_factor != LEVEL_FACTOR or (attrs.n_levels > 0 and envelope_file.root.min0.dtype != dtype):
+        envelope_file.close()
+        return None
+    mins = [envelope_file.get_node(envelope_file.root, 'min{0}'.format(level)) for level in xrange(attrs.n_levels)]
+    maxs = [envelope_file.get_node(envelope_file.root, 'max{0}'.format(level)) for level in xrange(attrs.n_levels)]
+    return Envelope(mins, maxs, attrs.n_points, envelope_file)
+
+
+def open_envelope(reader, envelope_filename=None):
+    """
+    Opens the saved pyramid of reader's file, or builds and saves it if it is missing or out of date. If it can't
+    be saved, the built pyramid is only kept in memory.
+
+    :param reader: Open :py:class:`AbstractReader <pypore.i_o.abstract_reader.AbstractReader>` of the data.
+    :param StringType envelope_filename: File to save the pyramid in. Default is the reader's file name +\
+            :py:data:`ENVELOPE_EXTENSION`.
+    :returns: :py:class:`Envelope` of the data.
+    """
+    source_filename = reader.get_filename()
+    if envelope_filename is None:
+        envelope_filename = source_filename + ENVELOPE_EXTENSION
+    dtype = np.dtype(reader.get_dtype())
+    envelope = load_envelope(envelope_filename, source_filename, dtype)
+    if envelope is not None:
+        return envelope
+
+    envelope = build_envelope(reader)
+    try:
+        save_envelope(envelope, envelope_filename, source_filename)
+    except (IOError, OSError, tb.HDF5ExtError):
+        pass
+    return envelope
@@ -2,6 +2,7 @@ import scipy.io as sio
 import numpy as np
 
 cimport numpy as np
+cimport cython
 import os
 
 from cpython cimport bool
@@ -9,6 +10,14 @@ from pypore.i_o.abstract_reader cimport AbstractReader
 
 ctypedef np.float_t DTYPE_t
 
+ctypedef fused sample_t:
+    np.float32_t
+    np.float64_t
+
+ctypedef fused scale_t:
+    np.float32_t
+    np.float64_t
+
 # Data types list, in order specified by the HEKA file header v2.0.
 # Using big-endian.
 # Code 0=uint8,1=uint16,2=uint32,3=int8,4=int16,5=int32,
@@ -18,6 +27,9 @@ ENCODINGS = [np.dtype('>u1'), np.dtype('>u2'), np.dtype('>u4'),
              np.dtype('>f4'), np.dtype('>f8'), np.dtype('>S64'),
              np.dtype('>S512'), np.dtype('<u2')]
 
+# Blocks to decode at a time when decimating, to bound the memory used.
+DEF BLOCKS_PER_DECODE = 1024
+
 cdef long _get_param_list_byte_length(param_list):
     """
     Returns the length in bytes of the sum of all the parameters in the list.
@@ -28,6 +40,44 @@ cdef long _get_param_list_byte_length(param_list):
         size = size + i[1].itemsize
     return size
 
+cdef object _get_param_list_dtype(param_list):
+    """
+    Returns a structured dtype with a field for each parameter in the list, in order.
+    Here, list[i][0] = param, list[i][1] = np.dtype
+    """
+    return np.dtype([(str(name), datatype) for name, datatype in param_list])
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _decode_samples_c(unsigned char *blocks, long total_bytes_per_block, long data_offset, long block_size,
+                            scale_t *scales, long start, long n, sample_t *out) nogil:
+    """
+    Decodes and scales n big-endian int16 samples of one channel, starting at sample start, in one pass.
+
+    :param blocks: Start of the first block to decode from. start and scales are relative to it.
+    :param data_offset: Offset of the channel's samples from the start of each block.
+    :param scales: Scale of the channel in each block from blocks on, in the type numpy multiplies int16 samples\
+            by the file's scales in. Each product is computed in that type and then cast to the sample type, like\
+            multiplying by each block's scalar scale.
+    """
+    cdef long block = start / block_size
+    cdef long j = start - block * block_size
+    cdef unsigned char *data
+    cdef np.int16_t raw
+    cdef scale_t scale
+    cdef long i = 0
+    while i < n:
+        data = blocks + block * total_bytes_per_block + data_offset
+        scale = scales[block]
+        while j < block_size and i < n:
+            raw = <np.int16_t> ((data[2 * j] << 8) | data[2 * j + 1])
+            out[i] = <sample_t> (<scale_t> raw * scale)
+            i += 1
+            j += 1
+        block += 1
+        j = 0
+
 cdef class HekaReader(AbstractReader):
     # Note that these need to be public in order for the calling of
     # _prepare_file from AbstractReader to work.
@@ -55,6 +105,19 @@ cdef class HekaReader(AbstractReader):
     cdef long num_blocks_in_file
     cdef long remainder
 
+    # Next block to read, and points to drop from the start of it, after seeking into the middle of a block.
+    cdef long next_block
+    cdef long skip_points
+
+    # Structured dtype of a whole block, and a memory map of the blocks in the file with it.
+    cdef object block_dtype
+    cdef object blocks
+    # View of the scale of each channel in each block, read only for the blocks being decoded, the type the samples
+    # are multiplied by them in, and the offset of the samples in a block.
+    cdef object block_scales
+    cdef object scale_dtype
+    cdef long data_offset
+
     cpdef _prepare_file(self, filename):
         """
         Implementation of :py:func:`prepare_data_file` for Heka ".hkd" files.
@@ -107,37 +170,112 @@ cdef class HekaReader(AbstractReader):
 
         self.sample_rate = 1.0 / self.per_file_params['Sampling interval']
 
+        self.block_dtype = np.dtype([('block_params', _get_param_list_dtype(self.per_block_param_list)),
+                                     ('channel_params', _get_param_list_dtype(self.per_channel_param_list),
+                                      (self.channel_list_number,)),
+                                     ('data', np.dtype('>i2'), (self.channel_list_number, self.block_size))])
+        if self.num_blocks_in_file > 0:
+            self.blocks = np.memmap(filename, dtype=self.block_dtype, mode='r', offset=self.per_file_header_length,
+                                    shape=(self.num_blocks_in_file,))
+        else:
+            # Empty files cannot be mapped.
+            self.blocks = np.empty(0, dtype=self.block_dtype)
+        self.block_scales = np.asarray(self.blocks['channel_params']['Scale'])
+        # numpy's type for int16 samples times the scales, at least float32.
+        self.scale_dtype = np.result_type(np.int16, self.block_scales.dtype, np.float32)
+        self.data_offset = self.block_dtype.fields['data'][1]
+        # Everything after the headers is read through the memory map.
+        self.heka_file.close()
+
     cdef void close_c(self):
         self.heka_file.close()
+        self.blocks = None
 
-    cdef get_all_data_c(self, bool decimate=False):
-        """
-        Reads files created by the Heka acquisition software and returns the data.
+    cdef void seek_c(self, long sample) except *:
+        self.next_block = sample / self.block_size
+        self.skip_points = sample % self.block_size
 
-        :returns: List of numpy arrays, one for each channel of data.
+    cdef object _read_samples(self, long start, long n, object out):
         """
-        # return to the start of the file
-        self.heka_file.seek(self.per_file_header_length)
+        Decodes n samples per channel, starting at sample start, from the memory map.
 
+        :param out: List of arrays to decode into, one for each channel, or None to allocate them.
+        :returns: List of numpy arrays, one for each channel.
+        """
+        if self.blocks is None:
+            raise ValueError("I/O operation on closed file.")
+        cdef np.ndarray blocks = self.blocks
+        cdef np.ndarray scales
+        cdef np.ndarray values
+        cdef long data_offset
+        cdef long first_block = 0
+        cdef long end_block = 0
+        cdef unsigned char *first_block_data = NULL
+        if n > 0:
+            # Only the scales of the blocks in the range are read, so opening or reading part of a large file doesn't
+            # fault in the header of every block.
+            first_block = start / self.block_size
+            end_block = (start + n + self.block_size - 1) / self.block_size
+            first_block_data = <unsigned char *> blocks.data + first_block * self.total_bytes_per_block
+            start -= first_block * self.block_size
         data = []
-        for _ in self.channel_list:
-            if decimate:  # If decimating, just keep max and min value from each block
-                data.append(np.empty(self.num_blocks_in_file * 2))
-            else:
-                data.append(np.empty(self.points_per_channel_total))  # initialize_c array
-
-        for i in xrange(0, self.num_blocks_in_file):
-            block = self._read_heka_next_block()
-            for j in xrange(len(block)):
-                if decimate:  # if decimating data, only keep max and min of each block
-                    data[j][2 * i] = np.max(block[j])
-                    data[j][2 * i + 1] = np.min(block[j])
+        for i in xrange(self.channel_list_number):
+            values = np.empty(n, dtype=self.dtype) if out is None else out[i][:n]
+            data_offset = self.data_offset + i * self.block_size * 2
+            if n > 0:
+                scales = np.ascontiguousarray(self.block_scales[first_block:end_block, i], dtype=self.scale_dtype)
+                if self.scale_dtype == np.float32 and self.dtype == np.float32:
+                    with nogil:
+                        _decode_samples_c(first_block_data, self.total_bytes_per_block, data_offset,
+                                          self.block_size, <np.float32_t *> scales.data, start, n,
+                                          <np.float32_t *> values.data)
+                elif self.scale_dtype == np.float32:
+                    with nogil:
+                        _decode_samples_c(first_block_data, self.total_bytes_per_block, data_offset,
+                                          self.block_size, <np.float32_t *> scales.data, start, n,
+                                          <np.float64_t *> values.data)
+                elif self.dtype == np.float32:
+                    with nogil:
+                        _decode_samples_c(first_block_data, self.total_bytes_per_block, data_offset,
+                                          self.block_size, <np.float64_t *> scales.data, start, n,
+                                          <np.float32_t *> values.data)
                 else:
-                    data[j][i * self.block_size:(i + 1) * self.block_size] = block[
-                        j]
+                    with nogil:
+                        _decode_samples_c(first_block_data, self.total_bytes_per_block, data_offset,
+                                          self.block_size, <np.float64_t *> scales.data, start, n,
+                                          <np.float64_t *> values.data)
+            data.append(values)
+        return data
+
+    cdef object read_range_c(self, long start, long n, object out):
+        return self._read_samples(start, n, out)
 
-        # if decimate:
-        #     self.decimate_sample_rate = self.sample_rate * 2 / self.points_per_channel_per_block  # we are downsampling
+    cdef get_all_data_c(self, bool decimate=False):
+        """
+        Reads files created by the Heka acquisition software and returns the data.
+
+        :returns: List of numpy arrays, one for each channel of data.
+        """
+        # Leave the position at the end of the file, as if all of the blocks had been read.
+        self.next_block = self.num_blocks_in_file
+        self.skip_points = 0
+
+        if not decimate:
+            return self._read_samples(0, self.points_per_channel_total, None)
+
+        # If decimating, just keep max and min value from each block
+        data = [np.empty(self.num_blocks_in_file * 2, dtype=self.dtype) for _ in self.channel_list]
+        buffers = [np.empty(BLOCKS_PER_DECODE * self.block_size, dtype=self.dtype) for _ in self.channel_list]
+        cdef long first_block
+        cdef long end_block
+        cdef np.ndarray values
+        for first_block in range(0, self.num_blocks_in_file, BLOCKS_PER_DECODE):
+            end_block = min(first_block + BLOCKS_PER_DECODE, self.num_blocks_in_file)
+            for j, channel in enumerate(self._read_samples(first_block * self.block_size,
+                                                           (end_block - first_block) * self.block_size, buffers)):
+                values = channel.reshape(end_block - first_block, self.block_size)
+                data[j][2 * first_block:2 * end_block:2] = values.max(axis=1)
+                data[j][2 * first_block + 1:2 * end_block:2] = values.min(axis=1)
 
         return data
 
@@ -145,23 +283,11 @@ cdef class HekaReader(AbstractReader):
         """
         Returns a time series of the voltage
         """
-        # return to the start of the file
-        self.heka_file.seek(self.per_file_header_length)
-
-        data = []
-        for _ in self.channel_list:
-            data.append(np.empty(self.points_per_channel_total))  # initialize_c array
-
-        for i in xrange(0, self.num_blocks_in_file):
-            block = self._read_heka_next_block_voltages()
-            for j in xrange(len(block)):
-                data[j][i * self.block_size:(i + 1) * self.block_size] = block[
-                        j]
-
-        # if decimate:
-        #     self.decimate_sample_rate = self.sample_rate * 2 / self.points_per_channel_per_block  # we are downsampling
-
-        return data
+        if self.blocks is None:
+            raise ValueError("I/O operation on closed file.")
+        # Each block has one voltage per channel, repeated for all of its points.
+        return [np.repeat(self.blocks['channel_params']['Voltage'][:, i].astype(np.float64), self.block_size)
+                for i in xrange(self.channel_list_number)]
 
     cdef object get_next_blocks_c(self, long n_blocks=1):
         """
@@ -170,95 +296,11 @@ cdef class HekaReader(AbstractReader):
         :param int n_blocks: Number of blocks to grab.
         :returns: List of numpy arrays, one for each channel.
         """
-        blocks = []
-        cdef long totalsize = 0
-        cdef long size = 0
-        cdef bool done = False
-        for i in xrange(0, n_blocks):
-            block = self._read_heka_next_block()
-            if block[0].size == 0:
-                return block
-            blocks.append(block)
-            size = block[0].size
-            totalsize = totalsize + size
-            if size < self.block_size:  # did we reach the end?
-                break
-
-        # stitch the data together
-        data = []
-        index = []
-        for _ in xrange(0, len(self.channel_list)):
-            data.append(np.empty(totalsize))
-            index.append(0)
-        for block in blocks:
-            for i in xrange(0, len(self.channel_list)):
-                data[i][index[i]:index[i] + block[i].size] = block[i]
-                index[i] = index[i] + block[i].size
-
-        return data
-
-    cdef _read_heka_next_block_voltages(self):
-        """
-        Reads the next block of heka voltages.
-        Returns a dictionary with 'data', 'per_block_params', and 'per_channel_params'.
-        """  # Read block header
-        per_block_params = self._read_heka_header_params(self.per_block_param_list)
-        if per_block_params is None:
-            return [np.empty(0)]
-
-        # Read per channel header
-        per_channel_block_params = []
-        for _ in self.channel_list:  # underscore used for discarded parameters
-            channel_params = {}
-            # i[0] = name, i[1] = datatype
-            for i in self.per_channel_param_list:
-                channel_params[i[0]] = np.fromfile(self.heka_file, i[1], 1)[0]
-            per_channel_block_params.append(channel_params)
-
-        # Read data
-        data = []
-        dt = np.dtype('>i2')  # int16
-        cdef np.ndarray values
-        cdef np.ndarray tmp
-        for i in xrange(0, len(self.channel_list)):
-            values = 1.0 * np.ones(self.block_size) * per_channel_block_params[i]['Voltage']
-            # get rid of nan's
-            #         values[np.isnan(values)] = 0
-            tmp = np.fromfile(self.heka_file, dt, count=self.block_size)
-            data.append(values)
-
-        return data
-
-    cdef _read_heka_next_block(self):
-        """
-        Reads the next block of heka data.
-        Returns a dictionary with 'data', 'per_block_params', and 'per_channel_params'.
-        """  # Read block header
-        per_block_params = self._read_heka_header_params(self.per_block_param_list)
-        if per_block_params is None:
-            return [np.empty(0)]
-
-        # Read per channel header
-        per_channel_block_params = []
-        for _ in self.channel_list:  # underscore used for discarded parameters
-            channel_params = {}
-            # i[0] = name, i[1] = datatype
-            for i in self.per_channel_param_list:
-                channel_params[i[0]] = np.fromfile(self.heka_file, i[1], 1)[0]
-            per_channel_block_params.append(channel_params)
-
-        # Read data
-        data = []
-        dt = np.dtype('>i2')  # int16
-        cdef np.ndarray values
-        for i in xrange(0, len(self.channel_list)):
-            values = np.fromfile(self.heka_file, dt, count=self.block_size) * \
-                     per_channel_block_params[i][
-                         'Scale']
-            # get rid of nan's
-            #         values[np.isnan(values)] = 0
-            data.append(values)
-
+        cdef long end_block = max(min(self.next_block + n_blocks, self.num_blocks_in_file), self.next_block)
+        cdef long start = self.next_block * self.block_size + self.skip_points
+        data = self._read_samples(start, max(end_block * self.block_size - start, 0), None)
+        self.next_block = end_block
+        self.skip_points = 0
         return data
 
     cdef _read_heka_header_params(self, param_list):
@@ -0,0 +1,23 @@
+from abstract_reader cimport AbstractReader
+
+cdef class PrefetchReader(AbstractReader):
+
+    cdef public AbstractReader reader
+    cdef public long read_ahead
+    cdef public long batch_size
+
+    cdef bint owns_reader
+    cdef object queue
+    cdef object thread
+    cdef object stop_event
+    # The empty blocks returned once the wrapped reader has run out of data.
+    cdef object end_of_data
+    # Blocks of the last batch taken from the queue that haven't been returned yet.
+    cdef object pending
+    # Held by the background thread while it reads from the wrapped reader.
+    cdef object reader_lock
+
+    cpdef stop(self)
+    cdef void stop_c(self)
+
+    cdef void start_c(self)
@@ -0,0 +1,200 @@
+"""
+Reader that reads ahead on a background thread, so reading and decoding the data overlaps with processing it.
+"""
+from cpython cimport bool
+
+import collections
+import Queue
+import sys
+import threading
+
+import numpy as np
+cimport numpy as np
+
+from pypore.i_o.abstract_reader cimport AbstractReader
+
+# Seconds to wait for the background thread to finish, between emptying its queue, when stopping it.
+DEF STOP_JOIN_INTERVAL = 0.01
+
+
+def _prefetch_blocks(AbstractReader reader, long batch_size, queue, stop_event, reader_lock):
+    """
+    Target of the background thread of :py:class:`PrefetchReader`. Puts lists of batch_size blocks from reader on
+    queue until the data runs out or stop_event is set. The blocks are read one at a time, holding reader_lock, so
+    the consumer can split a list at the wrapped reader's own block boundaries. The list that reaches the end of
+    the data ends with the empty blocks. Exceptions are put on the queue as sys.exc_info(), to be raised by the
+    consumer.
+    """
+    cdef bint done = False
+    while not done and not stop_event.is_set():
+        batch = []
+        exc_info = None
+        try:
+            while len(batch) < batch_size:
+                with reader_lock:
+                    blocks = reader.get_next_blocks(1)
+                batch.append(blocks)
+                if blocks[0].size == 0:
+                    done = True
+                    break
+        except Exception:
+            exc_info = sys.exc_info()
+            done = True
+        # Blocks while the queue is full. Whoever sets stop_event empties the queue, so this returns.
+        if len(batch) > 0:
+            queue.put(batch)
+        if exc_info is not None:
+            queue.put(exc_info)
+
+
+cdef class PrefetchReader(AbstractReader):
+    """
+    Wraps another reader, reading its next blocks on a background thread into a bounded queue.
+
+    Disk reads and scaling of the data happen while the caller is busy with the previous blocks. This helps most
+    when reading is slow, for example from network storage.
+
+    >>> reader = PrefetchReader('data.log', read_ahead=8)
+    >>> blocks = reader.get_next_blocks()
+    >>> reader.close()
+    """
+
+    def __init__(self, reader, long read_ahead=4, long batch_size=1, dtype=np.float64):
+        """
+        :param reader: Either an open :py:class:`AbstractReader <pypore.i_o.abstract_reader.AbstractReader>` to\
+            wrap, or a file name to open one for. A reader passed in is only used by this PrefetchReader until\
+            :py:func:`stop` or :py:func:`close` is called.
+        :param IntType read_ahead: Number of batches to read ahead. Default is 4.
+        :param IntType batch_size: Number of blocks put on the queue at a time. Default is 1.
+        :param dtype: Floating point type of the samples, when opening a reader for a file name. A reader passed\
+            in keeps its own dtype. Default is numpy.float64.
+        """
+        if read_ahead < 1:
+            raise ValueError("read_ahead must be at least 1, not {0}.".format(read_ahead))
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1, not {0}.".format(batch_size))
+        self.owns_reader = not isinstance(reader, AbstractReader)
+        if self.owns_reader:
+            from pypore.i_o import get_reader_from_filename
+
+            reader = get_reader_from_filename(reader, dtype=dtype)
+        self.reader = reader
+        self.read_ahead = read_ahead
+        self.batch_size = batch_size
+
+        self.filename = self.reader.get_filename()
+        self.block_size = self.reader.get_block_size()
+        self.sample_rate = self.reader.get_sample_rate()
+        self.points_per_channel_total = self.reader.get_points_per_channel_total()
+        self.dtype = self.reader.get_dtype()
+
+        self.queue = None
+        self.thread = None
+        self.stop_event = None
+        self.end_of_data = None
+        self.pending = collections.deque()
+        self.reader_lock = threading.Lock()
+
+    cpdef _prepare_file(self, filename):
+        """
+        Not used, the wrapped reader prepares the file.
+        """
+        pass
+
+    cdef void start_c(self):
+        """
+        Starts the background thread reading from the wrapped reader's current position.
+        """
+        self.queue = Queue.Queue(maxsize=self.read_ahead)
+        self.stop_event = threading.Event()
+        self.end_of_data = None
+        self.pending.clear()
+        self.thread = threading.Thread(target=_prefetch_blocks,
+                                       args=(self.reader, self.batch_size, self.queue, self.stop_event,
+                                             self.reader_lock))
+        self.thread.daemon = True
+        self.thread.start()
+
+    cpdef stop(self):
+        """stop()
+
+        (Note this is a cpdef wrapper around the cdef method :py:func:`stop_c`.
+        If using Cython, you can directly call the cdef version.)
+
+        Stops the background thread, throwing away any blocks read ahead. The wrapped reader is left open, and
+        reading from this reader again restarts the thread.
+        """
+        self.stop_c()
+
+    cdef void stop_c(self):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        while self.thread.is_alive():
+            try:
+                while True:
+                    self.queue.get_nowait()
+            except Queue.Empty:
+                pass
+            self.thread.join(STOP_JOIN_INTERVAL)
+        self.thread = None
+        self.queue = None
+        self.end_of_data = None
+        self.pending.clear()
+
+    cdef void close_c(self):
+        self.stop_c()
+        if self.owns_reader:
+            self.reader.close()
+
+    cdef object get_next_blocks_c(self, long n_blocks=1):
+        """
+        Returns the next n_blocks blocks read by the background thread, joined together. Blocks left over from a
+        batch are returned by the next call.
+        """
+        if self.end_of_data is not None:
+            return self.end_of_data
+        if self.thread is None:
+            self.start_c()
+
+        blocks_list = []
+        while len(blocks_list) < n_blocks:
+            if len(self.pending) == 0:
+                batch = self.queue.get()
+                if isinstance(batch, tuple):
+                    self.stop_c()
+                    raise batch[0], batch[1], batch[2]
+                self.pending.extend(batch)
+            blocks = self.pending.popleft()
+            if blocks[0].size == 0:
+                self.end_of_data = blocks
+                break
+            blocks_list.append(blocks)
+
+        if len(blocks_list) == 0:
+            return self.end_of_data
+        if len(blocks_list) == 1:
+            return blocks_list[0]
+        return [np.concatenate([blocks[i] for blocks in blocks_list]) for i in xrange(len(blocks_list[0]))]
+
+    cdef void seek_c(self, long sample) except *:
+        self.stop_c()
+        self.reader.seek(sample)
+
+    cdef object read_range_c(self, long start, long n, object out):
+        # Range reads don't move the wrapped reader, so they don't disturb the background thread.
+        return self.reader.read_range(start, n, out)
+
+    cdef long refresh_c(self) except -1:
+        if self.end_of_data is not None:
+            # Everything read ahead has been used, start reading again from the end of it.
+            self.stop_c()
+        # A running background thread only uses the wrapped reader while holding the lock, and carries on into the
+        # new data. If it already reached the old end, the next refresh after that restarts it.
+        with self.reader_lock:
+            self.points_per_channel_total = self.reader.refresh()
+        return self.points_per_channel_total
+
+    cdef object get_all_data_c(self, bool decimate=False):
+        self.stop_c()
+        return self.reader.get_all_data(decimate)
@@ -1,5 +1,10 @@
+import os
+import threading
+
 import numpy as np
 
+from pypore.i_o.envelope import ENVELOPE_EXTENSION
+
 
 class ReaderTests(object):
     """
@@ -193,3 +198,233 @@ class ReaderTests(object):
                              "Decimate length incorrect. Should be {0}. Was {1}.".format(decimated_length_should_be,
                                                                                          decimated_length))
             reader.close()
+
+    def help_seek(self):
+        """
+        Helper for :py:func:`test_seek`.
+
+        If the subclass does **not** set self.default_test_data_files to a list of test files, then
+        this method should be overridden.
+
+        :returns: list of file names for testing seek.
+        """
+        if self.default_test_data_files is not None:
+            return self.default_test_data_files
+        else:
+            raise NotImplementedError('Inheritors should override this method or set self.default_test_data_files'
+                                      ' to a list of test data files.')
+
+    def test_seek(self):
+        """
+        Tests that after :py:func:`seek <pypore.i_o.abstract_reader.AbstractReader.seek>`,
+        :py:func:`get_next_blocks <pypore.i_o.abstract_reader.AbstractReader.get_next_blocks>` returns the data
+        starting at that sample.
+        """
+        file_names = self.help_seek()
+
+        for filename in file_names:
+            reader = self.reader_class(filename)
+
+            all_data = reader.get_all_data()[0]
+            block_size = reader.get_block_size()
+
+            for sample in [0, 1, block_size - 1, block_size, block_size + 3, all_data.size // 2, all_data.size - 1]:
+                if sample < 0 or sample >= all_data.size:
+                    continue
+                reader.seek(sample)
+                data = reader.get_next_blocks()[0]
+                self.assertGreater(data.size, 0, "No data after seeking to {0} in '{1}'.".format(sample, filename))
+                np.testing.assert_array_equal(data, all_data[sample:sample + data.size],
+                                              "Wrong data after seeking to {0} in '{1}'.".format(sample, filename))
+
+            reader.close()
+
+    def help_read_range(self):
+        """
+        Helper for :py:func:`test_read_range` and :py:func:`test_read_range_threads`.
+
+        If the subclass does **not** set self.default_test_data_files to a list of test files, then
+        this method should be overridden.
+
+        :returns: list of file names for testing read_range.
+        """
+        if self.default_test_data_files is not None:
+            return self.default_test_data_files
+        else:
+            raise NotImplementedError('Inheritors should override this method or set self.default_test_data_files'
+                                      ' to a list of test data files.')
+
+    def test_read_range(self):
+        """
+        Tests that :py:func:`read_range <pypore.i_o.abstract_reader.AbstractReader.read_range>` returns the data
+        in the range, with or without out arrays, and leaves the position of
+        :py:func:`get_next_blocks <pypore.i_o.abstract_reader.AbstractReader.get_next_blocks>` alone.
+        """
+        file_names = self.help_read_range()
+
+        for filename in file_names:
+            reader = self.reader_class(filename)
+
+            all_data = reader.get_all_data()
+            size = all_data[0].size
+            block_size = reader.get_block_size()
+            reader.seek(0)
+            first_blocks = reader.get_next_blocks()
+            reader.seek(0)
+
+            for start, n in [(0, 10), (1, block_size), (block_size - 1, 2), (size // 3, block_size + 7),
+                             (size - 5, 100), (size, 10), (0, size)]:
+                if start < 0:
+                    continue
+                n_should_be = max(min(n, size - start), 0)
+                data = reader.read_range(start, n)
+                self.assertEqual(len(data), len(all_data))
+                for channel, channel_should_be in zip(data, all_data):
+                    self.assertEqual(channel.dtype, reader.get_dtype())
+                    np.testing.assert_array_equal(channel, channel_should_be[start:start + n_should_be],
+                                                  "Wrong data reading {0} from {1} of '{2}'.".format(n, start,
+                                                                                                     filename))
+
+                out = [np.zeros(n + 3, dtype=reader.get_dtype()) for _ in all_data]
+                data = reader.read_range(start, n, out)
+                for channel, out_channel, channel_should_be in zip(data, out, all_data):
+                    np.testing.assert_array_equal(out_channel[:n_should_be],
+                                                  channel_should_be[start:start + n_should_be])
+                    np.testing.assert_array_equal(channel, out_channel[:n_should_be])
+
+            for channel, channel_should_be in zip(reader.get_next_blocks(), first_blocks):
+                np.testing.assert_array_equal(channel, channel_should_be,
+                                              "read_range moved the position of get_next_blocks.")
+
+            self.assertRaises(ValueError, reader.read_range, -1, 10)
+            self.assertRaises(ValueError, reader.read_range, 0, -1)
+            self.assertRaises(ValueError, reader.read_range, 0, 10, [np.zeros(5, dtype=reader.get_dtype())
+                                                                     for _ in all_data])
+            self.assertRaises(ValueError, reader.read_range, 0, 10, [np.zeros(10, dtype=np.int32)
+                                                                     for _ in all_data])
+            reader.close()
+
+    def test_read_range_threads(self):
+        """
+        Tests that several threads can read ranges from one reader at the same time.
+        """
+        file_names = self.help_read_range()
+
+        for filename in file_names:
+            reader = self.reader_class(filename)
+            all_data = reader.get_all_data()
+            size = all_data[0].size
+            n = max(size // 7, 1)
+            starts = range(0, size, n)
+            results = {}
+
+            def read(start):
+                for _ in xrange(5):
+                    results[start] = reader.read_range(start, n)
+
+            threads = [threading.Thread(target=read, args=(start,)) for start in starts]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            for start in starts:
+                for channel, channel_should_be in zip(results[start], all_data):
+                    np.testing.assert_array_equal(channel, channel_should_be[start:start + n])
+            reader.close()
+
+    def help_get_envelope(self):
+        """
+        Helper for :py:func:`test_get_envelope`.
+
+        If the subclass does **not** set self.default_test_data_files to a list of test files, then
+        this method should be overridden.
+
+        :returns: list of file names for testing get_envelope.
+        """
+        if self.default_test_data_files is not None:
+            return self.default_test_data_files
+        else:
+            raise NotImplementedError('Inheritors should override this method or set self.default_test_data_files'
+                                      ' to a list of test data files.')
+
+    def test_get_envelope(self):
+        """
+        Tests that :py:func:`get_envelope <pypore.i_o.abstract_reader.AbstractReader.get_envelope>` bounds the
+        data in each bin and matches its overall max and min.
+        """
+        file_names = self.help_get_envelope()
+
+        for filename in file_names:
+            envelope_filename = filename + ENVELOPE_EXTENSION
+            if os.path.exists(envelope_filename):
+                os.remove(envelope_filename)
+            reader = self.reader_class(filename)
+            try:
+                all_data = reader.get_all_data()
+                size = all_data[0].size
+
+                for start, stop, n_bins in [(0, size, 1), (0, size, 7), (0, size, 100), (size // 3, size, 10),
+                                            (0, size, size), (0, size + 100, 2 * size), (size, size, 10)]:
+                    envelopes = reader.get_envelope(start, stop, n_bins)
+                    self.assertEqual(len(envelopes), len(all_data))
+                    stop = min(stop, size)
+                    n_bins_should_be = min(n_bins, stop - start)
+                    indices = (stop - start) * np.arange(n_bins_should_be) // max(n_bins_should_be, 1)
+                    for envelope, data in zip(envelopes, all_data):
+                        self.assertEqual(envelope.dtype, reader.get_dtype())
+                        self.assertEqual(envelope.size, 2 * n_bins_should_be)
+                        if n_bins_should_be > 0:
+                            self.assertTrue(np.all(envelope[0::2] >= np.maximum.reduceat(data[start:stop], indices)))
+                            self.assertTrue(np.all(envelope[1::2] <= np.minimum.reduceat(data[start:stop], indices)))
+                            self.assertEqual(envelope[0::2].max(), data[start:stop].max())
+                            self.assertEqual(envelope[1::2].min(), data[start:stop].min())
+
+                self.assertRaises(ValueError, reader.get_envelope, -1, size, 10)
+                self.assertRaises(ValueError, reader.get_envelope, 0, size, 0)
+            finally:
+                reader.close()
+                if os.path.exists(envelope_filename):
+                    os.remove(envelope_filename)
+
+    def help_dtype(self):
+        """
+        Helper for :py:func:`test_float32`.
+
+        If the subclass does **not** set self.default_test_data_files to a list of test files, then
+        this method should be overridden.
+
+        :returns: list of file names for testing the dtype option.
+        """
+        if self.default_test_data_files is not None:
+            return self.default_test_data_files
+        else:
+            raise NotImplementedError('Inheritors should override this method or set self.default_test_data_files'
+                                      ' to a list of test data files.')
+
+    def test_float32(self):
+        """
+        Tests that a reader opened with dtype=np.float32 returns float32 data, matching the float64 data to single
+        precision.
+        """
+        file_names = self.help_dtype()
+
+        for filename in file_names:
+            reader = self.reader_class(filename)
+            blocks_should_be = reader.get_next_blocks(2)[0]
+            all_data_should_be = reader.get_all_data()[0]
+            reader.close()
+
+            reader = self.reader_class(filename, dtype=np.float32)
+            self.assertEqual(reader.get_dtype(), np.float32)
+            blocks = reader.get_next_blocks(2)[0]
+            self.assertEqual(blocks.dtype, np.float32, "get_next_blocks returned {0} data from '{1}'.".format(
+                blocks.dtype, filename))
+            np.testing.assert_allclose(blocks, blocks_should_be, rtol=1.e-5, atol=1.e-6)
+            all_data = reader.get_all_data()[0]
+            self.assertEqual(all_data.dtype, np.float32)
+            np.testing.assert_allclose(all_data, all_data_should_be, rtol=1.e-5, atol=1.e-6)
+            self.assertEqual(reader.get_all_data(decimate=True)[0].dtype, np.float32)
+            reader.close()
+
+        self.assertRaises(ValueError, self.reader_class, file_names[0], dtype=np.int16)
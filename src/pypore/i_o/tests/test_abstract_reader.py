@@ -0,0 +1,25 @@
+import unittest
+
+from pypore.i_o.abstract_reader import AbstractReader
+
+
+class _UnimplementedReader(AbstractReader):
+    """
+    Reader that only prepares its file, leaving the rest of the methods unimplemented.
+    """
+
+    def _prepare_file(self, filename):
+        self.points_per_channel_total = 10
+
+
+class TestAbstractReader(unittest.TestCase):
+    def test_unimplemented_seek_raises(self):
+        """
+        Tests that an exception raised by seek_c reaches the caller instead of being ignored.
+        """
+        reader = _UnimplementedReader('unimplemented.log')
+        self.assertRaises(NotImplementedError, reader.seek, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
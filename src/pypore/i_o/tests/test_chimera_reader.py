@@ -1,8 +1,13 @@
 """
 @author: `@parkin`_
 """
+import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
+
 from pypore.i_o.chimera_reader import ChimeraReader
 from pypore.i_o.tests.reader_tests import ReaderTests
 import pypore.sampledata.testing_files as tf
@@ -30,6 +35,45 @@ class TestChimeraReader(unittest.TestCase, ReaderTests):
         self._test_small_chimera_file_help(data)
         chimera_reader.close()
 
+    def test_read_into(self):
+        """
+        Tests that read_into scales the samples from any start into a caller supplied buffer.
+        """
+        filename = tf.get_abs_path('spheres_20140114_154938_beginning.log')
+        for dtype in (np.float64, np.float32):
+            reader = ChimeraReader(filename, dtype=dtype)
+            all_data = reader.get_all_data()[0]
+
+            out = np.zeros(1000, dtype=dtype)
+            for start in (0, 1, all_data.size - 1000):
+                self.assertEqual(reader.read_into(start, out), out.size)
+                np.testing.assert_array_equal(out, all_data[start:start + out.size])
+
+            # Only the start of out is filled at the end of the file.
+            self.assertEqual(reader.read_into(all_data.size - 10, out), 10)
+            np.testing.assert_array_equal(out[:10], all_data[-10:])
+            self.assertEqual(reader.read_into(all_data.size, out), 0)
+
+            self.assertRaises(ValueError, reader.read_into, 0, np.zeros(10, dtype=np.int32))
+            self.assertRaises(ValueError, reader.read_into, 0, np.zeros((10, 2), dtype=dtype)[:, 0])
+            reader.close()
+
+    def test_refresh_missing_file(self):
+        """
+        Tests that refresh raises the error from mapping the file again, instead of keeping the old map.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'chimera_small.log')
+            shutil.copy(tf.get_abs_path('chimera_small.log'), filename)
+            shutil.copy(tf.get_abs_path('chimera_small.mat'), os.path.join(directory, 'chimera_small.mat'))
+            reader = ChimeraReader(filename)
+            os.remove(filename)
+            self.assertRaises(OSError, reader.refresh)
+            reader.close()
+        finally:
+            shutil.rmtree(directory)
+
     def _test_small_chimera_file_help(self, data_all):
         self.assertEqual(len(data_all), 1, 'Too many data channels returned.')
         data = data_all[0]
@@ -2,6 +2,9 @@ import unittest
 import numpy as np
 import os
 import csv
+import json
+import shutil
+import tempfile
 
 from pypore.i_o.cnp2_reader import CNP2Reader
 from pypore.i_o.tests.reader_tests import ReaderTests
@@ -36,6 +39,84 @@ class TestChimeraReader(unittest.TestCase, ReaderTests):
 
         cnp_reader.close()
 
+    def test_missing_hex_file(self):
+        """
+        Tests that opening or refreshing a ".hex" file that is missing raises the error from mapping it.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'cnp_test.hex')
+            shutil.copy(tf.get_abs_path('cnp_test.cfg'), os.path.join(directory, 'cnp_test.cfg'))
+            self.assertRaises(OSError, CNP2Reader, filename)
+
+            shutil.copy(tf.get_abs_path('cnp_test.hex'), filename)
+            reader = CNP2Reader(filename)
+            os.remove(filename)
+            self.assertRaises(OSError, reader.refresh)
+            reader.close()
+        finally:
+            shutil.rmtree(directory)
+
+    def test_column_select_layouts(self):
+        """
+        Tests that every Master and Slave FPGA layout is decoded like
+        :py:func:`ProcessRawDataWorker.unpackData <pypore.i_o.workerobjects.ProcessRawDataWorker.unpackData>`, and
+        scaled like the original reader.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            with open(tf.get_abs_path('cnp_test.cfg')) as config_file:
+                config = json.load(config_file)
+            raw = np.random.RandomState(0).randint(0, 2 ** 32, 600).astype(np.uint32)
+            raw64 = raw.view(np.uint64)
+            n_chunks = raw64.size // 2
+            for column_select in xrange(5):
+                if column_select == 0:
+                    adc_data = np.bitwise_and(raw, 0xfff)
+                elif column_select == 1:
+                    adc_data = np.bitwise_and(raw, 0xfff000) >> 12
+                else:
+                    adc_data = np.zeros(3 * n_chunks, dtype=np.uint64)
+                    if column_select == 2:
+                        compressed = np.bitwise_and(raw64[0::2], 0xfffffffff)
+                    elif column_select == 3:
+                        compressed = np.bitwise_and(raw64[0::2], 0xfffffff000000000) >> 36
+                    else:
+                        compressed = np.bitwise_and(raw64[1::2], 0x00000fffffffff00) >> 8
+                    adc_data[0::3] = np.bitwise_and(compressed, 0xfff)
+                    adc_data[1::3] = np.bitwise_and(compressed, 0xfff000) >> 12
+                    if column_select == 3:
+                        adc_data[2::3] = (np.bitwise_and(compressed, 0xf000000) >> 24) + \
+                                         np.bitwise_and(raw64[1::2], 0xff) * 16
+                    else:
+                        adc_data[2::3] = np.bitwise_and(compressed, 0xfff000000) >> 24
+                data_should_be = adc_data.astype(np.float64)
+                data_should_be[data_should_be >= 2 ** 11] -= 2 ** 12
+                data_should_be /= (2 ** 11 * config['RDCFB'] * ((51 + 620) / 620.0 * 1.8 * .51))
+                data_should_be -= config['IDCOffset']
+                data_should_be *= 1.e9
+
+                filename = os.path.join(directory, 'column{0}.hex'.format(column_select))
+                raw.tofile(filename)
+                config['columnSelect'] = column_select
+                with open(filename[:-4] + '.cfg', 'w') as config_file:
+                    json.dump(config, config_file)
+
+                reader = CNP2Reader(filename)
+                self.assertEqual(reader.get_points_per_channel_total(), data_should_be.size)
+                np.testing.assert_array_equal(reader.get_all_data()[0], data_should_be)
+                np.testing.assert_array_equal(reader.read_range(4, 101)[0], data_should_be[4:105])
+                reader.seek(5)
+                np.testing.assert_array_equal(reader.get_next_blocks()[0], data_should_be[5:])
+                reader.close()
+
+            config['columnSelect'] = 5
+            with open(filename[:-4] + '.cfg', 'w') as config_file:
+                json.dump(config, config_file)
+            self.assertRaises(ValueError, CNP2Reader, filename)
+        finally:
+            shutil.rmtree(directory)
+
     def _get_test_csv_data(self, csv_filename):
         data = []
         with open(csv_filename, 'rb') as csvfile:
@@ -0,0 +1,75 @@
+import os
+import unittest
+
+import numpy as np
+
+from pypore.i_o import envelope
+from pypore.i_o.chimera_reader import ChimeraReader
+import pypore.sampledata.testing_files as tf
+from pypore.tests.util import _test_file_manager
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestEnvelope(unittest.TestCase):
+    def setUp(self):
+        self.reader = ChimeraReader(tf.get_abs_path('spheres_20140114_154938_beginning.log'))
+        self.data = self.reader.get_all_data()[0]
+
+    def tearDown(self):
+        self.reader.close()
+
+    def test_build_envelope(self):
+        """
+        Tests that each level of the pyramid has the max and min of its bins, including a last partial bin.
+        """
+        pyramid = envelope.build_envelope(self.reader)
+        self.assertEqual(pyramid.n_points, self.data.size)
+        bin_size = envelope.BASE_BIN_SIZE
+        for level_mins, level_maxs in zip(pyramid.mins, pyramid.maxs):
+            n_bins = -(-self.data.size // bin_size)
+            self.assertEqual(level_mins.shape, (1, n_bins))
+            for i in xrange(n_bins):
+                self.assertEqual(level_mins[0, i], self.data[i * bin_size:(i + 1) * bin_size].min())
+                self.assertEqual(level_maxs[0, i], self.data[i * bin_size:(i + 1) * bin_size].max())
+            bin_size *= envelope.LEVEL_FACTOR
+        self.assertEqual(pyramid.mins[-1].shape, (1, 1))
+
+    def test_get_envelope_levels(self):
+        """
+        Tests that bins aligned with the pyramid's bins are exact, whichever level they come from.
+        """
+        pyramid = envelope.build_envelope(self.reader)
+        for bin_size in (envelope.BASE_BIN_SIZE, envelope.BASE_BIN_SIZE * envelope.LEVEL_FACTOR):
+            n_bins = self.data.size // bin_size
+            result = pyramid.get_envelope(self.reader, 0, n_bins * bin_size, n_bins)[0]
+            bins = self.data[:n_bins * bin_size].reshape(n_bins, bin_size)
+            np.testing.assert_array_equal(result[0::2], bins.max(axis=1))
+            np.testing.assert_array_equal(result[1::2], bins.min(axis=1))
+
+    @_test_file_manager(DIRECTORY)
+    def test_saved_envelope(self, filename):
+        """
+        Tests that the pyramid is saved, loaded back lazily with the same results, and not loaded for other data.
+        """
+        built = envelope.open_envelope(self.reader, filename)
+        self.assertTrue(os.path.exists(filename))
+        self.assertIsNone(built.envelope_file)
+
+        loaded = envelope.open_envelope(self.reader, filename)
+        try:
+            self.assertIsNotNone(loaded.envelope_file)
+            for start, stop, n_bins in [(0, self.data.size, 10), (1000, 90000, 3), (5, 300, 50)]:
+                np.testing.assert_array_equal(loaded.get_envelope(self.reader, start, stop, n_bins)[0],
+                                              built.get_envelope(self.reader, start, stop, n_bins)[0])
+
+            # A different size or dtype makes the saved pyramid out of date.
+            self.assertIsNone(envelope.load_envelope(filename, tf.get_abs_path('chimera_small.log'),
+                                                     np.dtype(np.float64)))
+            self.assertIsNone(envelope.load_envelope(filename, self.reader.get_filename(), np.dtype(np.float32)))
+        finally:
+            loaded.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,10 @@
+import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
+
 from pypore.i_o.heka_reader import HekaReader
 from pypore.i_o.tests.reader_tests import ReaderTests
 import pypore.sampledata.testing_files as tf
@@ -16,6 +21,80 @@ class TestHekaReader(unittest.TestCase, ReaderTests):
         std_dev = 2.76e-12
         return [filename], [mean], [std_dev]
 
+    def test_get_next_blocks_to_end(self):
+        """
+        Tests that reading several blocks at a time returns all of the data, including the blocks at the end of the
+        file that don't fill a whole read.
+        """
+        reader = HekaReader(tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd'))
+        all_data = reader.get_all_data()[0]
+        reader.seek(0)
+        blocks = []
+        while True:
+            block = reader.get_next_blocks(4)[0]
+            if block.size == 0:
+                break
+            blocks.append(block)
+        np.testing.assert_array_equal(np.concatenate(blocks), all_data)
+        reader.close()
+
+    def _write_heka_file(self, filename, raw, scales, scale_dtype):
+        """
+        Writes a one channel Heka file with a block of samples for each row of raw, scaled by the matching item of
+        scales, which are saved as scale_dtype.
+        """
+        def write_param_list(f, params, name_dtype):
+            # 3 null bytes, the number of params, then the type code and name of each.
+            f.write(b'\x00\x00\x00')
+            np.array([len(params)], dtype='>u1').tofile(f)
+            for name, type_code in params:
+                np.array([type_code], dtype='>u1').tofile(f)
+                np.array([name], dtype=name_dtype).tofile(f)
+
+        block_size = raw.shape[1]
+        type_codes = {'>u4': 2, '>f4': 6, '>f8': 7}
+        block_dtype = np.dtype([('block_params', [('Block number', '>u4')]),
+                                ('channel_params', [('Scale', scale_dtype), ('Voltage', '>f8')], (1,)),
+                                ('data', '>i2', (1, block_size))])
+        blocks = np.zeros(raw.shape[0], dtype=block_dtype)
+        blocks['block_params']['Block number'] = np.arange(raw.shape[0])
+        blocks['channel_params']['Scale'][:, 0] = scales
+        blocks['data'][:, 0] = raw
+        with open(filename, 'wb') as f:
+            f.write(b'Nanopore Experiment Data File V2.0\nEnd of file format\n')
+            write_param_list(f, [('Points per block', 2), ('Sampling interval', 7)], '>S64')
+            write_param_list(f, [('Block number', 2)], '>S64')
+            write_param_list(f, [('Scale', type_codes[scale_dtype]), ('Voltage', 7)], '>S64')
+            write_param_list(f, [('Current', 8)], '>S512')
+            np.array([block_size], dtype='>u4').tofile(f)
+            np.array([1e-5], dtype='>f8').tofile(f)
+            blocks.tofile(f)
+
+    def test_scale_types(self):
+        """
+        Tests that the samples are multiplied by the scales in the type numpy would multiply them in, float32 for
+        float32 scales, and only then cast to the reader's dtype.
+        """
+        random_state = np.random.RandomState(0)
+        raw = random_state.randint(-2 ** 15, 2 ** 15, (5, 100)).astype(np.int16)
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'scales.hkd')
+            for scale_dtype in ('>f4', '>f8'):
+                scales = (random_state.rand(5) * 1e-12).astype(scale_dtype)
+                self._write_heka_file(filename, raw, scales, scale_dtype)
+                products = np.concatenate([raw[block] * scales[block] for block in xrange(raw.shape[0])])
+                for dtype in (np.float32, np.float64):
+                    data_should_be = products.astype(dtype)
+                    reader = HekaReader(filename, dtype=dtype)
+                    np.testing.assert_array_equal(reader.get_all_data()[0], data_should_be)
+                    np.testing.assert_array_equal(reader.read_range(150, 220)[0], data_should_be[150:370])
+                    reader.seek(0)
+                    np.testing.assert_array_equal(reader.get_next_blocks(2)[0], data_should_be[:200])
+                    reader.close()
+        finally:
+            shutil.rmtree(directory)
+
     @unittest.skip("Test file is too short for decimated and un-decimated means to be equal enough.")
     def test_scaling_decimated(self):
         super(TestHekaReader, self).test_scaling_decimated()
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+import unittest
+
+import numpy as np
+
+from pypore.i_o import get_reader_from_filename
+from pypore.i_o.prefetch_reader import PrefetchReader
+from pypore.i_o.tests.reader_tests import ReaderTests
+import pypore.sampledata.testing_files as tf
+
+
+class TestPrefetchReader(unittest.TestCase, ReaderTests):
+    reader_class = PrefetchReader
+
+    default_test_data_files = [tf.get_abs_path('spheres_20140114_154938_beginning.log'),
+                               tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd'),
+                               tf.get_abs_path('cnp_test.hex')]
+
+    def help_scaling(self):
+        filename = tf.get_abs_path('spheres_20140114_154938_beginning.log')
+        mean_should_be = 7.57604  # Value gotten from original MATLAB script
+        std_should_be = 1.15445  # Value gotten from original MATLAB script
+        return [filename], [mean_should_be], [std_should_be]
+
+    def help_scaling_decimated(self):
+        filename = tf.get_abs_path('spheres_20140114_154938_beginning.log')
+        return [filename]
+
+    def _get_blocks_until_empty(self, reader, n_blocks=1):
+        blocks = []
+        while True:
+            block = reader.get_next_blocks(n_blocks)[0]
+            if block.size == 0:
+                return blocks
+            blocks.append(block)
+
+    def test_same_blocks_as_wrapped_reader(self):
+        """
+        Tests that the prefetched blocks are the same as reading the wrapped reader directly, for different batch
+        sizes.
+        """
+        for filename in self.default_test_data_files:
+            reader = get_reader_from_filename(filename)
+            blocks_should_be = self._get_blocks_until_empty(reader)
+            reader.close()
+
+            for read_ahead, batch_size in [(1, 1), (4, 1), (2, 3)]:
+                reader = PrefetchReader(filename, read_ahead=read_ahead, batch_size=batch_size)
+                blocks = self._get_blocks_until_empty(reader)
+                reader.close()
+                np.testing.assert_array_equal(np.concatenate(blocks), np.concatenate(blocks_should_be))
+                self.assertEqual(len(blocks), len(blocks_should_be))
+
+    def test_n_blocks(self):
+        """
+        Tests that asking for a number of blocks that isn't the batch size returns exactly that many blocks, the
+        same as the wrapped reader, splitting and joining batches, including after seeking into a block.
+        """
+        for filename in self.default_test_data_files:
+            reader = get_reader_from_filename(filename)
+            reader.seek(7)
+            blocks_should_be = [reader.get_next_blocks(n_blocks)[0] for n_blocks in (1, 5, 2, 1)]
+            reader.close()
+
+            reader = PrefetchReader(filename, batch_size=3)
+            reader.seek(7)
+            for n_blocks, block_should_be in zip((1, 5, 2, 1), blocks_should_be):
+                np.testing.assert_array_equal(reader.get_next_blocks(n_blocks)[0], block_should_be)
+            reader.close()
+
+    def test_error_traceback(self):
+        """
+        Tests that an error raised by the wrapped reader on the background thread is raised with its traceback.
+        """
+        reader = get_reader_from_filename(tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd'))
+        prefetch_reader = PrefetchReader(reader)
+        reader.close()
+        try:
+            prefetch_reader.get_next_blocks()
+            self.fail("Reading from a closed reader didn't raise.")
+        except ValueError:
+            # Cython qualifies the function names with their modules.
+            function_names = [entry[2] for entry in traceback.extract_tb(sys.exc_info()[2])]
+            self.assertTrue(any(name.endswith('_prefetch_blocks') for name in function_names), function_names)
+        prefetch_reader.close()
+
+    def test_refresh(self):
+        """
+        Tests that refresh sees data appended to the file while the background thread is still reading ahead, and
+        that the new data is read after the old.
+        """
+        filename = tf.get_abs_path('spheres_20140114_154938_beginning.log')
+        reader = get_reader_from_filename(filename)
+        data_should_be = reader.get_all_data()[0]
+        reader.close()
+
+        directory = tempfile.mkdtemp()
+        try:
+            follow_filename = os.path.join(directory, os.path.basename(filename))
+            shutil.copy(filename[:-len('log')] + 'mat', follow_filename[:-len('log')] + 'mat')
+            with open(filename, 'rb') as f:
+                raw = f.read()
+            half = len(raw) // 4 * 2
+            with open(follow_filename, 'wb') as f:
+                f.write(raw[:half])
+
+            reader = PrefetchReader(follow_filename, read_ahead=2, batch_size=2)
+            blocks = [reader.get_next_blocks()[0]]
+            with open(follow_filename, 'ab') as f:
+                f.write(raw[half:])
+            self.assertEqual(reader.refresh(), data_should_be.size)
+            blocks += self._get_blocks_until_empty(reader)
+            # The background thread may have reached the old end of the file before the refresh.
+            reader.refresh()
+            blocks += self._get_blocks_until_empty(reader)
+            reader.close()
+            np.testing.assert_array_equal(np.concatenate(blocks), data_should_be)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_wrapped_reader_left_open(self):
+        """
+        Tests that stopping a PrefetchReader wrapping an open reader leaves that reader usable.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        reader = get_reader_from_filename(filename)
+        prefetch_reader = PrefetchReader(reader)
+        prefetch_reader.get_next_blocks()
+        prefetch_reader.close()
+
+        reader.seek(0)
+        data = reader.get_next_blocks()[0]
+        self.assertGreater(data.size, 0)
+        reader.close()
+
+    def test_bad_arguments(self):
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        self.assertRaises(ValueError, PrefetchReader, filename, read_ahead=0)
+        self.assertRaises(ValueError, PrefetchReader, filename, batch_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
 
-from pypore.strategies.threshold_strategy cimport ThresholdStrategy
+cimport numpy as np
+from pypore.strategies.threshold_strategy cimport ThresholdStrategy, ThresholdKernel
+from pypore.strategies.threshold_strategy cimport THRESHOLD_KERNEL_ABSOLUTE_CHANGE
+from pypore.strategies.threshold_strategy cimport DTYPE_t
 
 cdef class AbsoluteChangeThresholdStrategy(ThresholdStrategy):
     cdef public double change_start
@@ -20,3 +23,29 @@ cdef class AbsoluteChangeThresholdStrategy(ThresholdStrategy):
         :returns: change_end from strategy initialization. 'baseline' and 'variance' parameters have no effect.
         """
         return self.change_end
+
+    cdef void compute_starting_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                                 np.ndarray[DTYPE_t] variances,
+                                                 np.ndarray[DTYPE_t] thresholds) except *:
+        if type(self) is not AbsoluteChangeThresholdStrategy:
+            # Subclasses may change the per-point methods, which this doesn't call.
+            ThresholdStrategy.compute_starting_threshold_block_c(self, baselines, variances, thresholds)
+            return
+        thresholds[:] = self.change_start
+
+    cdef void compute_ending_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                               np.ndarray[DTYPE_t] variances, np.ndarray[DTYPE_t] thresholds) except *:
+        if type(self) is not AbsoluteChangeThresholdStrategy:
+            # Subclasses may change the per-point methods, which this doesn't call.
+            ThresholdStrategy.compute_ending_threshold_block_c(self, baselines, variances, thresholds)
+            return
+        thresholds[:] = self.change_end
+
+    cdef bint get_kernel_c(self, ThresholdKernel *kernel):
+        if type(self) is not AbsoluteChangeThresholdStrategy:
+            # The kernel would ignore a subclass's per-point methods.
+            return False
+        kernel.kind = THRESHOLD_KERNEL_ABSOLUTE_CHANGE
+        kernel.start = self.change_start
+        kernel.end = self.change_end
+        return True
@@ -1,9 +1,11 @@
 import numpy as np
 
 cimport numpy as np
+cimport cython
 
 from libc.math cimport pow
-from pypore.strategies.baseline_strategy cimport BaselineStrategy
+from pypore.strategies.baseline_strategy cimport BaselineStrategy, BaselineKernel, BASELINE_KERNEL_ADAPTIVE
+from pypore.strategies.baseline_strategy cimport baseline_kernel_update
 
 DTYPE = np.float
 ctypedef np.float_t DTYPE_t
@@ -43,4 +45,45 @@ cdef class AdaptiveBaselineStrategy(BaselineStrategy):
     cdef void initialize_c(self, np.ndarray[DTYPE_t] initialization_points):
         self.baseline = np.mean(initialization_points)
         self.variance = np.var(initialization_points)
-        self.variance_baseline = self.baseline
\ No newline at end of file
+        self.variance_baseline = self.baseline
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef void compute_baseline_block_c(self, np.ndarray[DTYPE_t] data, np.ndarray[DTYPE_t] baselines,
+                                       np.ndarray[DTYPE_t] variances) except *:
+        # Same recursions as compute_baseline_c and compute_variance_c, run on a kernel so the
+        # results are identical to the per-point methods.
+        cdef BaselineKernel kernel
+        cdef long i
+        cdef long n = data.shape[0]
+        if not self.get_kernel_c(&kernel):
+            BaselineStrategy.compute_baseline_block_c(self, data, baselines, variances)
+            return
+        for i in xrange(n):
+            baseline_kernel_update(&kernel, data[i])
+            baselines[i] = kernel.baseline
+            variances[i] = kernel.variance
+        self.set_kernel_c(&kernel)
+
+    cdef bint get_kernel_c(self, BaselineKernel *kernel):
+        if type(self) is not AdaptiveBaselineStrategy:
+            # The kernel would ignore a subclass's per-point methods.
+            return False
+        kernel.kind = BASELINE_KERNEL_ADAPTIVE
+        kernel.baseline = self.baseline
+        kernel.variance = self.variance
+        kernel.variance_baseline = self.variance_baseline
+        kernel.baseline_filter_parameter = self.baseline_filter_parameter
+        kernel.variance_filter_parameter = self.variance_filter_parameter
+        return True
+
+    cdef void set_kernel_c(self, BaselineKernel *kernel):
+        self.baseline = kernel.baseline
+        self.variance = kernel.variance
+        self.variance_baseline = kernel.variance_baseline
+
+    cpdef object get_state(self):
+        return self.baseline, self.variance, self.variance_baseline
+
+    cpdef set_state(self, object state):
+        self.baseline, self.variance, self.variance_baseline = state
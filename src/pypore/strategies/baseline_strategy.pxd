@@ -1,10 +1,35 @@
 
 import numpy as np
 cimport numpy as np
+from libc.math cimport pow
 
 DTYPE = np.float
 ctypedef np.float_t DTYPE_t
 
+# The kinds of BaselineKernel.
+cdef enum:
+    BASELINE_KERNEL_FIXED = 1
+    BASELINE_KERNEL_ADAPTIVE = 2
+
+cdef struct BaselineKernel:
+    # A plain C copy of a built-in BaselineStrategy, which can be updated without the GIL.
+    int kind
+    double baseline
+    double variance
+    double variance_baseline
+    double baseline_filter_parameter
+    double variance_filter_parameter
+
+cdef inline void baseline_kernel_update(BaselineKernel *kernel, double data_point) nogil:
+    # Same as compute_baseline_c followed by compute_variance_c of the strategy the kernel was made from.
+    cdef double a, b
+    if kernel.kind == BASELINE_KERNEL_ADAPTIVE:
+        a = kernel.baseline_filter_parameter
+        b = kernel.variance_filter_parameter
+        kernel.baseline = a * kernel.baseline + (1 - a) * data_point
+        kernel.variance_baseline = b * kernel.variance_baseline + (1 - b) * data_point
+        kernel.variance = b * kernel.variance + (1 - b) * pow(data_point - kernel.variance_baseline, 2)
+
 cdef class BaselineStrategy:
 
     cdef public double baseline
@@ -24,3 +49,13 @@ cdef class BaselineStrategy:
 
     cpdef double get_variance(self)
     cdef double get_variance_c(self)
+
+    cpdef tuple compute_baseline_block(self, np.ndarray data)
+    cdef void compute_baseline_block_c(self, np.ndarray[DTYPE_t] data, np.ndarray[DTYPE_t] baselines,
+                                       np.ndarray[DTYPE_t] variances) except *
+
+    cdef bint get_kernel_c(self, BaselineKernel *kernel)
+    cdef void set_kernel_c(self, BaselineKernel *kernel)
+
+    cpdef object get_state(self)
+    cpdef set_state(self, object state)
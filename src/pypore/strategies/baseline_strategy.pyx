@@ -1,6 +1,8 @@
 import numpy as np
 cimport numpy as np
 
+DTYPE = np.float
+
 cdef class BaselineStrategy:
     """
     This is an abstract class defining how :py:func:`find_events` handles computing the baseline.
@@ -135,4 +137,85 @@ cdef class BaselineStrategy:
         """
         See docs for :py:func:`get_variance`
         """
-        return self.variance
\ No newline at end of file
+        return self.variance
+
+    cpdef tuple compute_baseline_block(self, np.ndarray data):
+        """compute_baseline_block(numpy.ndarray data)
+
+        (Note: this is a cpdef wrapper around the cdef function :py:func:`compute_baseline_block_c`.
+        This function can be called directly from Python. If calling from Cython,
+        you can call the cdef version :py:func:`compute_baseline_block_c`)
+
+        Feeds every point in data to the strategy, in order, like calling :py:func:`compute_baseline` followed\
+        by :py:func:`compute_variance` for each point.
+
+        :param numpy.ndarray[numpy.float] data: The data points, in order.
+        :returns: Tuple (baselines, variances) of numpy arrays, holding the baseline and variance after each\
+            data point.
+        """
+        if data.dtype != DTYPE or data.ndim != 1:
+            raise ValueError("data must be a 1-d {0} array, not {1}-d {2}.".format(np.dtype(DTYPE), data.ndim,
+                                                                                 data.dtype))
+        cdef np.ndarray[DTYPE_t] baselines = np.empty(data.shape[0], dtype=DTYPE)
+        cdef np.ndarray[DTYPE_t] variances = np.empty(data.shape[0], dtype=DTYPE)
+        self.compute_baseline_block_c(data, baselines, variances)
+        return baselines, variances
+
+    cdef void compute_baseline_block_c(self, np.ndarray[DTYPE_t] data, np.ndarray[DTYPE_t] baselines,
+                                       np.ndarray[DTYPE_t] variances) except *:
+        """
+        Block version of :py:func:`compute_baseline_c` and :py:func:`compute_variance_c`, used by
+        :py:func:`find_events` when scanning a whole block of data at once.
+
+        Feeds every point in data to the strategy, in order, exactly as calling :py:func:`compute_baseline_c`
+        followed by :py:func:`compute_variance_c` for each point would. baselines[i] and variances[i] are set
+        to the values returned after data[i] was added.
+
+        This default implementation just loops over the per-point methods, so custom strategies can be used\
+        with vectorized_scan as they are. Subclasses can override it with a faster version, as long as the\
+        results are the same.
+        """
+        cdef long i
+        cdef long n = data.shape[0]
+        for i in xrange(n):
+            baselines[i] = self.compute_baseline_c(data[i])
+            variances[i] = self.compute_variance_c(data[i])
+
+    cdef bint get_kernel_c(self, BaselineKernel *kernel):
+        """
+        Copies the strategy to a :c:type:`BaselineKernel`, which :py:func:`find_events` updates with\
+        :c:func:`baseline_kernel_update` for each data point, without holding the GIL. The state is copied back\
+        with :py:func:`set_kernel_c`.
+
+        Only the built-in strategies have a kernel, and only for their own type, so the per-point methods of\
+        any subclass are always used. This default implementation returns False, so the per-point methods are\
+        used instead.
+
+        :returns: True if kernel was filled in.
+        """
+        return False
+
+    cdef void set_kernel_c(self, BaselineKernel *kernel):
+        """
+        Copies the state of a kernel filled in by :py:func:`get_kernel_c` back to the strategy.
+        """
+        self.baseline = kernel.baseline
+        self.variance = kernel.variance
+
+    cpdef object get_state(self):
+        """get_state()
+
+        :returns: a tuple with everything needed to restore the strategy to its current state\
+            with :py:func:`set_state`.
+
+        Subclasses that keep more state than the baseline and variance must override this and\
+        :py:func:`set_state`.
+        """
+        return self.baseline, self.variance
+
+    cpdef set_state(self, object state):
+        """set_state(state)
+
+        Restores a state returned by :py:func:`get_state`.
+        """
+        self.baseline, self.variance = state
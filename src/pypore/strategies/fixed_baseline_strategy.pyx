@@ -1,7 +1,7 @@
 import numpy as np
 cimport numpy as np
 
-from pypore.strategies.baseline_strategy cimport BaselineStrategy
+from pypore.strategies.baseline_strategy cimport BaselineStrategy, BaselineKernel, BASELINE_KERNEL_FIXED
 
 DTYPE = np.float
 ctypedef np.float_t DTYPE_t
@@ -22,4 +22,22 @@ cdef class FixedBaselineStrategy(BaselineStrategy):
         return BaselineStrategy.get_baseline_c(self)
 
     cdef double get_variance_c(self):
-        return BaselineStrategy.get_variance_c(self)
\ No newline at end of file
+        return BaselineStrategy.get_variance_c(self)
+
+    cdef void compute_baseline_block_c(self, np.ndarray[DTYPE_t] data, np.ndarray[DTYPE_t] baselines,
+                                       np.ndarray[DTYPE_t] variances) except *:
+        if type(self) is not FixedBaselineStrategy:
+            # Subclasses may change the per-point methods, which this doesn't call.
+            BaselineStrategy.compute_baseline_block_c(self, data, baselines, variances)
+            return
+        baselines[:] = self.baseline
+        variances[:] = self.variance
+
+    cdef bint get_kernel_c(self, BaselineKernel *kernel):
+        if type(self) is not FixedBaselineStrategy:
+            # The kernel would ignore a subclass's per-point methods.
+            return False
+        kernel.kind = BASELINE_KERNEL_FIXED
+        kernel.baseline = self.baseline
+        kernel.variance = self.variance
+        return True
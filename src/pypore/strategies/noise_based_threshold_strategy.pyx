@@ -1,5 +1,8 @@
+cimport cython
+cimport numpy as np
 from libc.math cimport sqrt
-from pypore.strategies.threshold_strategy cimport ThresholdStrategy
+from pypore.strategies.threshold_strategy cimport ThresholdStrategy, ThresholdKernel, THRESHOLD_KERNEL_NOISE_BASED
+from pypore.strategies.threshold_strategy cimport DTYPE_t
 
 cdef class NoiseBasedThresholdStrategy(ThresholdStrategy):
     cdef public double start_std_dev
@@ -14,4 +17,38 @@ cdef class NoiseBasedThresholdStrategy(ThresholdStrategy):
         return self.end_std_dev * sqrt(variance)
 
     cdef double compute_starting_threshold_c(self, double baseline, double variance):
-        return self.start_std_dev * sqrt(variance)
\ No newline at end of file
+        return self.start_std_dev * sqrt(variance)
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef void compute_starting_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                                 np.ndarray[DTYPE_t] variances,
+                                                 np.ndarray[DTYPE_t] thresholds) except *:
+        if type(self) is not NoiseBasedThresholdStrategy:
+            # Subclasses may change the per-point methods, which this doesn't call.
+            ThresholdStrategy.compute_starting_threshold_block_c(self, baselines, variances, thresholds)
+            return
+        cdef long i
+        for i in xrange(baselines.shape[0]):
+            thresholds[i] = self.start_std_dev * sqrt(variances[i])
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef void compute_ending_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                               np.ndarray[DTYPE_t] variances, np.ndarray[DTYPE_t] thresholds) except *:
+        if type(self) is not NoiseBasedThresholdStrategy:
+            # Subclasses may change the per-point methods, which this doesn't call.
+            ThresholdStrategy.compute_ending_threshold_block_c(self, baselines, variances, thresholds)
+            return
+        cdef long i
+        for i in xrange(baselines.shape[0]):
+            thresholds[i] = self.end_std_dev * sqrt(variances[i])
+
+    cdef bint get_kernel_c(self, ThresholdKernel *kernel):
+        if type(self) is not NoiseBasedThresholdStrategy:
+            # The kernel would ignore a subclass's per-point methods.
+            return False
+        kernel.kind = THRESHOLD_KERNEL_NOISE_BASED
+        kernel.start = self.start_std_dev
+        kernel.end = self.end_std_dev
+        return True
@@ -1,5 +1,9 @@
+cimport cython
+cimport numpy as np
 
-from pypore.strategies.threshold_strategy cimport ThresholdStrategy
+from pypore.strategies.threshold_strategy cimport ThresholdStrategy, ThresholdKernel
+from pypore.strategies.threshold_strategy cimport THRESHOLD_KERNEL_PERCENT_CHANGE
+from pypore.strategies.threshold_strategy cimport DTYPE_t
 
 cdef class PercentChangeThresholdStrategy(ThresholdStrategy):
     cdef public double percent_change_start
@@ -13,4 +17,38 @@ cdef class PercentChangeThresholdStrategy(ThresholdStrategy):
         return baseline * self.percent_change_start / 100.0
 
     cdef double compute_ending_threshold_c(self, double baseline, double variance):
-        return baseline * self.percent_change_end / 100.0
\ No newline at end of file
+        return baseline * self.percent_change_end / 100.0
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef void compute_starting_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                                 np.ndarray[DTYPE_t] variances,
+                                                 np.ndarray[DTYPE_t] thresholds) except *:
+        if type(self) is not PercentChangeThresholdStrategy:
+            # Subclasses may change the per-point methods, which this doesn't call.
+            ThresholdStrategy.compute_starting_threshold_block_c(self, baselines, variances, thresholds)
+            return
+        cdef long i
+        for i in xrange(baselines.shape[0]):
+            thresholds[i] = baselines[i] * self.percent_change_start / 100.0
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cdef void compute_ending_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                               np.ndarray[DTYPE_t] variances, np.ndarray[DTYPE_t] thresholds) except *:
+        if type(self) is not PercentChangeThresholdStrategy:
+            # Subclasses may change the per-point methods, which this doesn't call.
+            ThresholdStrategy.compute_ending_threshold_block_c(self, baselines, variances, thresholds)
+            return
+        cdef long i
+        for i in xrange(baselines.shape[0]):
+            thresholds[i] = baselines[i] * self.percent_change_end / 100.0
+
+    cdef bint get_kernel_c(self, ThresholdKernel *kernel):
+        if type(self) is not PercentChangeThresholdStrategy:
+            # The kernel would ignore a subclass's per-point methods.
+            return False
+        kernel.kind = THRESHOLD_KERNEL_PERCENT_CHANGE
+        kernel.start = self.percent_change_start
+        kernel.end = self.percent_change_end
+        return True
@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+
+from pypore.strategies.absolute_change_threshold_strategy import AbsoluteChangeThresholdStrategy
+from pypore.strategies.adaptive_baseline_strategy import AdaptiveBaselineStrategy
+from pypore.strategies.fixed_baseline_strategy import FixedBaselineStrategy
+from pypore.strategies.noise_based_threshold_strategy import NoiseBasedThresholdStrategy
+from pypore.strategies.percent_change_threshold_strategy import PercentChangeThresholdStrategy
+
+
+class _AdaptiveBaselineSubclass(AdaptiveBaselineStrategy):
+    pass
+
+
+class _NoiseBasedThresholdSubclass(NoiseBasedThresholdStrategy):
+    pass
+
+
+class TestBlockMethods(unittest.TestCase):
+    def setUp(self):
+        self.data = 5. + np.random.RandomState(0).randn(1000)
+
+    def test_compute_baseline_block(self):
+        """
+        Tests that compute_baseline_block gives exactly the baselines and variances of the per-point methods,\
+        and leaves the strategy in the same state, including for subclasses, which don't use the kernels.
+        """
+        for strategy in (AdaptiveBaselineStrategy(), AdaptiveBaselineStrategy(baseline_filter_parameter=0.5),
+                         FixedBaselineStrategy(5., 1.), _AdaptiveBaselineSubclass()):
+            strategy.initialize(self.data[:100])
+            state = strategy.get_state()
+            baselines_should_be = []
+            variances_should_be = []
+            for data_point in self.data:
+                baselines_should_be.append(strategy.compute_baseline(data_point))
+                variances_should_be.append(strategy.compute_variance(data_point))
+            state_should_be = strategy.get_state()
+
+            strategy.set_state(state)
+            baselines, variances = strategy.compute_baseline_block(self.data)
+            np.testing.assert_array_equal(baselines, baselines_should_be)
+            np.testing.assert_array_equal(variances, variances_should_be)
+            self.assertEqual(strategy.get_state(), state_should_be)
+
+    def test_compute_thresholds_block(self):
+        """
+        Tests that compute_thresholds_block gives exactly the thresholds of the per-point methods.
+        """
+        baselines = self.data
+        variances = self.data ** 2
+        for strategy in (NoiseBasedThresholdStrategy(3., 1.), AbsoluteChangeThresholdStrategy(2., 1.),
+                         PercentChangeThresholdStrategy(30., 10.), _NoiseBasedThresholdSubclass(3., 1.)):
+            starting_thresholds, ending_thresholds = strategy.compute_thresholds_block(baselines, variances)
+            np.testing.assert_array_equal(starting_thresholds,
+                                          [strategy.compute_starting_threshold(baseline, variance)
+                                           for baseline, variance in zip(baselines, variances)])
+            np.testing.assert_array_equal(ending_thresholds,
+                                          [strategy.compute_ending_threshold(baseline, variance)
+                                           for baseline, variance in zip(baselines, variances)])
+
+    def test_block_methods_check_arrays(self):
+        """
+        Tests that the block methods raise a ValueError for arrays of the wrong type, dimensions or size.
+        """
+        strategy = AdaptiveBaselineStrategy()
+        self.assertRaises(ValueError, strategy.compute_baseline_block, self.data.astype(np.float32))
+        self.assertRaises(ValueError, strategy.compute_baseline_block, self.data.reshape(10, 100))
+
+        for strategy in (NoiseBasedThresholdStrategy(3., 1.), PercentChangeThresholdStrategy(30., 10.)):
+            self.assertRaises(ValueError, strategy.compute_thresholds_block, self.data.astype(np.float32), self.data)
+            self.assertRaises(ValueError, strategy.compute_thresholds_block, self.data, self.data[:10])
@@ -1,9 +1,52 @@
 
-cdef class ThresholdStrategy:
+import numpy as np
+cimport numpy as np
+from libc.math cimport sqrt
+
+DTYPE = np.float
+ctypedef np.float_t DTYPE_t
+
+# The kinds of ThresholdKernel.
+cdef enum:
+    THRESHOLD_KERNEL_NOISE_BASED = 1
+    THRESHOLD_KERNEL_ABSOLUTE_CHANGE = 2
+    THRESHOLD_KERNEL_PERCENT_CHANGE = 3
+
+cdef struct ThresholdKernel:
+    # A plain C copy of a built-in ThresholdStrategy, which can be used without the GIL.
+    int kind
+    double start
+    double end
+
+cdef inline double threshold_kernel_starting(ThresholdKernel *kernel, double baseline, double variance) nogil:
+    # Same as compute_starting_threshold_c of the strategy the kernel was made from.
+    if kernel.kind == THRESHOLD_KERNEL_NOISE_BASED:
+        return kernel.start * sqrt(variance)
+    elif kernel.kind == THRESHOLD_KERNEL_PERCENT_CHANGE:
+        return baseline * kernel.start / 100.0
+    return kernel.start
 
+cdef inline double threshold_kernel_ending(ThresholdKernel *kernel, double baseline, double variance) nogil:
+    # Same as compute_ending_threshold_c of the strategy the kernel was made from.
+    if kernel.kind == THRESHOLD_KERNEL_NOISE_BASED:
+        return kernel.end * sqrt(variance)
+    elif kernel.kind == THRESHOLD_KERNEL_PERCENT_CHANGE:
+        return baseline * kernel.end / 100.0
+    return kernel.end
+
+cdef class ThresholdStrategy:
 
     cpdef double compute_starting_threshold(self, double baseline, double variance)
     cdef double compute_starting_threshold_c(self, double baseline, double variance)
 
     cpdef double compute_ending_threshold(self, double baseline, double variance)
     cdef double compute_ending_threshold_c(self, double baseline, double variance)
+
+    cpdef tuple compute_thresholds_block(self, np.ndarray baselines, np.ndarray variances)
+
+    cdef void compute_starting_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                                 np.ndarray[DTYPE_t] variances, np.ndarray[DTYPE_t] thresholds) except *
+    cdef void compute_ending_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                               np.ndarray[DTYPE_t] variances, np.ndarray[DTYPE_t] thresholds) except *
+
+    cdef bint get_kernel_c(self, ThresholdKernel *kernel)
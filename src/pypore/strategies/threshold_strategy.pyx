@@ -1,3 +1,8 @@
+import numpy as np
+cimport numpy as np
+
+DTYPE = np.float
+
 
 cdef class ThresholdStrategy:
     """
@@ -56,3 +61,71 @@ cdef class ThresholdStrategy:
 
     cdef double compute_ending_threshold_c(self, double baseline, double variance):
         raise NotImplementedError
+
+    cpdef tuple compute_thresholds_block(self, np.ndarray baselines, np.ndarray variances):
+        """compute_thresholds_block(numpy.ndarray baselines, numpy.ndarray variances)
+
+        (Note: this is a cpdef wrapper for the cdef methods :py:func:`compute_starting_threshold_block_c` and
+        :py:func:`compute_ending_threshold_block_c`. To subclass this class, implement those instead.)
+
+        Block version of :py:func:`compute_starting_threshold` and :py:func:`compute_ending_threshold`.
+
+        :param numpy.ndarray[numpy.float] baselines: The baselines to compute the thresholds for.
+        :param numpy.ndarray[numpy.float] variances: The variance of each baseline.
+        :returns: Tuple (starting_thresholds, ending_thresholds) of numpy arrays, one threshold for each\
+            baseline.
+        """
+        for name, array in (('baselines', baselines), ('variances', variances)):
+            if array.dtype != DTYPE or array.ndim != 1:
+                raise ValueError("{0} must be a 1-d {1} array, not {2}-d {3}.".format(name, np.dtype(DTYPE),
+                                                                                    array.ndim, array.dtype))
+        if variances.shape[0] != baselines.shape[0]:
+            raise ValueError("baselines and variances must be the same size, got {0} and {1}.".format(
+                baselines.shape[0], variances.shape[0]))
+        cdef np.ndarray[DTYPE_t] starting_thresholds = np.empty(baselines.shape[0], dtype=DTYPE)
+        cdef np.ndarray[DTYPE_t] ending_thresholds = np.empty(baselines.shape[0], dtype=DTYPE)
+        self.compute_starting_threshold_block_c(baselines, variances, starting_thresholds)
+        self.compute_ending_threshold_block_c(baselines, variances, ending_thresholds)
+        return starting_thresholds, ending_thresholds
+
+    cdef void compute_starting_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                                 np.ndarray[DTYPE_t] variances,
+                                                 np.ndarray[DTYPE_t] thresholds) except *:
+        """
+        Block version of :py:func:`compute_starting_threshold_c`. Sets thresholds[i] to the starting threshold
+        for baselines[i] and variances[i].
+
+        This default implementation just loops over :py:func:`compute_starting_threshold_c`. Subclasses can
+        override it with a faster version, as long as the results are the same.
+        """
+        cdef long i
+        cdef long n = baselines.shape[0]
+        for i in xrange(n):
+            thresholds[i] = self.compute_starting_threshold_c(baselines[i], variances[i])
+
+    cdef void compute_ending_threshold_block_c(self, np.ndarray[DTYPE_t] baselines,
+                                               np.ndarray[DTYPE_t] variances, np.ndarray[DTYPE_t] thresholds) except *:
+        """
+        Block version of :py:func:`compute_ending_threshold_c`. Sets thresholds[i] to the ending threshold
+        for baselines[i] and variances[i].
+
+        This default implementation just loops over :py:func:`compute_ending_threshold_c`. Subclasses can
+        override it with a faster version, as long as the results are the same.
+        """
+        cdef long i
+        cdef long n = baselines.shape[0]
+        for i in xrange(n):
+            thresholds[i] = self.compute_ending_threshold_c(baselines[i], variances[i])
+
+    cdef bint get_kernel_c(self, ThresholdKernel *kernel):
+        """
+        Copies the strategy to a :c:type:`ThresholdKernel`, which :py:func:`find_events` uses to compute the\
+        thresholds without holding the GIL.
+
+        Only the built-in strategies have a kernel, and only for their own type, so the per-point methods of\
+        any subclass are always used. This default implementation returns False, so the per-point methods are\
+        used instead.
+
+        :returns: True if kernel was filled in.
+        """
+        return False
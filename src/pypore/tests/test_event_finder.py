@@ -4,10 +4,14 @@ Tests for eventFinder.pyx
 @author: `@parkin`_
 """
 import unittest
-from pypore.event_finder import find_events, get_reader_from_filename
-from pypore.event_finder import _get_data_range_test_wrapper
+from pypore.event_finder import find_events, find_events_sweep, iter_events, refit_levels, get_reader_from_filename
+from pypore.event_finder import _SampleBuffer
+from pypore.i_o.heka_reader import HekaReader
 import numpy as np
 import os
+import shutil
+import tempfile
+import threading
 import pypore.filetypes.event_database as ed
 
 import pypore.sampledata.testing_files as tf
@@ -21,71 +25,53 @@ class TestEventFinder(unittest.TestCase):
     def tearDown(self):
         pass
 
-    def test_get_data_range_test_wrapper_at_new(self):
+    def test_sample_buffer_get_range(self):
         n = 100
-        first = np.zeros(n)
-        first[n - 1] += 1.
-        first[0] += 1.
-        data_cache = [first, np.zeros(n) + 100., np.zeros(n) + 100. + 60., np.zeros(n) + 200.]
-
-        res = _get_data_range_test_wrapper(data_cache, 0, n)
-        self.assertEqual(res.size, n)
-        np.testing.assert_array_equal(res, np.zeros(n) + 100.)
-
-        # Test negative i to 0
-        x = np.zeros(10)
-        x[9] += 1.
-        res = _get_data_range_test_wrapper(data_cache, -10, 0)
-        np.testing.assert_array_equal(res, x)
-
-        # Test negative i,n
-        x = np.zeros(10)
-        x[0] += 1.
-        res = _get_data_range_test_wrapper(data_cache, -100, -90)
-        np.testing.assert_array_equal(res, x)
-
-        # Test negative i, pos n in first spot
-        x = np.zeros(10)
-        x[4] += 1.
-        x[5:10] += 100.
-        res = _get_data_range_test_wrapper(data_cache, -5, 5)
-        np.testing.assert_array_equal(res, x)
-
-        # Test pos i,n both in first spot
-        x = np.zeros(10) + 100.
-        res = _get_data_range_test_wrapper(data_cache, 60, 70)
-        np.testing.assert_array_equal(res, x)
-
-        # Test first and second cache overlap
-        x = np.zeros(10) + 100.
-        x[5:] += 60.
-        res = _get_data_range_test_wrapper(data_cache, 95, 105)
-        np.testing.assert_array_equal(res, x)
-
-        # Test fist cache bumping up on second
-        x = np.zeros(10) + 100.
-        res = _get_data_range_test_wrapper(data_cache, 90, 100)
-        np.testing.assert_array_equal(res, x)
-
-        # Test second cache
-        x = np.zeros(10) + 160.
-        res = _get_data_range_test_wrapper(data_cache, 155, 165)
-        np.testing.assert_array_equal(res, x)
-
-        # Test neg overlap with 2 pos caches
-        x = np.zeros(120)
-        x[9] += 1.
-        x[10:] += 100.
-        x[110:] += 60.
-        res = _get_data_range_test_wrapper(data_cache, -10, 110)
-
-        # Test neg overlap with 3 pos caches
-        x = np.zeros(220)
-        x[9] += 1.
-        x[10:] += 100.
-        x[110:] += 60.
-        x[210:] += 40.
-        res = _get_data_range_test_wrapper(data_cache, -10, 210)
+        first = np.arange(n, dtype=np.float)
+        # 10 points of padding before sample 0, set to first[0] (and 1 more point of room)
+        sample_buffer = _SampleBuffer(n + 11, first, 0, 10)
+        self.assertEqual(sample_buffer.start, -10)
+        self.assertEqual(sample_buffer.end, n)
+
+        np.testing.assert_array_equal(sample_buffer.get_range(0, n), first)
+        np.testing.assert_array_equal(sample_buffer.get_range(-10, 5), [0.] * 11 + [1., 2., 3., 4.])
+
+        # Fits without dropping anything
+        sample_buffer.append(np.zeros(1) + 100., -10)
+        self.assertEqual(sample_buffer.start, -10)
+        self.assertEqual(sample_buffer.end, n + 1)
+
+        # Doesn't fit, so the points before keep_from are dropped
+        second = np.arange(n, 2 * n, dtype=np.float)
+        sample_buffer.append(second, n - 5)
+        self.assertEqual(sample_buffer.start, n - 5)
+        self.assertEqual(sample_buffer.end, 2 * n + 1)
+        np.testing.assert_array_equal(sample_buffer.get_range(n - 5, n + 1), [95., 96., 97., 98., 99., 100.])
+        np.testing.assert_array_equal(sample_buffer.get_range(n + 1, 2 * n + 1), second)
+
+        # Needs more room than the capacity, so the buffer grows
+        third = np.arange(2 * n, 4 * n, dtype=np.float)
+        sample_buffer.append(third, n - 5)
+        self.assertEqual(sample_buffer.start, n - 5)
+        np.testing.assert_array_equal(sample_buffer.get_range(2 * n + 1, 4 * n + 1), third)
+        np.testing.assert_array_equal(sample_buffer.get_range(n + 1, 2 * n + 1), second)
+
+    def test_sample_buffer_copy_range(self):
+        n = 100
+        sample_buffer = _SampleBuffer(2 * n, np.arange(n, dtype=np.float) + 1., 0, 0)
+        out = np.zeros(20) - 1.
+
+        sample_buffer.copy_range(10, 20, out)
+        np.testing.assert_array_equal(out[:10], np.arange(11, 21))
+        np.testing.assert_array_equal(out[10:], -1.)
+
+        # Points past the end of the buffer are 0
+        sample_buffer.copy_range(95, 105, out)
+        np.testing.assert_array_equal(out[:10], [96., 97., 98., 99., 100., 0., 0., 0., 0., 0.])
+
+        # Points before the start of the buffer are 0
+        sample_buffer.copy_range(-5, 5, out)
+        np.testing.assert_array_equal(out[:10], [0., 0., 0., 0., 0., 1., 2., 3., 4., 5.])
 
     def test_saving_files(self):
         filename = tf.get_abs_path('chimera_1event.log')
@@ -233,6 +219,158 @@ class TestEventFinder(unittest.TestCase):
         # delete the newly created event file
         os.remove(event_database)
 
+    def test_search_window(self):
+        """
+        Tests that only events starting in the window are found, whether the window is given in samples or as\
+        times in the Parameters, and serially or in parallel.
+        """
+        filename = tf.get_abs_path('chimera_nonoise_2events_1levels.log')
+        sample_rate = get_reader_from_filename(filename).get_sample_rate()
+        output_filename = '_test_search_window.h5'
+        windows = [({'start': 4000}, [4500]), ({'stop': 4000}, [2000]), ({'start': 1000, 'stop': 3000}, [2000]),
+                   ({'parameters': Parameters(start_time=4000 / sample_rate)}, [4500]),
+                   ({'parameters': Parameters(stop_time=4000 / sample_rate)}, [2000]),
+                   ({'start': 4000, 'n_processes': 2, 'warm_up_points': 1000}, [4500])]
+        for kwargs, event_starts in windows:
+            find_events([filename], save_file_names=[output_filename], **kwargs)
+            h5file = ed.open_file(output_filename, mode='r')
+            np.testing.assert_array_equal(h5file.get_event_table()[:]['event_start'], event_starts)
+            h5file.close()
+            os.remove(output_filename)
+
+        self.assertRaises(ValueError, find_events, [filename], start=4000, stop=3000)
+        self.assertRaises(ValueError, find_events, [filename], start=20000)
+
+    def test_sweep_same_events(self):
+        """
+        Tests that a sweep gives the same EventDatabases as searching with each Parameters in turn.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        parameters_list = [Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                      threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5)),
+                           Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.95),
+                                      threshold_strategy=NoiseBasedThresholdStrategy(2., 0.5)),
+                           Parameters(min_event_length=20., max_event_length=1000.,
+                                      baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                      threshold_strategy=NoiseBasedThresholdStrategy(2., 1.))]
+        for debug in (False, True):
+            sweep_file_names = ['_test_sweep_%d.h5' % k for k in xrange(len(parameters_list))]
+            self.assertEqual(find_events_sweep(filename, parameters_list, save_file_names=sweep_file_names,
+                                               debug=debug), sweep_file_names)
+            for parameters, sweep_file_name in zip(parameters_list, sweep_file_names):
+                find_events([filename], parameters=parameters, save_file_names=['_test_sweep.h5'], debug=debug)
+                contents = self._get_event_database_contents('_test_sweep.h5')
+                sweep_contents = self._get_event_database_contents(sweep_file_name)
+                self.assertGreater(len(contents[0]), 0)
+                self.assertEqual(len(sweep_contents), len(contents))
+                for data, sweep_data in zip(contents, sweep_contents):
+                    np.testing.assert_array_equal(sweep_data, data)
+                os.remove('_test_sweep.h5')
+                os.remove(sweep_file_name)
+
+        self.assertRaises(ValueError, find_events_sweep, filename,
+                          [Parameters(), Parameters(start_time=0.5)])
+
+    def test_metrics(self):
+        """
+        Tests that the metrics are handed to the callback and saved to the EventDatabase, serially and in parallel.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        points_per_channel_total = get_reader_from_filename(filename).get_points_per_channel_total()
+        parameters = Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5))
+        output_filename = '_test_metrics.h5'
+        for n_processes in (1, 2):
+            reports = []
+            find_events([filename], parameters=parameters, save_file_names=[output_filename],
+                        n_processes=n_processes, warm_up_points=5000, metrics_callback=reports.append)
+            h5file = ed.open_file(output_filename, mode='r')
+            metrics = h5file.get_metrics()
+            event_count = h5file.get_event_count()
+            h5file.close()
+            os.remove(output_filename)
+
+            self.assertGreater(len(reports), 0)
+            self.assertEqual(metrics, reports[-1])
+            self.assertEqual(metrics['events'], event_count)
+            if n_processes == 1:
+                self.assertEqual(metrics['points_read'], points_per_channel_total)
+            else:
+                # The segments also read their warm-ups.
+                self.assertGreater(metrics['points_read'], points_per_channel_total)
+            self.assertEqual(metrics['bytes_read'], 8 * metrics['points_read'])
+            self.assertGreater(metrics['peak_buffer_points'], 0)
+            for key in ('read_time', 'scan_time', 'level_fit_time', 'cache_copy_time', 'write_time',
+                        'events_per_second', 'points_per_second'):
+                self.assertGreater(metrics[key], 0, key)
+            self.assertLessEqual(metrics['level_fit_time'], metrics['scan_time'])
+
+    def test_iter_events(self):
+        """
+        Tests that iter_events yields the events find_events saves, without their padding.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        parameters = Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5))
+        find_events([filename], parameters=parameters, save_file_names=['_test_iter_events.h5'])
+        h5file = ed.open_file('_test_iter_events.h5', mode='r')
+        table = h5file.get_event_table()[:]
+
+        events = list(iter_events(filename, parameters))
+        self.assertGreater(len(events), 0)
+        self.assertEqual(len(events), len(table))
+        for k, event in enumerate(events):
+            for column in ('channel', 'event_start', 'event_length', 'n_levels', 'raw_points_per_side', 'baseline',
+                           'current_blockage', 'area'):
+                self.assertEqual(getattr(event, column), table[column][k], column)
+            np.testing.assert_array_equal(event.raw_data, h5file.get_raw_data_at(k))
+            np.testing.assert_array_equal(event.levels, h5file.get_levels_at(k))
+            np.testing.assert_array_equal(event.level_lengths, h5file.get_level_lengths_at(k))
+        h5file.close()
+        os.remove('_test_iter_events.h5')
+
+        events = list(iter_events(filename, parameters, raw_data=False, start=20000))
+        self.assertEqual([event.event_start for event in events],
+                         [event_start for event_start in table['event_start'] if event_start >= 20000])
+        self.assertTrue(all(event.raw_data is None for event in events))
+
+    def test_refit_levels(self):
+        """
+        Tests that fitting the levels again with the parameters of the search gives the same EventDatabase, in\
+        either layout and on several processes, and that a larger level_threshold_factor finds fewer levels.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        # Events end back past the baseline, so many are long enough to have several levels.
+        parameters = Parameters(min_event_length=1., baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                threshold_strategy=NoiseBasedThresholdStrategy(2., -0.5))
+        for compact in (False, True):
+            find_events([filename], parameters=parameters, save_file_names=['_test_refit.h5'], compact=compact)
+            contents = self._get_event_database_contents('_test_refit.h5')
+            self.assertGreater(contents[0]['n_levels'].max(), 1)
+            self.assertEqual(refit_levels('_test_refit.h5', parameters, save_file_name='_test_refit_copy.h5',
+                                          n_processes=2, chunk_events=100), '_test_refit_copy.h5')
+            for data, refit_data in zip(contents, self._get_event_database_contents('_test_refit_copy.h5')):
+                np.testing.assert_array_equal(refit_data, data)
+            os.remove('_test_refit_copy.h5')
+            os.remove('_test_refit.h5')
+
+        filename = tf.get_abs_path('chimera_1event_2levels.log')
+        for compact in (False, True):
+            find_events([filename], save_file_names=['_test_refit.h5'], compact=compact)
+            refit_levels('_test_refit.h5')
+            h5file = ed.open_file('_test_refit.h5', mode='r')
+            self.assertEqual(h5file.get_event_row(0)['n_levels'], 2)
+            h5file.close()
+
+            refit_levels('_test_refit.h5', Parameters(level_threshold_factor=1.e4))
+            h5file = ed.open_file('_test_refit.h5', mode='r')
+            row = h5file.get_event_row(0)
+            self.assertEqual(row['n_levels'], 1)
+            np.testing.assert_array_equal(h5file.get_level_lengths_at(0), [row['event_length']])
+            self.assertAlmostEqual(row['current_blockage'], h5file.get_event_data_at(0).mean() - row['baseline'])
+            h5file.close()
+            os.remove('_test_refit.h5')
+
     def test_multiple_files(self):
         filename1 = tf.get_abs_path('chimera_nonoise_2events_1levels.log')
         filename2 = tf.get_abs_path('chimera_nonoise_1event_2levels.log')
@@ -302,11 +440,419 @@ class TestEventFinder(unittest.TestCase):
 
         os.remove(event_databases[0])
 
+    def test_debug_traces_streamed(self):
+        """
+        Tests that the debug traces are right for a file longer than the chunks they are written in, and that
+        decimated traces are the min and max of the bins of the full ones.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        reader = get_reader_from_filename(filename)
+        data = reader.get_all_data()[0]
+        reader.close()
+
+        parameters = Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5))
+        traces = {}
+        for decimation in (1, 7):
+            output_filename = '_test_debug_traces_%d.h5' % decimation
+            find_events([filename], parameters=parameters, save_file_names=[output_filename], debug=True,
+                        debug_decimation=decimation)
+            h5file = ed.open_file(output_filename, mode='r')
+            self.assertEqual(h5file.get_debug_decimation(), decimation)
+            traces[decimation] = [h5file.root.debug.data[0], h5file.root.debug.baseline[0],
+                                  h5file.root.debug.threshold_positive[0], h5file.root.debug.threshold_negative[0]]
+            h5file.close()
+            os.remove(output_filename)
+
+        np.testing.assert_array_equal(traces[1][0], data)
+
+        n_bins = (data.size + 6) // 7
+        for full, decimated in zip(traces[1], traces[7]):
+            self.assertEqual(decimated.size, 2 * n_bins)
+            padded = np.concatenate((full, np.zeros(7 * n_bins - full.size) + full[-1]))
+            np.testing.assert_array_equal(decimated[0::2], padded.reshape(-1, 7).min(axis=1))
+            np.testing.assert_array_equal(decimated[1::2], padded.reshape(-1, 7).max(axis=1))
+
+    def _get_event_database_contents(self, filename):
+        h5file = ed.open_file(filename, mode='r')
+        contents = [h5file.root.events.eventTable[:], h5file.root.events.raw_data[:], h5file.root.events.levels[:],
+                    h5file.root.events.level_lengths[:]]
+        if h5file.is_debug():
+            contents += [h5file.root.debug.data[:], h5file.root.debug.baseline[:],
+                         h5file.root.debug.threshold_positive[:], h5file.root.debug.threshold_negative[:]]
+        h5file.close()
+        return contents
+
+    def test_vectorized_scan_same_events(self):
+        """
+        Tests that the vectorized scan finds exactly the same events as the per-point scan.
+        """
+        file_names = [tf.get_abs_path('chimera_1event.log'), tf.get_abs_path('chimera_nonoise_2events_1levels.log'),
+                      tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')]
+        threshold_strategies = [NoiseBasedThresholdStrategy(3.0, 1.0), AbsoluteChangeThresholdStrategy(2., 1.)]
+        for filename in file_names:
+            for threshold_strategy in threshold_strategies:
+                for debug in (False, True):
+                    contents = []
+                    for vectorized_scan in (False, True):
+                        output_filename = '_test_vectorized_scan_%d.h5' % vectorized_scan
+                        parameters = Parameters(vectorized_scan=vectorized_scan,
+                                                baseline_strategy=AdaptiveBaselineStrategy(),
+                                                threshold_strategy=threshold_strategy)
+                        event_databases = find_events([filename], parameters=parameters,
+                                                      save_file_names=[output_filename], debug=debug)
+                        if len(event_databases) > 0:
+                            contents.append(self._get_event_database_contents(output_filename))
+                            os.remove(output_filename)
+                        else:
+                            contents.append(None)
+                    if contents[0] is None:
+                        self.assertIsNone(contents[1])
+                        continue
+                    for scalar_array, vectorized_array in zip(contents[0], contents[1]):
+                        np.testing.assert_array_equal(scalar_array, vectorized_array)
+
+    def test_threads_same_events(self):
+        """
+        Tests that searches run on threads of one process, which scan without the GIL, find the same events as\
+        the vectorized scan, with every built-in strategy.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        strategies = [(AdaptiveBaselineStrategy(), NoiseBasedThresholdStrategy(3.0, 1.0)),
+                      (AdaptiveBaselineStrategy(0.99), PercentChangeThresholdStrategy(100., 50.)),
+                      (FixedBaselineStrategy(5.32e-12, 2.76e-12 ** 2), NoiseBasedThresholdStrategy(2.5, 0.5)),
+                      (FixedBaselineStrategy(5.32e-12, 2.76e-12 ** 2), AbsoluteChangeThresholdStrategy(6e-12, 3e-12))]
+        contents = []
+        for k, (baseline_strategy, threshold_strategy) in enumerate(strategies):
+            parameters = Parameters(vectorized_scan=True, baseline_strategy=baseline_strategy,
+                                    threshold_strategy=threshold_strategy)
+            find_events([filename], parameters=parameters, save_file_names=['_test_threads_%d.h5' % k])
+            contents.append(self._get_event_database_contents('_test_threads_%d.h5' % k))
+            os.remove('_test_threads_%d.h5' % k)
+
+        threads = [threading.Thread(target=find_events, args=([filename],),
+                                    kwargs={'save_file_names': ['_test_threads_%d.h5' % k],
+                                            'parameters': Parameters(baseline_strategy=baseline_strategy,
+                                                                     threshold_strategy=threshold_strategy)})
+                   for k, (baseline_strategy, threshold_strategy) in enumerate(strategies)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for k in xrange(len(strategies)):
+            self.assertGreater(len(contents[k][0]), 0)
+            threads_contents = self._get_event_database_contents('_test_threads_%d.h5' % k)
+            os.remove('_test_threads_%d.h5' % k)
+            for vectorized_data, threads_data in zip(contents[k], threads_contents):
+                np.testing.assert_array_equal(threads_data, vectorized_data)
+
+    def test_float32(self):
+        """
+        Tests that searching float32 data finds the same events as float64, and saves them in float32.
+        """
+        file_names = [tf.get_abs_path('chimera_1event.log'), tf.get_abs_path('chimera_nonoise_2events_1levels.log')]
+        for filename in file_names:
+            for vectorized_scan in (False, True):
+                contents = []
+                for dtype in (np.float64, np.float32):
+                    parameters = Parameters(vectorized_scan=vectorized_scan)
+                    find_events([filename], parameters=parameters, save_file_names=['_test_float32.h5'],
+                                dtype=dtype)
+                    contents.append(self._get_event_database_contents('_test_float32.h5'))
+                    os.remove('_test_float32.h5')
+                events64, raw_data64, levels64, level_lengths64 = contents[0]
+                events32, raw_data32, levels32, level_lengths32 = contents[1]
+                self.assertGreater(len(events64), 0)
+                self.assertEqual(raw_data32.dtype, np.float32)
+                self.assertEqual(levels32.dtype, np.float32)
+                for name in ('event_start', 'event_length', 'n_levels'):
+                    np.testing.assert_array_equal(events32[name], events64[name])
+                for name in ('baseline', 'current_blockage'):
+                    np.testing.assert_allclose(events32[name], events64[name], rtol=1.e-4)
+                np.testing.assert_allclose(raw_data32, raw_data64, rtol=1.e-5)
+                np.testing.assert_array_equal(level_lengths32, level_lengths64)
+
+        records = list(iter_events(file_names[0], dtype=np.float32))
+        self.assertGreater(len(records), 0)
+        self.assertEqual(records[0].raw_data.dtype, np.float32)
+
+    def test_store_options(self):
+        """
+        Tests that searches leaving out the raw data or levels, or saving fewer raw points, find the same events.
+        """
+        filename = tf.get_abs_path('chimera_nonoise_2events_1levels.log')
+        find_events([filename], save_file_names=['_test_store_all.h5'])
+        events, raw_data, levels, level_lengths = self._get_event_database_contents('_test_store_all.h5')
+        os.remove('_test_store_all.h5')
+        self.assertGreater(len(events), 0)
+
+        for n_processes in (1, 2):
+            parameters = Parameters(store_raw=False, store_levels=False)
+            find_events([filename], parameters=parameters, save_file_names=['_test_store_none.h5'],
+                        n_processes=n_processes, warm_up_points=100)
+            h5file = ed.open_file('_test_store_none.h5', mode='r')
+            self.assertFalse(h5file.has_raw_data())
+            self.assertFalse(h5file.has_levels())
+            np.testing.assert_array_equal(h5file.root.events.eventTable[:], events)
+            h5file.close()
+            os.remove('_test_store_none.h5')
+
+        parameters = Parameters(store_levels=False, raw_points_per_side=10)
+        find_events([filename], parameters=parameters, save_file_names=['_test_store_raw.h5'])
+        h5file = ed.open_file('_test_store_raw.h5', mode='r')
+        self.assertFalse(h5file.has_levels())
+        self.assertEqual(h5file.root.events.raw_data.shape[1], raw_data.shape[1] - 80)
+        for i in xrange(len(events)):
+            self.assertEqual(h5file.get_event_row(i)['raw_points_per_side'], 10)
+            np.testing.assert_array_equal(h5file.get_raw_data_at(i), raw_data[i, 40:events[i]['event_length'] + 60])
+        h5file.close()
+        self.assertRaises(ValueError, refit_levels, '_test_store_raw.h5')
+        os.remove('_test_store_raw.h5')
+
+        records = list(iter_events(filename, parameters=Parameters(store_raw=False, store_levels=False)))
+        self.assertEqual([record.event_start for record in records], list(events['event_start']))
+        self.assertIsNone(records[0].raw_data)
+        self.assertIsNone(records[0].levels)
+
+    def test_parallel_same_events(self):
+        """
+        Tests that searching a file in parallel segments finds the same events as searching it serially.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        contents = []
+        for n_processes in (1, 2):
+            output_filename = '_test_parallel_%d.h5' % n_processes
+            parameters = Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                    threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5))
+            event_databases = find_events([filename], parameters=parameters, save_file_names=[output_filename],
+                                          n_processes=n_processes, warm_up_points=5000)
+            self.assertEqual(1, len(event_databases))
+            contents.append(self._get_event_database_contents(output_filename))
+            os.remove(output_filename)
+        self.assertGreater(len(contents[0][0]), 0)
+        for serial_array, parallel_array in zip(contents[0], contents[1]):
+            np.testing.assert_array_equal(serial_array, parallel_array)
+
+    def test_parallel_too_short(self):
+        """
+        Tests that searching a file too short to search in parallel returns the same message as searching it
+        serially, instead of failing to open the message as a database.
+        """
+        filename = tf.get_abs_path('chimera_small.log')
+        serial = find_events([filename], save_file_names=['_test_too_short_1.h5'])
+        parallel = find_events([filename], save_file_names=['_test_too_short_3.h5'], n_processes=3)
+        self.assertEqual(serial, ['Not enough data points in file.'])
+        self.assertEqual(parallel, serial)
+        for output_filename in ('_test_too_short_1.h5', '_test_too_short_3.h5'):
+            if os.path.exists(output_filename):
+                os.remove(output_filename)
+
+    def test_parallel_debug_raises(self):
+        """
+        Tests that asking for debug output in parallel raises an error.
+        """
+        self.assertRaises(ValueError, find_events, [tf.get_abs_path('chimera_1event.log')], debug=True, n_processes=2)
+
+    def test_compact_same_events(self):
+        """
+        Tests that the compact layout holds the same events, serially and in parallel, and is smaller.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        parameters = Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5))
+        find_events([filename], parameters=parameters, save_file_names=['_test_padded.h5'])
+        padded = ed.open_file('_test_padded.h5', mode='r')
+        for n_processes in (1, 2):
+            output_filename = '_test_compact_%d.h5' % n_processes
+            find_events([filename], parameters=parameters, save_file_names=[output_filename],
+                        n_processes=n_processes, warm_up_points=5000, compact=True)
+            compact = ed.open_file(output_filename, mode='r')
+            self.assertTrue(compact.is_compact())
+            self.assertGreater(padded.get_event_count(), 0)
+            np.testing.assert_array_equal(compact.get_event_table()[:], padded.get_event_table()[:])
+            for i in xrange(padded.get_event_count()):
+                np.testing.assert_array_equal(compact.get_raw_data_at(i), padded.get_raw_data_at(i))
+                np.testing.assert_array_equal(compact.get_levels_at(i), padded.get_levels_at(i))
+                np.testing.assert_array_equal(compact.get_level_lengths_at(i), padded.get_level_lengths_at(i))
+            compact.close()
+            self.assertLess(os.path.getsize(output_filename), os.path.getsize('_test_padded.h5'))
+            os.remove(output_filename)
+        padded.close()
+        os.remove('_test_padded.h5')
+
+    def test_multiple_channels(self):
+        """
+        Tests that every channel is searched, each on its own, in one pass. The second channel is the first one\
+        doubled, which scales everything in the search exactly, so the events are found in the same places.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        contents = []
+        for reader in (HekaReader(filename), _TwoChannelHekaReader(filename)):
+            output_filename = '_test_multiple_channels.h5'
+            parameters = Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                    threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5))
+            find_events([reader], parameters=parameters, save_file_names=[output_filename], debug=True)
+            reader.close()
+            contents.append(self._get_event_database_contents(output_filename))
+            os.remove(output_filename)
+
+        table, raw_data, levels, level_lengths, debug_data = contents[0][:5]
+        two_table, two_raw_data, two_levels, two_level_lengths, two_debug_data = contents[1][:5]
+        self.assertGreater(len(table), 0)
+        self.assertEqual(2 * len(table), len(two_table))
+        np.testing.assert_array_equal(two_table['array_row'], np.arange(len(two_table)))
+        np.testing.assert_array_equal(two_debug_data[1], 2 * debug_data[0])
+
+        for channel in (0, 1):
+            rows = two_table['channel'] == channel
+            channel_table = two_table[rows]
+            for column in ('event_start', 'event_length', 'n_levels'):
+                np.testing.assert_array_equal(channel_table[column], table[column])
+            np.testing.assert_array_equal(channel_table['baseline'], (channel + 1) * table['baseline'])
+            np.testing.assert_array_equal(two_raw_data[rows], (channel + 1) * raw_data)
+            np.testing.assert_array_equal(two_levels[rows], (channel + 1) * levels)
+            np.testing.assert_array_equal(two_level_lengths[rows], level_lengths)
+            np.testing.assert_array_equal(two_debug_data[channel], (channel + 1) * debug_data[0])
+
+
+    def test_resume(self):
+        """
+        Tests that a search stopped by an error can be resumed from its last checkpoint, and ends up with the same\
+        events as a search that was never stopped.
+        """
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        contents = []
+        for stop_after_blocks in (None, 8):
+            output_filename = '_test_resume.h5'
+            parameters = Parameters(baseline_strategy=AdaptiveBaselineStrategy(0.99),
+                                    threshold_strategy=NoiseBasedThresholdStrategy(2.5, 0.5))
+            if stop_after_blocks is not None:
+                reader = _FailingHekaReader(filename, stop_after_blocks)
+                self.assertRaises(IOError, find_events, [reader], parameters=parameters,
+                                  save_file_names=[output_filename], checkpoint_interval=1e-9)
+                reader.close()
+                h5file = ed.open_file(output_filename, mode='r')
+                self.assertTrue(h5file.has_checkpoint())
+                h5file.close()
+            find_events([filename], parameters=parameters, save_file_names=[output_filename], resume=True)
+            h5file = ed.open_file(output_filename, mode='r')
+            self.assertFalse(h5file.has_checkpoint())
+            h5file.close()
+            contents.append(self._get_event_database_contents(output_filename))
+            os.remove(output_filename)
+
+        self.assertGreater(len(contents[0][0]), 0)
+        for data, resumed_data in zip(contents[0], contents[1]):
+            np.testing.assert_array_equal(resumed_data, data)
+
+    def test_no_checkpoint_by_default(self):
+        """
+        Tests that a search only saves checkpoints if it is given a checkpoint_interval, or is resumed, so it can\
+        be resumed again.
+        """
+        import pypore.event_finder as event_finder
+
+        filename = tf.get_abs_path('heka_1.5s_mean5.32p_std2.76p.hkd')
+        output_filename = '_test_no_checkpoint.h5'
+        default_checkpoint_interval = event_finder.DEFAULT_CHECKPOINT_INTERVAL
+        event_finder.DEFAULT_CHECKPOINT_INTERVAL = 1e-9
+        try:
+            for resume in (False, True):
+                reader = _FailingHekaReader(filename, 8)
+                self.assertRaises(IOError, find_events, [reader], save_file_names=[output_filename], resume=resume)
+                reader.close()
+                h5file = ed.open_file(output_filename, mode='r')
+                self.assertEqual(h5file.has_checkpoint(), resume)
+                h5file.close()
+                os.remove(output_filename)
+        finally:
+            event_finder.DEFAULT_CHECKPOINT_INTERVAL = default_checkpoint_interval
+            if os.path.exists(output_filename):
+                os.remove(output_filename)
+
+    def test_resume_raises(self):
+        """
+        Tests that resuming a search with debug, or in parallel, raises an error.
+        """
+        filename = tf.get_abs_path('chimera_1event.log')
+        self.assertRaises(ValueError, find_events, [filename], resume=True, debug=True)
+        self.assertRaises(ValueError, find_events, [filename], resume=True, n_processes=2)
+
+    def test_follow(self):
+        """
+        Tests that following a Chimera file finds the events in the data appended to it during the search, the\
+        same as a search of the whole file.
+        """
+        filename = tf.get_abs_path('chimera_nonoise_2events_1levels.log')
+        find_events([filename], save_file_names=['_test_follow_whole.h5'])
+        contents = self._get_event_database_contents('_test_follow_whole.h5')
+        os.remove('_test_follow_whole.h5')
+
+        directory = tempfile.mkdtemp()
+        follow_filename = os.path.join(directory, os.path.basename(filename))
+        shutil.copy(filename[:-len('.log')] + '.mat', directory)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        # Start with the first event, and an odd number of bytes, so half of a sample.
+        with open(follow_filename, 'wb') as f:
+            f.write(data[:6001])
+
+        def append_rest():
+            with open(follow_filename, 'ab') as f:
+                f.write(data[6001:])
+
+        timer = threading.Timer(0.5, append_rest)
+        timer.start()
+        try:
+            find_events([follow_filename], save_file_names=['_test_follow.h5'], follow=True, idle_timeout=1.)
+        finally:
+            timer.join()
+            shutil.rmtree(directory)
+        followed_contents = self._get_event_database_contents('_test_follow.h5')
+        os.remove('_test_follow.h5')
+
+        self.assertEqual(len(contents[0]), 2)
+        for whole_data, followed_data in zip(contents, followed_contents):
+            np.testing.assert_array_equal(followed_data, whole_data)
+
+        self.assertRaises(ValueError, find_events, [filename], follow=True, debug=True)
+        self.assertRaises(ValueError, find_events, [filename], follow=True, n_processes=2)
+
+
+class _FailingHekaReader(HekaReader):
+    """
+    HekaReader that raises an IOError after reading stop_after_blocks blocks.
+    """
+
+    def __init__(self, filename, stop_after_blocks):
+        HekaReader.__init__(self, filename)
+        self.blocks_left = stop_after_blocks
+
+    def get_next_blocks(self, n_blocks=1):
+        if self.blocks_left <= 0:
+            raise IOError('Stopped reading.')
+        self.blocks_left -= n_blocks
+        return HekaReader.get_next_blocks(self, n_blocks)
+
+
+class _TwoChannelHekaReader(HekaReader):
+    """
+    HekaReader with a second channel that is the first one doubled.
+    """
+
+    def get_next_blocks(self, n_blocks=1):
+        blocks = HekaReader.get_next_blocks(self, n_blocks)
+        return [blocks[0], 2 * blocks[0]]
+
 
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
 from pypore.event_finder import Parameters
 from pypore.strategies.absolute_change_threshold_strategy import AbsoluteChangeThresholdStrategy
+from pypore.strategies.adaptive_baseline_strategy import AdaptiveBaselineStrategy
+from pypore.strategies.fixed_baseline_strategy import FixedBaselineStrategy
+from pypore.strategies.noise_based_threshold_strategy import NoiseBasedThresholdStrategy
+from pypore.strategies.percent_change_threshold_strategy import PercentChangeThresholdStrategy
 
 
 class TestEventFinderAbsoluteChangeThresholdStrategy(unittest.TestCase):
@@ -13,6 +13,9 @@ from multiprocessing import Process, Pipe
 from pypore.event_finder import find_events
 from pypore.i_o import get_reader_from_filename
 
+#: Number of min/max bins plotted for a whole file when decimating.
+PLOT_ENVELOPE_BINS = 20000
+
 
 class PlotThread(QtCore.QThread):
     dataReady = QtCore.Signal(object)
@@ -36,9 +39,17 @@ class PlotThread(QtCore.QThread):
     def run(self):
         if not self.filename == '' or self.plot_options['datadict'] == '':
             reader = get_reader_from_filename(self.filename)
-            self.plot_options['data'] = reader.get_all_data(self.decimate)
+            n_points = reader.get_points_per_channel_total()
+            if self.decimate:
+                # The envelope is saved next to the file, so only the first plot of a file reads all of it.
+                self.plot_options['data'] = reader.get_envelope(0, n_points, PLOT_ENVELOPE_BINS)
+            else:
+                self.plot_options['data'] = reader.get_all_data()
             if self.sample_rate == 0.0:
                 self.sample_rate = reader.get_sample_rate()
+                if self.decimate and n_points > 0:
+                    # Space the max and min of each bin evenly over the bin's time.
+                    self.sample_rate *= float(self.plot_options['data'][0].size) / n_points
             reader.close()
         if self.cancelled:
             return
@@ -113,13 +113,22 @@ class EventViewingTab(_ThreadManager, QtGui.QSplitter):
 
         sample_rate = event_database.get_sample_rate()
 
-        # TODO remove the step_size.
-        step_size = 1000
+        decimation = event_database.get_debug_decimation()
+        if decimation > 1:
+            # Already decimated to the min and max of each bin, plot them all.
+            step_size = 1
+        else:
+            # TODO remove the step_size.
+            step_size = 1000
 
         data = event_database.root.debug.data[0][::step_size]
 
         data_size = data.size
-        times = np.linspace(0, data_size *1.0/sample_rate, data_size)
+        if decimation > 1:
+            # The min and max of each bin both go at the start of the bin.
+            times = (np.arange(data_size) // 2) * decimation * 1.0 / sample_rate
+        else:
+            times = np.linspace(0, data_size * step_size * 1.0 / sample_rate, data_size)
         item = PathItem(times, data)
         item.setPen(pg.mkPen('w'))
         self.eventview_plotwid.addItem(item)